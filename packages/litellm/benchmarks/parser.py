@@ -0,0 +1,313 @@
+"""
+Micro-benchmarks of `LangflowChunkParser`, run on every streamed event. Measures
+events per second of the sync and async iterators and of the per-event parse
+methods, with memory per event, and gates on throughput regressions against a
+stored baseline.
+
+    python -m benchmarks.parser --check
+    python -m benchmarks.parser --save-baseline
+"""
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("HELPER_BACKEND", "http://127.0.0.1")
+
+from custom.langflow_handler import LangflowChunkParser  # noqa: E402
+
+SAMPLE_DATA = Path(__file__).resolve().parent.parent / "tests" / "sample_data"
+BASELINE = Path(__file__).resolve().parent / "parser_baseline.json"
+
+# Bytes per read handed to the parser, about what a socket read returns
+READ_SIZE = 4096
+
+CALIBRATION_PAYLOAD = json.dumps({"event": "token", "data": {"chunk": "word", "id": "x" * 36}})
+
+
+class ReplayResponse:
+    """
+    Stands in for a streaming `httpx.Response`, replaying raw bytes in reads of
+    `READ_SIZE`
+    """
+
+    def __init__(self, raw: bytes):
+        self.reads = [raw[index: index + READ_SIZE] for index in range(0, len(raw), READ_SIZE)]
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        return iter(self.reads)
+
+    async def aiter_bytes(self) -> AsyncIterator[bytes]:
+        for data in self.reads:
+            yield data
+
+
+def _event(payload: dict) -> bytes:
+    return json.dumps(payload).encode() + b"\n\n"
+
+
+def token_stream(tokens: int = 5000) -> bytes:
+    """
+    A long answer streamed token by token, with the metadata LangFlow sends
+    """
+    events = [_event({"event": "add_message", "data": {"text": "hi", "sender": "User"}})]
+    for index in range(tokens):
+        events.append(
+            _event(
+                {
+                    "event": "token",
+                    "data": {
+                        "chunk": f" word{index % 97}",
+                        "id": "3cd51868-bdb5-4df9-b43a-e5af03d59147",
+                        "timestamp": "2025-06-17 16:26:32 UTC",
+                    },
+                }
+            )
+        )
+    events.append(_event({"event": "end", "data": {"result": {}}}))
+    return b"".join(events)
+
+
+def agentic_end(text_chars: int = 200000) -> dict:
+    """
+    The end event of an agentic run, carrying the whole answer
+    """
+    text = ("The agent looked up the syllabus and found the answer. " * (text_chars // 55 + 1))[:text_chars]
+    message = {"text": text, "data": {"text": text}, "properties": {"source": {"id": "Agent"}}}
+    return {
+        "event": "end",
+        "data": {"result": {"outputs": [{"outputs": [{"results": {"message": message}}]}]}},
+    }
+
+
+def agentic_stream(text_chars: int = 200000, messages: int = 20) -> bytes:
+    """
+    An agentic run, which sends messages as it works and its answer at the end
+    """
+    events = [
+        _event({"event": "add_message", "data": {"text": "Calling tool " * 50, "index": index}})
+        for index in range(messages)
+    ]
+    events.append(_event(agentic_end(text_chars)))
+    return b"".join(events)
+
+
+def workloads() -> Dict[str, bytes]:
+    return {
+        "standard_sample": (SAMPLE_DATA / "standard_chunks.txt").read_bytes(),
+        "agentic_sample": (SAMPLE_DATA / "agent_chunks.txt").read_bytes(),
+        "long_token_stream": token_stream(),
+        "large_agentic_end": agentic_stream(),
+    }
+
+
+def _events(raw: bytes) -> int:
+    return sum(1 for line in raw.split(b"\n") if line.strip())
+
+
+def _round(run: Callable[[], None], min_time: float) -> float:
+    """
+    Time per call over calls of `run` lasting at least `min_time` seconds
+    """
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        run()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def _calibration() -> None:
+    """
+    A fixed pure Python workload close to parsing an event, used to measure the
+    speed of the machine
+    """
+    for _ in range(200):
+        json.loads(CALIBRATION_PAYLOAD).get("data", {}).get("chunk", "")
+
+
+def _best_time(run: Callable[[], None], repeat: int, min_time: float) -> Tuple[float, float]:
+    """
+    Best time per call of `repeat` rounds, and the best time of the calibration
+    workload in rounds interleaved with them, so a baseline can be scaled by the
+    speed of the machine at the time the benchmark ran
+    """
+    best = calibration = float("inf")
+    for _ in range(repeat):
+        calibration = min(calibration, _round(_calibration, min_time / 2))
+        best = min(best, _round(run, min_time))
+    return best, calibration
+
+
+def parse_sync(raw: bytes) -> List[dict]:
+    return list(LangflowChunkParser(ReplayResponse(raw), True))
+
+
+def parse_async(raw: bytes) -> List[dict]:
+    async def run() -> List[dict]:
+        return [chunk async for chunk in LangflowChunkParser(ReplayResponse(raw), False)]
+
+    return asyncio.run(run())
+
+
+def _memory(parse: Callable[[], List[dict]], events: int) -> Dict[str, float]:
+    """
+    tracemalloc cannot count allocations, only live memory, so the memory kept
+    by the parsed chunks and the peak while parsing are reported per event
+    """
+    tracemalloc.start()
+    try:
+        chunks = parse()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del chunks
+    return {
+        "retained_bytes_per_event": round(retained / events, 1),
+        "peak_bytes_per_event": round(peak / events, 1),
+    }
+
+
+def bench_iterators(repeat: int, min_time: float) -> Dict[str, dict]:
+    results = {}
+    for name, raw in workloads().items():
+        events = _events(raw)
+        for mode, parse in (("sync", parse_sync), ("async", parse_async)):
+            seconds, calibration = _best_time(lambda: parse(raw), repeat, min_time)
+            results[f"{name}.{mode}"] = {
+                "calibration_per_s": round(1 / calibration, 1),
+                "events": events,
+                "events_per_s": round(events / seconds, 1),
+                "mb_per_s": round(len(raw) / seconds / 1e6, 2),
+                **_memory(lambda: parse(raw), events),
+            }
+    return results
+
+
+def bench_methods(repeat: int, min_time: float) -> Dict[str, dict]:
+    parser = LangflowChunkParser(ReplayResponse(b""), True)
+    token = json.loads(token_stream(1).split(b"\n\n")[1])
+    token_raw = json.dumps(token).encode()
+    end = agentic_end()
+    end_raw = json.dumps(end).encode()
+
+    def parse_chunck(raw: bytes) -> Callable[[], None]:
+        def run() -> None:
+            parser.agentic = True
+            parser._parse_chunck(raw)
+
+        return run
+
+    methods = {
+        "_parse_chunck.token": parse_chunck(token_raw),
+        "_parse_chunck.agentic_end": parse_chunck(end_raw),
+        "_parse_token_chunk": lambda: parser._parse_token_chunk(token),
+        "_parse_agentic_end": lambda: parser._parse_agentic_end(end),
+    }
+    results = {}
+    for name, run in methods.items():
+        seconds, calibration = _best_time(run, repeat, min_time)
+        results[name] = {
+            "calibration_per_s": round(1 / calibration, 1),
+            "calls_per_s": round(1 / seconds, 1),
+        }
+    return results
+
+
+def calibrate(repeat: int, min_time: float) -> float:
+    """
+    Speed of this machine on a fixed pure Python workload, used to scale the
+    baseline so it can be checked on a different machine
+    """
+    payload = json.dumps({"event": "token", "data": {"chunk": "word", "id": "x" * 36}})
+
+    def run() -> None:
+        for _ in range(200):
+            json.loads(payload).get("data", {}).get("chunk", "")
+
+    return round(1 / _best_time(run, repeat, min_time), 1)
+
+
+def run(repeat: int = 5, min_time: float = 0.2) -> Dict[str, dict]:
+    return {
+        "iterators": bench_iterators(repeat, min_time),
+        "methods": bench_methods(repeat, min_time),
+    }
+
+
+def _throughputs(report: Dict[str, dict]) -> Dict[str, Tuple[float, float]]:
+    """
+    Throughput of each benchmark with the calibration speed measured alongside it
+    """
+    throughputs = {
+        f"iterators.{name}": (metrics["events_per_s"], metrics["calibration_per_s"])
+        for name, metrics in report["iterators"].items()
+    }
+    throughputs.update(
+        {
+            f"methods.{name}": (metrics["calls_per_s"], metrics["calibration_per_s"])
+            for name, metrics in report["methods"].items()
+        }
+    )
+    return throughputs
+
+
+def check(report: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    Benchmarks whose throughput fell more than `threshold` (a fraction) below
+    the baseline, scaled by the relative speed of the machine
+    """
+    current = _throughputs(report)
+    regressions = []
+    for name, (expected, calibration) in _throughputs(baseline).items():
+        if name not in current:
+            continue
+        throughput, current_calibration = current[name]
+        expected *= current_calibration / calibration
+        if throughput < expected * (1 - threshold):
+            regressions.append(
+                f"{name}: {throughput:.0f}/s, expected at least "
+                f"{expected * (1 - threshold):.0f}/s ({throughput / expected - 1:+.1%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark, the best is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", default=str(BASELINE), help="Baseline report to check against")
+    parser.add_argument("--check", action="store_true", help="Fail if throughput regressed against the baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="Fraction of baseline throughput that may be lost before --check fails",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.min_time)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    if args.save_baseline:
+        Path(args.baseline).write_text(output + "\n")
+
+    if args.check:
+        regressions = check(report, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for regression in regressions:
+            print(f"Regression in {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
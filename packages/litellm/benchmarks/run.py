@@ -0,0 +1,327 @@
+"""
+End-to-end benchmark of the LangFlow handler against the stub server. Drives
+`completion`, `acompletion`, `streaming` and `astreaming` at increasing
+concurrency and reports throughput, latency, time to first token, CPU per chunk
+and RSS as JSON, which can be diffed between versions.
+
+    python -m benchmarks.run --concurrency 1,4,16 --output before.json
+    python -m benchmarks.run --concurrency 1,4,16 --baseline before.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from . import stub_server
+
+os.environ.setdefault("HELPER_BACKEND", "http://127.0.0.1")
+
+from custom.langflow_handler import Langflow  # noqa: E402
+
+FLOW_ID = "benchmark-flow"
+MODES = ("completion", "acompletion", "streaming", "astreaming", "responses")
+
+
+def percentile(samples: List[float], percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(percentile * len(samples)))], 3)
+
+
+def rss_mb() -> Optional[float]:
+    """
+    Current resident set size, from /proc where available
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Sample:
+    """
+    Timings of one request
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.chunks = 0
+        self.chars = 0
+        self.error: Optional[str] = None
+
+    def chunk(self, text: str) -> None:
+        if text and self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.chunks += 1
+        self.chars += len(text)
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+
+class Driver:
+    def __init__(self, langflow: Langflow, base_url: str, messages: list, optional_params: dict):
+        self.langflow = langflow
+        self.base_url = base_url
+        self.messages = messages
+        self.optional_params = optional_params
+
+    def _args(self) -> tuple:
+        return (
+            FLOW_ID, self.messages, self.base_url, {}, None, print, None, "key", None,
+            dict(self.optional_params),
+        )
+
+    def _record(self, sample: Sample, run: Callable[[Sample], None]) -> Sample:
+        try:
+            run(sample)
+        except Exception as e:
+            sample.error = f"{type(e).__name__}: {e}"
+        sample.finish()
+        return sample
+
+    def completion(self, sample: Sample) -> None:
+        response = self.langflow.completion(*self._args())
+        sample.chunk(response.choices[0].message.content)
+
+    def streaming(self, sample: Sample) -> None:
+        for chunk in self.langflow.streaming(*self._args()):
+            sample.chunk(chunk["text"])
+
+    async def acompletion(self, sample: Sample) -> None:
+        response = await self.langflow.acompletion(*self._args())
+        sample.chunk(response.choices[0].message.content)
+
+    async def astreaming(self, sample: Sample) -> None:
+        async for chunk in self.langflow.astreaming(*self._args()):
+            sample.chunk(chunk["text"])
+
+    async def responses(self, sample: Sample) -> None:
+        stream = self.langflow._amake_streaming(
+            FLOW_ID,
+            self.messages,
+            self.base_url,
+            self.langflow.clients.get_async_handler(self.base_url),
+            "key",
+            dict(self.optional_params),
+        )
+        async for chunk in stream:
+            sample.chunk(chunk["text"])
+
+    def run(self, mode: str, concurrency: int, requests: int) -> List[Sample]:
+        if mode in ("completion", "streaming"):
+            run = getattr(self, mode)
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                return list(
+                    pool.map(lambda _: self._record(Sample(), run), range(requests))
+                )
+        return asyncio.run(self._arun(mode, concurrency, requests))
+
+    async def _arun(self, mode: str, concurrency: int, requests: int) -> List[Sample]:
+        run = getattr(self, mode)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one() -> Sample:
+            async with semaphore:
+                sample = Sample()
+                try:
+                    await run(sample)
+                except Exception as e:
+                    sample.error = f"{type(e).__name__}: {e}"
+                sample.finish()
+                return sample
+
+        try:
+            return await asyncio.gather(*(one() for _ in range(requests)))
+        finally:
+            await self.langflow.clients.aclose(sync_clients=False)
+
+
+def summarize(samples: List[Sample], wall: float, cpu: float) -> Dict[str, object]:
+    succeeded = [sample for sample in samples if sample.error is None]
+    chunks = sum(sample.chunks for sample in succeeded)
+    chars = sum(sample.chars for sample in succeeded)
+    latencies = [(sample.finished - sample.started) * 1000 for sample in succeeded]
+    ttfts = [
+        (sample.first_token - sample.started) * 1000
+        for sample in succeeded
+        if sample.first_token is not None
+    ]
+    errors = [sample.error for sample in samples if sample.error is not None]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(succeeded) / wall, 2) if wall else None,
+        "output_chars_per_s": round(chars / wall, 1) if wall else None,
+        "latency_ms_p50": percentile(latencies, 0.5),
+        "latency_ms_p95": percentile(latencies, 0.95),
+        "ttft_ms_p50": percentile(ttfts, 0.5),
+        "ttft_ms_p95": percentile(ttfts, 0.95),
+        "chunks": chunks,
+        "cpu_ms": round(cpu * 1000, 1),
+        "cpu_us_per_chunk": round(cpu * 1e6 / chunks, 2) if chunks else None,
+        "cpu_ms_per_request": round(cpu * 1000 / len(samples), 3) if samples else None,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def start_stub(args: argparse.Namespace) -> subprocess.Popen:
+    """
+    Run the stub in its own process so its CPU is not counted against the handler
+    """
+    command = [
+        sys.executable, "-m", "benchmarks.stub_server",
+        "--tokens", str(args.tokens),
+        "--chunk-chars", str(args.chunk_chars),
+        "--token-rate", str(args.token_rate),
+        "--event-padding", str(args.event_padding),
+        "--flow-chars", str(args.flow_chars),
+    ]
+    return subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+
+def make_messages(turns: int, message_chars: int) -> list:
+    text = ("please explain the assignment " * (message_chars // 30 + 1))[:message_chars]
+    messages = [{"role": "system", "content": "You are a course tutor."}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"{turn} {text}"})
+        messages.append({"role": "assistant", "content": text})
+    messages.append({"role": "user", "content": "When are office hours?"})
+    return messages
+
+
+def run_benchmark(args: argparse.Namespace, base_url: str) -> Dict[str, object]:
+    optional_params = dict(param.split("=", 1) for param in args.param)
+    driver = Driver(
+        Langflow(), base_url, make_messages(args.turns, args.message_chars), optional_params
+    )
+
+    results: Dict[str, Dict[str, object]] = {}
+    for mode in args.modes:
+        # Warm the flow metadata cache, connections and tokenizer
+        driver.run(mode, 1, 2)
+        results[mode] = {}
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency)
+            cpu = time.process_time()
+            wall = time.perf_counter()
+            samples = driver.run(mode, concurrency, requests)
+            results[mode][str(concurrency)] = summarize(
+                samples, time.perf_counter() - wall, time.process_time() - cpu
+            )
+    driver.langflow.close()
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub_server": "uvicorn" if stub_server.UVICORN_AVAILABLE else "builtin",
+        },
+        "settings": {
+            "requests": args.requests,
+            "tokens": args.tokens,
+            "chunk_chars": args.chunk_chars,
+            "token_rate": args.token_rate,
+            "event_padding": args.event_padding,
+            "flow_chars": args.flow_chars,
+            "turns": args.turns,
+            "message_chars": args.message_chars,
+            "params": optional_params,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """
+    Relative change of each metric against a baseline report
+    """
+    lines = []
+    for mode, levels in report["results"].items():
+        for concurrency, metrics in levels.items():
+            before = baseline.get("results", {}).get(mode, {}).get(concurrency, None)
+            if before is None:
+                continue
+            changes = []
+            for metric in ("throughput_rps", "ttft_ms_p50", "latency_ms_p95", "cpu_us_per_chunk", "rss_mb"):
+                if metrics.get(metric) and before.get(metric):
+                    change = (metrics[metric] - before[metric]) / before[metric] * 100
+                    changes.append(f"{metric} {change:+.1f}%")
+            lines.append(f"{mode} x{concurrency}: " + ", ".join(changes))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--modes", type=lambda value: value.split(","), default=list(MODES),
+        help=f"Comma separated handler entry points, of {', '.join(MODES)}",
+    )
+    parser.add_argument(
+        "--concurrency", type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 4, 16, 64], help="Comma separated concurrency levels",
+    )
+    parser.add_argument("--requests", type=int, default=64, help="Requests per level")
+    parser.add_argument("--turns", type=int, default=4, help="Earlier turns in each conversation")
+    parser.add_argument("--message-chars", type=int, default=400, help="Characters per earlier message")
+    parser.add_argument(
+        "--param", action="append", default=[],
+        help="Per-model setting passed to the handler as key=value, can be repeated",
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    stub_server.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stub = start_stub(args)
+    try:
+        port = int(stub.stdout.readline())
+        report = run_benchmark(args, f"http://127.0.0.1:{port}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            for line in compare(report, json.load(baseline_file)):
+                print(line, file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    main()
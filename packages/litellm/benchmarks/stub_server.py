@@ -0,0 +1,286 @@
+"""
+ASGI stub of the LangFlow endpoints used by the handler, for benchmarking the
+handler without LangFlow or an LLM behind it. Served with uvicorn when it is
+installed, otherwise with a minimal built-in HTTP/1.1 server.
+
+    python -m benchmarks.stub_server --tokens 200 --chunk-chars 4 --token-rate 0
+"""
+from typing import Awaitable, Callable, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+
+try:
+    import uvicorn  # type: ignore
+
+    UVICORN_AVAILABLE = True
+except ImportError:
+    UVICORN_AVAILABLE = False
+
+HISTORY_COMPONENT = "CompletionInterface-stub"
+
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+WORDS = (
+    "office hours are held on tuesdays and thursdays in the engineering building "
+    "please bring your questions about the assignment and the lecture notes "
+).split()
+
+
+class StubLangflow:
+    """
+    Emulates `/api/v1/flows/{id}`, streaming and non-streaming `/api/v1/run/{id}`
+    and the `/api/v1/responses` SSE stream. Streams send `tokens` chunks of
+    `chunk_chars` characters at `token_rate` chunks per second (`0` as fast as
+    possible), each event padded with `event_padding` bytes of metadata as
+    LangFlow's events carry ids and timestamps. The flow document is padded to
+    about `flow_chars` characters.
+    """
+
+    def __init__(
+        self,
+        tokens: int = 200,
+        chunk_chars: int = 4,
+        token_rate: float = 0.0,
+        event_padding: int = 96,
+        flow_chars: int = 20000,
+    ):
+        self.tokens = tokens
+        self.chunk_chars = chunk_chars
+        self.token_rate = token_rate
+        self.event_padding = event_padding
+        self.flow_chars = flow_chars
+
+        text = ""
+        while len(text) < tokens * chunk_chars:
+            text += WORDS[len(text) % len(WORDS)] + " "
+        self.answer = text[: tokens * chunk_chars]
+
+    def chunks(self) -> List[str]:
+        return [
+            self.answer[index: index + self.chunk_chars]
+            for index in range(0, len(self.answer), self.chunk_chars)
+        ]
+
+    async def __call__(self, scope: dict, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        path = scope["path"]
+        query = scope.get("query_string", b"").decode()
+        if scope["method"] == "GET" and path.startswith("/api/v1/flows/"):
+            await self._json(send, self._flow(path.rsplit("/", 1)[-1]))
+        elif scope["method"] == "POST" and path.startswith("/api/v1/run/"):
+            if "stream=true" in query.lower():
+                await self._stream(send, "application/x-ndjson", self._run_events())
+            else:
+                # A run answers once the whole answer has been generated
+                if self.token_rate > 0:
+                    await asyncio.sleep(self.tokens / self.token_rate)
+                await self._json(send, self._run_result())
+        elif scope["method"] == "POST" and path == "/api/v1/responses":
+            await self._stream(send, "text/event-stream", self._responses_events())
+        else:
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+    def _flow(self, flow_id: str) -> dict:
+        nodes = [{"id": HISTORY_COMPONENT, "data": {}}]
+        filler = "x" * 200
+        while len(json.dumps(nodes)) < self.flow_chars:
+            nodes.append({"id": f"Component-{len(nodes)}", "data": {"description": filler}})
+        return {"id": flow_id, "updated_at": "2025-01-01T00:00:00", "data": {"nodes": nodes}}
+
+    def _run_result(self) -> dict:
+        return {
+            "outputs": [{"outputs": [{"results": {"message": {"data": {"text": self.answer}}}}]}]
+        }
+
+    def _padding(self) -> str:
+        return "p" * self.event_padding
+
+    def _run_events(self) -> List[bytes]:
+        events = [{"event": "add_message", "data": {"text": "", "id": self._padding()}}]
+        events += [
+            {"event": "token", "data": {"chunk": chunk, "id": self._padding()}}
+            for chunk in self.chunks()
+        ]
+        events.append({"event": "end", "data": {"result": self._run_result()}})
+        return [json.dumps(event).encode() + b"\n\n" for event in events]
+
+    def _responses_events(self) -> List[bytes]:
+        events = [
+            b"data: " + json.dumps({"delta": {"content": chunk}, "id": self._padding()}).encode() + b"\n\n"
+            for chunk in self.chunks()
+        ]
+        events.append(b"data: [DONE]\n\n")
+        return events
+
+    async def _json(self, send: Send, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _stream(self, send: Send, content_type: str, events: List[bytes]) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", content_type.encode())],
+            }
+        )
+        # The first event goes out straight away, like LangFlow's add_message
+        for index, event in enumerate(events):
+            if self.token_rate > 0 and index > 0:
+                await asyncio.sleep(1 / self.token_rate)
+            await send({"type": "http.response.body", "body": event, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _serve_connection(
+    app: StubLangflow, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """
+    Serve keep-alive HTTP/1.1 requests on a connection, streaming every response
+    with chunked transfer encoding
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+            headers: List[Tuple[bytes, bytes]] = []
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, value = line.decode("latin-1").split(":", 1)
+                headers.append((name.strip().lower().encode(), value.strip().encode()))
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length) if length else b""
+
+            path, _, query = target.partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": method,
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "headers": headers,
+            }
+
+            async def receive() -> dict:
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            async def send(message: dict) -> None:
+                if message["type"] == "http.response.start":
+                    lines = [f"HTTP/1.1 {message['status']} OK".encode()]
+                    lines += [
+                        name + b": " + value
+                        for name, value in message.get("headers", [])
+                        if name.lower() != b"content-length"
+                    ]
+                    lines.append(b"transfer-encoding: chunked")
+                    writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+                else:
+                    data = message.get("body", b"")
+                    if data:
+                        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    if not message.get("more_body", False):
+                        writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+
+            await app(scope, receive, send)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(
+    app: StubLangflow,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    on_ready: Optional[Callable[[int], None]] = None,
+) -> None:
+    """
+    Serve the stub until cancelled, calling `on_ready` with the bound port
+    """
+    if UVICORN_AVAILABLE:
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        server = uvicorn.Server(config)
+        task = asyncio.ensure_future(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        if on_ready is not None:
+            on_ready(server.servers[0].sockets[0].getsockname()[1])
+        await task
+        return
+
+    server = await asyncio.start_server(
+        lambda reader, writer: _serve_connection(app, reader, writer), host, port
+    )
+    if on_ready is not None:
+        on_ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tokens", type=int, default=200, help="Chunks per streamed answer")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="Characters per chunk")
+    parser.add_argument(
+        "--token-rate", type=float, default=0.0, help="Chunks per second, 0 for no delay"
+    )
+    parser.add_argument(
+        "--event-padding", type=int, default=96, help="Bytes of metadata per streamed event"
+    )
+    parser.add_argument(
+        "--flow-chars", type=int, default=20000, help="Size of the flow document"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app = StubLangflow(
+        tokens=args.tokens,
+        chunk_chars=args.chunk_chars,
+        token_rate=args.token_rate,
+        event_padding=args.event_padding,
+        flow_chars=args.flow_chars,
+    )
+    # The bound port is the first line of output, for the benchmark driver
+    asyncio.run(serve(app, args.host, args.port, lambda port: print(port, flush=True)))
+
+
+if __name__ == "__main__":
+    main()
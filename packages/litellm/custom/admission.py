@@ -0,0 +1,436 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+import asyncio
+import bisect
+import math
+import threading
+import time
+
+from litellm._logging import verbose_logger
+
+from .cancellation import aclose_iterator, close_iterator
+from .exceptions import BaseLLMException
+from .load_balancer import is_backend_failure
+from .stream_metrics import LATENCY_BUCKETS_MS
+
+T = TypeVar("T")
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+
+def is_overload(error: BaseException) -> bool:
+    """
+    Whether an error suggests the flow is overloaded, as opposed to a bad request
+    """
+    return is_backend_failure(error) or getattr(error, "status_code", 0) >= 500
+
+
+class Waiter:
+    """
+    A request waiting for a slot, woken from whichever thread releases one.
+    Async waiters pass the event loop they wait on.
+    """
+
+    def __init__(
+        self,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        key: str = "default",
+        priority: int = INTERACTIVE,
+    ):
+        self.key = key
+        self.priority = priority
+        self.start = 0.0
+        self.tag = 0.0
+        self.granted = False
+        self.enqueued = time.monotonic()
+        self._event = threading.Event() if loop is None else None
+        self._future = loop.create_future() if loop is not None else None
+
+    def wait(self, timeout: float) -> None:
+        self._event.wait(timeout)
+
+    async def await_(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def grant(self) -> None:
+        self.granted = True
+        if self._event is not None:
+            self._event.set()
+        if self._future is not None:
+            future = self._future
+            future.get_loop().call_soon_threadsafe(
+                lambda: future.done() or future.set_result(None)
+            )
+
+
+class FifoQueue:
+    """
+    Waiters served in arrival order
+    """
+
+    def __init__(self):
+        self._waiters: Deque[Waiter] = deque()
+
+    def push(self, waiter: Waiter) -> None:
+        self._waiters.append(waiter)
+
+    def pop(self) -> Optional[Waiter]:
+        return self._waiters.popleft() if self._waiters else None
+
+    def remove(self, waiter: Waiter) -> None:
+        self._waiters.remove(waiter)
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+
+class FairQueue(FifoQueue):
+    """
+    Waiters served by priority class, then by weighted fair share between keys
+    (API keys or teams) using start-time fair queueing. Each waiter is tagged
+    with the virtual time its key would finish at if every key with a backlog
+    were served in proportion to its weight, and the lowest tag goes first.
+    Keys without a weight have a weight of 1.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = weights or {}
+        self.virtual_time = 0.0
+
+        self._keys: Dict[Tuple[int, str], Deque[Waiter]] = {}
+        self._finish: Dict[str, float] = {}
+        self._size = 0
+
+    def push(self, waiter: Waiter) -> None:
+        weight = max(float(self.weights.get(waiter.key, 1.0)), 1e-6)
+        waiter.start = max(self.virtual_time, self._finish.get(waiter.key, 0.0))
+        waiter.tag = waiter.start + 1 / weight
+        self._finish[waiter.key] = waiter.tag
+
+        self._keys.setdefault((waiter.priority, waiter.key), deque()).append(waiter)
+        self._size += 1
+
+    def pop(self) -> Optional[Waiter]:
+        if not self._keys:
+            return None
+
+        head = min(
+            self._keys.items(), key=lambda item: (item[0][0], item[1][0].tag)
+        )
+        (priority, key), waiters = head
+        waiter = waiters.popleft()
+        if not waiters:
+            del self._keys[(priority, key)]
+        self._size -= 1
+
+        self.virtual_time = max(self.virtual_time, waiter.start)
+        if not self._keys:
+            # Idle, so no key carries credit or debt into the next backlog
+            self._finish.clear()
+        return waiter
+
+    def remove(self, waiter: Waiter) -> None:
+        waiters = self._keys[(waiter.priority, waiter.key)]
+        waiters.remove(waiter)
+        if not waiters:
+            del self._keys[(waiter.priority, waiter.key)]
+        self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit of a flow adapted AIMD style. Each run that completes within
+    `latency_tolerance` times the flow's baseline latency raises the limit by about
+    one per limit's worth of runs, while errors and slow runs cut it by `backoff`.
+    Requests over the limit wait in a bounded queue for up to `queue_timeout`
+    seconds and are otherwise shed with a 429.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_limit: int,
+        min_limit: int = 1,
+        queue_size: int = 100,
+        queue_timeout: float = 10.0,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.75,
+        queue: Optional[FifoQueue] = None,
+    ):
+        self.name = name
+        self.initial_limit = limit
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self.shed = 0
+        self.wait_ms = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.wait_ms_total = 0.0
+        self.admitted = 0
+        self.key_waits: Dict[str, Dict[str, float]] = {}
+
+        self._queue = queue if queue is not None else FifoQueue()
+        self._lock = threading.Lock()
+
+    def _capacity(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def _grant(self) -> None:
+        while self.in_flight < self._capacity():
+            waiter = self._queue.pop()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.grant()
+
+    def configure(
+        self,
+        limit: int,
+        max_limit: int,
+        queue_size: int,
+        queue_timeout: float,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Apply changed settings to a limiter in use. A new initial limit restarts
+        adaptation from it, and requests already queued keep their place.
+        """
+        with self._lock:
+            if limit != self.initial_limit:
+                self.initial_limit = limit
+                self.limit = float(limit)
+            self.max_limit = max(max_limit, limit)
+            self.limit = min(self.limit, self.max_limit)
+            self.queue_size = queue_size
+            self.queue_timeout = queue_timeout
+            if isinstance(self._queue, FairQueue):
+                self._queue.weights = weights or {}
+            self._grant()
+
+    def _record_wait(self, waiter: Waiter, waited: float) -> None:
+        waited_ms = waited * 1000
+        self.wait_ms[bisect.bisect_left(LATENCY_BUCKETS_MS, waited_ms)] += 1
+        self.wait_ms_total += waited_ms
+        self.admitted += 1
+
+        key_waits = self.key_waits.setdefault(
+            waiter.key, {"admitted": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+        )
+        key_waits["admitted"] += 1
+        key_waits["wait_ms_total"] += waited_ms
+        key_waits["wait_ms_max"] = max(key_waits["wait_ms_max"], waited_ms)
+
+    def _enqueue(self, waiter: Waiter) -> bool:
+        """
+        Take a slot or join the queue, returning True if a slot was taken
+        """
+        with self._lock:
+            if self.in_flight < self._capacity() and len(self._queue) == 0:
+                self.in_flight += 1
+                self._record_wait(waiter, 0.0)
+                return True
+            if len(self._queue) >= self.queue_size:
+                self.shed += 1
+                raise self._overloaded("queue full")
+            self._queue.push(waiter)
+            return False
+
+    def _dequeue(self, waiter: Waiter) -> None:
+        """
+        Settle a waiter after waiting, raising if it was not granted a slot
+        """
+        with self._lock:
+            if waiter.granted:
+                self._record_wait(waiter, time.monotonic() - waiter.enqueued)
+                return
+            self._queue.remove(waiter)
+            self.shed += 1
+            raise self._overloaded("timed out in queue")
+
+    def _overloaded(self, reason: str) -> BaseLLMException:
+        # Roughly how long until the queue ahead drains
+        per_run = self.baseline or 1.0
+        retry_after = per_run * (len(self._queue) + 1) / self._capacity()
+        verbose_logger.warning(
+            "[Langflow] Shedding run of %s, %s (limit %s, queued %s)",
+            self.name,
+            reason,
+            self._capacity(),
+            len(self._queue),
+        )
+        return BaseLLMException(
+            429,
+            message=f"Too many concurrent runs of {self.name}, {reason}",
+            headers={"retry-after": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def acquire(self, key: str = "default", priority: int = INTERACTIVE) -> None:
+        waiter = Waiter(key=key, priority=priority)
+        if self._enqueue(waiter):
+            return
+        waiter.wait(self.queue_timeout)
+        self._dequeue(waiter)
+
+    async def aacquire(self, key: str = "default", priority: int = INTERACTIVE) -> None:
+        waiter = Waiter(asyncio.get_running_loop(), key, priority)
+        if self._enqueue(waiter):
+            return
+        try:
+            await waiter.await_(self.queue_timeout)
+        except asyncio.CancelledError:
+            # Give back a slot granted while being cancelled, or leave the queue
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._queue.remove(waiter)
+            if granted:
+                self.release(None, False)
+            raise
+        self._dequeue(waiter)
+
+    def release(self, latency: Optional[float], failed: bool) -> None:
+        """
+        Free a slot, adapting the limit to how the run went. Runs that ended
+        before producing anything pass no latency and leave the limit as is.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif latency is not None:
+                if self.baseline is None:
+                    self.baseline = latency
+                if latency > self.baseline * self.latency_tolerance:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.baseline = 0.95 * self.baseline + 0.05 * latency
+
+            self._grant()
+
+    @contextmanager
+    def slot(self, key: str = "default", priority: int = INTERACTIVE) -> Iterator[None]:
+        self.acquire(key, priority)
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except BaseException as e:
+            failed = is_overload(e)
+            raise
+        finally:
+            self.release(time.monotonic() - started, failed)
+
+    @asynccontextmanager
+    async def aslot(
+        self, key: str = "default", priority: int = INTERACTIVE
+    ) -> AsyncIterator[None]:
+        await self.aacquire(key, priority)
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except BaseException as e:
+            failed = is_overload(e)
+            raise
+        finally:
+            self.release(time.monotonic() - started, failed)
+
+    def stream(
+        self,
+        start: Callable[[], Iterator[T]],
+        key: str = "default",
+        priority: int = INTERACTIVE,
+    ) -> Iterator[T]:
+        """
+        Hold a slot for the life of a stream, adapting to its first chunk latency
+        """
+        self.acquire(key, priority)
+        started = time.monotonic()
+        latency = None
+        failed = False
+        chunks = None
+        try:
+            chunks = start()
+            for chunk in chunks:
+                if latency is None:
+                    latency = time.monotonic() - started
+                yield chunk
+        except Exception as e:
+            failed = is_overload(e)
+            raise
+        finally:
+            if chunks is not None:
+                close_iterator(chunks)
+            self.release(latency, failed)
+
+    async def astream(
+        self,
+        start: Callable[[], AsyncIterator[T]],
+        key: str = "default",
+        priority: int = INTERACTIVE,
+    ) -> AsyncIterator[T]:
+        """
+        Async version of `stream`, which waits for its slot without blocking the
+        event loop
+        """
+        await self.aacquire(key, priority)
+        started = time.monotonic()
+        latency = None
+        failed = False
+        chunks = None
+        try:
+            chunks = start()
+            async for chunk in chunks:
+                if latency is None:
+                    latency = time.monotonic() - started
+                yield chunk
+        except Exception as e:
+            failed = is_overload(e)
+            raise
+        finally:
+            if chunks is not None:
+                await aclose_iterator(chunks)
+            self.release(latency, failed)
+
+    def stats(self) -> Dict[str, object]:
+        histogram = {
+            f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.wait_ms)
+        }
+        histogram["inf"] = self.wait_ms[-1]
+        with self._lock:
+            return {
+                "limit": self._capacity(),
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._queue),
+                "shed": self.shed,
+                "admitted": self.admitted,
+                "wait_ms_avg": (
+                    round(self.wait_ms_total / self.admitted, 3) if self.admitted else 0.0
+                ),
+                "wait_ms": histogram,
+                "keys": {
+                    key: {
+                        "admitted": int(waits["admitted"]),
+                        "wait_ms_avg": round(waits["wait_ms_total"] / waits["admitted"], 3),
+                        "wait_ms_max": round(waits["wait_ms_max"], 3),
+                    }
+                    for key, waits in self.key_waits.items()
+                },
+            }
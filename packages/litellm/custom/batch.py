@@ -0,0 +1,112 @@
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar, Union
+import asyncio
+import time
+
+from litellm._logging import verbose_logger
+
+from .admission import is_overload
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Status codes worth retrying an item on, besides overload and backend failures
+RETRYABLE_STATUS_CODES = (408, 429)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether an item that failed with the error may succeed if run again
+    """
+    return is_overload(error) or getattr(error, "status_code", 0) in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error: BaseException) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass
+class BatchProgress:
+    """
+    Progress of a batch, reported as items finish
+    """
+
+    total: int
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def done(self) -> int:
+        return self.completed + self.failed
+
+    def stats(self) -> Dict[str, float]:
+        elapsed = time.monotonic() - self.started
+        throughput = self.done / elapsed if elapsed > 0 else 0.0
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_s": round(elapsed, 3),
+            "items_per_s": round(throughput, 3),
+            "eta_s": (
+                round((self.total - self.done) / throughput, 3) if throughput else None
+            ),
+        }
+
+
+async def run_batch(
+    items: Sequence[T],
+    run: Callable[[T], Awaitable[R]],
+    concurrency: int = 8,
+    retries: int = 2,
+    retry_backoff: float = 0.5,
+    on_progress: Optional[Callable[[BatchProgress], None]] = None,
+    log_interval: float = 10.0,
+) -> List[Union[R, BaseException]]:
+    """
+    Run every item with at most `concurrency` in flight, returning the results
+    in the order of the items. An item that fails is retried up to `retries`
+    times while its error is retryable, backing off exponentially or for as long
+    as the error's `Retry-After` asks, and its last error takes its place in the
+    results otherwise.
+    """
+    results: List[Union[R, BaseException]] = [None] * len(items)  # type: ignore
+    progress = BatchProgress(len(items))
+    pending = iter(range(len(items)))
+    last_logged = progress.started
+
+    async def run_item(index: int) -> None:
+        for attempt in range(retries + 1):
+            try:
+                results[index] = await run(items[index])
+                progress.completed += 1
+                return
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    results[index] = e
+                    progress.failed += 1
+                    return
+                progress.retries += 1
+                await asyncio.sleep(max(retry_backoff * 2**attempt, _retry_after(e)))
+
+    async def worker() -> None:
+        nonlocal last_logged
+        for index in pending:
+            await run_item(index)
+            if on_progress is not None:
+                on_progress(progress)
+            now = time.monotonic()
+            if now - last_logged >= log_interval:
+                last_logged = now
+                verbose_logger.info("[Langflow Batch] Progress: %s", progress.stats())
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(items))))))
+    verbose_logger.info("[Langflow Batch] Finished: %s", progress.stats())
+    return results
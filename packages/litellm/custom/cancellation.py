@@ -0,0 +1,52 @@
+from typing import Dict, Iterable
+import threading
+
+
+def close_iterator(iterator: Iterable) -> None:
+    """
+    Close a stream that is being abandoned so the run behind it is cancelled
+    right away rather than whenever the iterator is garbage collected
+    """
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def aclose_iterator(iterator: object) -> None:
+    """
+    Async version of `close_iterator`
+    """
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+class CancelledRuns:
+    """
+    Counts LangFlow runs whose stream was closed before they finished, because
+    the client disconnected or a hedged attempt lost. Closing the connection of a
+    streaming run makes LangFlow cancel it, so these runs stop spending tokens.
+    """
+
+    def __init__(self):
+        self.cancelled = 0
+        self.seconds = 0.0
+        self.models: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, elapsed: float) -> None:
+        """
+        Count a run cancelled `elapsed` seconds after it started
+        """
+        with self._lock:
+            self.cancelled += 1
+            self.seconds += elapsed
+            self.models[model] = self.models.get(model, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "cancelled": self.cancelled,
+                "cancelled_after_s": round(self.seconds, 3),
+                "models": dict(self.models),
+            }
@@ -0,0 +1,157 @@
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+import asyncio
+import time
+
+from litellm.types.utils import GenericStreamingChunk
+
+from .cancellation import close_iterator
+
+
+def _text_chunk(parts: List[str]) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text="".join(parts),
+        is_finished=False,
+        finish_reason="",
+        usage=None,
+        index=0,
+        tool_use=None,
+    )
+
+
+def _with_prefix(chunk: GenericStreamingChunk, parts: List[str]) -> GenericStreamingChunk:
+    """
+    Prepend buffered text to a chunk that must be passed through, such as the
+    finishing chunk, so the buffered text is never reordered or lost.
+    """
+    if not parts:
+        return chunk
+    merged = GenericStreamingChunk(**chunk)
+    merged["text"] = "".join(parts) + chunk["text"]
+    return merged
+
+
+def _is_plain_text(chunk: GenericStreamingChunk) -> bool:
+    return (
+        not chunk["is_finished"]
+        and not chunk.get("tool_use")
+        and not chunk.get("usage")
+        and not chunk.get("provider_specific_fields")
+    )
+
+
+def coalesce_chunks(
+    chunks: Iterable[GenericStreamingChunk], max_chars: int, max_delay: float
+) -> Iterator[GenericStreamingChunk]:
+    """
+    Merge adjacent text chunks until `max_chars` characters are buffered or the
+    oldest buffered text is `max_delay` seconds old. The first text chunk is
+    always passed through immediately. A synchronous iterator cannot be woken up
+    by a timer, so the deadline is checked whenever the next chunk arrives.
+    Streams read on an event loop, such as LiteLLM's async path that the proxy
+    uses, go through `acoalesce_chunks` instead, which keeps to the deadline.
+    """
+    parts: List[str] = []
+    size = 0
+    buffered_since: Optional[float] = None
+    first = True
+
+    try:
+        for chunk in chunks:
+            if not _is_plain_text(chunk):
+                yield _with_prefix(chunk, parts)
+                parts, size, buffered_since = [], 0, None
+                continue
+
+            text = chunk["text"]
+            if not text:
+                continue
+
+            if first:
+                first = False
+                yield chunk
+                continue
+
+            now = time.monotonic()
+            if buffered_since is None:
+                buffered_since = now
+            parts.append(text)
+            size += len(text)
+
+            if size >= max_chars or now - buffered_since >= max_delay:
+                yield _text_chunk(parts)
+                parts, size, buffered_since = [], 0, None
+    finally:
+        close_iterator(chunks)
+
+    if parts:
+        yield _text_chunk(parts)
+
+
+async def acoalesce_chunks(
+    chunks: AsyncIterable[GenericStreamingChunk], max_chars: int, max_delay: float
+) -> AsyncIterator[GenericStreamingChunk]:
+    """
+    Async version of `coalesce_chunks`. Buffered text is flushed as soon as its
+    deadline passes, even while waiting on the next upstream chunk.
+    """
+    iterator = chunks.__aiter__()
+    loop = asyncio.get_running_loop()
+
+    parts: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    first = True
+    next_chunk: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+            if not done:
+                # Deadline reached while waiting on upstream
+                yield _text_chunk(parts)
+                parts, size, deadline = [], 0, None
+                continue
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                next_chunk = None
+                break
+            next_chunk = None
+
+            if not _is_plain_text(chunk):
+                yield _with_prefix(chunk, parts)
+                parts, size, deadline = [], 0, None
+                continue
+
+            text = chunk["text"]
+            if not text:
+                continue
+
+            if first:
+                first = False
+                yield chunk
+                continue
+
+            if deadline is None:
+                deadline = loop.time() + max_delay
+            parts.append(text)
+            size += len(text)
+
+            if size >= max_chars or loop.time() >= deadline:
+                yield _text_chunk(parts)
+                parts, size, deadline = [], 0, None
+
+        if parts:
+            yield _text_chunk(parts)
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+            await asyncio.wait({next_chunk})
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
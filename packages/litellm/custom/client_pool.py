@@ -0,0 +1,228 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import threading
+
+import httpx  # type: ignore
+
+from litellm._logging import verbose_logger
+from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler, HTTPHandler
+
+try:
+    import h2  # type: ignore # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PooledHTTPHandler(HTTPHandler):
+    """
+    LiteLLM HTTP handler wrapping a client owned by a `LangflowClientPool`. Closing
+    or garbage collecting the handler leaves the shared client open.
+    """
+
+    def __init__(self, client: httpx.Client):
+        super().__init__(client=client)
+
+    def close(self):
+        pass
+
+    def __del__(self) -> None:
+        pass
+
+
+class PooledAsyncHTTPHandler(AsyncHTTPHandler):
+    """
+    Async version of `PooledHTTPHandler`
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.timeout = client.timeout
+        self.event_hooks = None
+        self.client = client
+        self.client_alias = "langflow"
+
+    async def close(self):
+        pass
+
+    def __del__(self) -> None:
+        pass
+
+
+class LangflowClientPool:
+    """
+    Long-lived HTTP clients to LangFlow, one per base URL, so connections are
+    kept alive and reused between requests. Async clients are bound to the event
+    loop they were created on, so each loop gets its own. Clients of loops that
+    have been closed are dropped.
+
+    Base URLs listed in `http2_bases` (or every base URL when it contains `*`) are
+    connected to over HTTP/2 so concurrent streams share multiplexed connections.
+    This requires the `h2` package, and requesting HTTP/2 without it is an error.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        http2_bases: Optional[Iterable[str]] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http2_bases = {base.rstrip("/") for base in http2_bases or []}
+
+        if self.http2_bases and not HTTP2_AVAILABLE:
+            raise ImportError(
+                "HTTP/2 requested for LangFlow but the h2 package is not installed, install it with `pip install h2`"
+            )
+
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[
+            Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient
+        ] = {}
+
+    def uses_http2(self, base_url: str) -> bool:
+        return "*" in self.http2_bases or base_url.rstrip("/") in self.http2_bases
+
+    def get_client(self, base_url: str) -> httpx.Client:
+        with self._lock:
+            client = self._clients.get(base_url, None)
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=self.limits,
+                    http2=self.uses_http2(base_url),
+                )
+                self._clients[base_url] = client
+            return client
+
+    def get_async_client(self, base_url: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get((base_url, loop), None)
+            if client is None or client.is_closed:
+                self._async_clients = {
+                    key: client
+                    for key, client in self._async_clients.items()
+                    if not key[1].is_closed()
+                }
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=self.limits,
+                    http2=self.uses_http2(base_url),
+                )
+                self._async_clients[(base_url, loop)] = client
+            return client
+
+    def get_handler(self, base_url: str) -> HTTPHandler:
+        return PooledHTTPHandler(self.get_client(base_url))
+
+    def get_async_handler(self, base_url: str) -> AsyncHTTPHandler:
+        return PooledAsyncHTTPHandler(self.get_async_client(base_url))
+
+    def connection_stats(self) -> Dict[str, List[dict]]:
+        """
+        Report the open connections for each base URL along with the HTTP version
+        and the number of in-flight requests (streams) each connection carries.
+        """
+        with self._lock:
+            clients: List[Tuple[str, Union[httpx.Client, httpx.AsyncClient]]] = list(
+                self._clients.items()
+            )
+            clients += [
+                (base_url, client) for (base_url, _), client in self._async_clients.items()
+            ]
+
+        stats: Dict[str, List[dict]] = {}
+        for base_url, client in clients:
+            stats.setdefault(base_url, []).extend(_client_connection_stats(client))
+        return stats
+
+    def close(self) -> None:
+        """
+        Close the synchronous clients. Async clients can only be closed from
+        their event loop, see `aclose`, so they are dropped here.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._async_clients.clear()
+
+        for client in clients:
+            client.close()
+
+    async def aclose(self, sync_clients: bool = True) -> None:
+        """
+        Close every client, awaiting the async clients created on the running loop.
+        With `sync_clients` False only the async clients of the running loop are
+        closed, as when the loop is about to end.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            async_clients = [
+                client for (_, client_loop), client in self._async_clients.items()
+                if client_loop is loop
+            ]
+            self._async_clients = {
+                key: client
+                for key, client in self._async_clients.items()
+                if key[1] is not loop
+            }
+
+        for client in async_clients:
+            await client.aclose()
+        if sync_clients:
+            self.close()
+
+
+def _client_connection_stats(
+    client: Union[httpx.Client, httpx.AsyncClient]
+) -> List[dict]:
+    """
+    Inspect the httpcore connection pool behind an httpx client. Neither httpx
+    nor httpcore expose the pool or per connection request counts, so this
+    relies on their internals: the in-flight requests are grouped by the
+    connection they have been assigned to. Should the internals change, no
+    connections are reported, or no stream counts (`None`) when only the
+    requests cannot be read.
+    """
+    try:
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is None:
+            return []
+        connections = list(pool.connections)
+    except Exception as e:
+        verbose_logger.debug(f"Cannot inspect the LangFlow connection pool: {e}")
+        return []
+
+    streams: Optional[Dict[int, int]] = {}
+    try:
+        for pool_request in list(pool._requests):
+            connection = pool_request.connection
+            if connection is not None:
+                streams[id(connection)] = streams.get(id(connection), 0) + 1
+    except Exception as e:
+        verbose_logger.debug(f"Cannot inspect the LangFlow connection pool requests: {e}")
+        streams = None
+
+    stats = []
+    for connection in connections:
+        try:
+            info = connection.info()
+        except Exception:
+            info = ""
+        stats.append(
+            {
+                "http_version": "HTTP/2" if "HTTP/2" in info else "HTTP/1.1",
+                "streams": streams.get(id(connection), 0) if streams is not None else None,
+                "info": info,
+            }
+        )
+    return stats
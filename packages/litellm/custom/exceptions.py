@@ -0,0 +1,37 @@
+from typing import Optional, Union
+
+import httpx  # type: ignore
+
+
+class BaseLLMException(Exception):
+    """
+    Exception implementation for LLM errors. In the future this should be
+    imported from LiteLLM once it is exposed by the LiteLLM Library
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        headers: Optional[Union[dict, httpx.Headers]] = None,
+        request: Optional[httpx.Request] = None,
+        response: Optional[httpx.Response] = None,
+    ):
+        self.status_code = status_code
+        self.message: str = message
+        self.headers = headers
+        if request:
+            self.request = request
+        else:
+            self.request = httpx.Request(
+                method="POST", url="https://docs.litellm.ai/docs"
+            )
+        if response:
+            self.response = response
+        else:
+            self.response = httpx.Response(
+                status_code=status_code, request=self.request
+            )
+        super().__init__(
+            self.message
+        )  # Call the base class constructor with the parameters it needs
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import threading
+import time
+
+
+@dataclass
+class FlowMetadata:
+    """
+    Information about a Langflow flow that is needed before a run can be made.
+    The `etag` and `updated_at` fields are the validators used to revalidate
+    the entry against Langflow once it has expired.
+    """
+
+    history_component: Optional[str]
+    etag: Optional[str] = None
+    updated_at: Optional[str] = None
+    expires_at: float = 0.0
+
+
+class _Flight:
+    """
+    A lookup currently in progress for a single key. Synchronous callers that
+    miss on the same key wait on the flight instead of making their own request.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[FlowMetadata] = None
+        self.error: Optional[BaseException] = None
+
+
+class FlowMetadataCache:
+    """
+    In-process cache of flow metadata keyed by (api_base, flow id). Entries live
+    for `ttl` seconds and the least recently used entry is evicted once more than
+    `max_entries` are stored. Expired entries are handed to the fetch function so
+    it can revalidate them instead of rebuilding them, and concurrent misses on
+    the same key are collapsed into a single fetch.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Hashable, FlowMetadata]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._aflights: Dict[Tuple[Hashable, asyncio.AbstractEventLoop], asyncio.Future] = {}
+
+    def _lookup(self, key: Hashable) -> Tuple[Optional[FlowMetadata], bool]:
+        """
+        Get the entry for the key along with whether it is still fresh. Must be
+        called while holding the lock.
+        """
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None, False
+
+        self._entries.move_to_end(key)
+        return entry, entry.expires_at > time.monotonic()
+
+    def _store(self, key: Hashable, entry: FlowMetadata) -> None:
+        entry.expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[Optional[FlowMetadata]], FlowMetadata],
+    ) -> FlowMetadata:
+        """
+        Get the metadata for the key, calling `fetch` with the stale entry (or
+        None) when the entry is missing or expired.
+        """
+        if self.ttl <= 0:
+            return fetch(None)
+
+        with self._lock:
+            entry, fresh = self._lookup(key)
+            if fresh:
+                return entry
+
+            flight = self._flights.get(key, None)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        # Another caller is already fetching this key, wait for their result
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            result = fetch(entry)
+            self._store(key, result)
+            flight.result = result
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def aget(
+        self,
+        key: Hashable,
+        fetch: Callable[[Optional[FlowMetadata]], Awaitable[FlowMetadata]],
+    ) -> FlowMetadata:
+        """
+        Async version of `get`. Concurrent misses on the same key share one fetch
+        per event loop, as a future can only be awaited on the loop it belongs to.
+        """
+        if self.ttl <= 0:
+            return await fetch(None)
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry, fresh = self._lookup(key)
+            if fresh:
+                return entry
+
+            flight = self._aflights.get((key, loop), None)
+            leader = flight is None
+            if leader:
+                flight = loop.create_future()
+                self._aflights[(key, loop)] = flight
+
+        if not leader:
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # The leader was cancelled rather than this caller, try again
+                if flight.cancelled():
+                    return await self.aget(key, fetch)
+                raise
+
+        try:
+            result = await fetch(entry)
+            self._store(key, result)
+            flight.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            # Mark the exception as retrieved in case no one else was waiting
+            flight.exception()
+            raise
+        finally:
+            with self._lock:
+                self._aflights.pop((key, loop), None)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """
+        Drop the entry for the key, or every entry when no key is provided.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,286 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+import asyncio
+import threading
+import time
+
+from litellm._logging import verbose_logger
+
+from .cancellation import aclose_iterator
+
+T = TypeVar("T")
+
+# Marks a stream that ended before producing a chunk
+_END = object()
+
+
+@dataclass
+class HedgePolicy:
+    """
+    When to send a second attempt of a run. The deadline is the `percentile`
+    of recent first-byte latencies of the model, or `delay` seconds until
+    `min_samples` latencies have been seen. At most a `budget` fraction of runs
+    are hedged, with up to `burst` hedges in a row.
+    """
+
+    delay: float = 2.0
+    percentile: float = 0.95
+    min_samples: int = 20
+    budget: float = 0.05
+    burst: float = 2.0
+
+
+class LatencyWindow:
+    """
+    Most recent first-byte latencies of a model
+    """
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(percentile * len(samples)))
+        return samples[index]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class Hedger:
+    """
+    Runs an attempt and, if it has not produced its first byte by the model's
+    hedging deadline, a second attempt, as long as the model's hedge budget has
+    a token left. Every run adds `budget` tokens and every hedge takes one, so
+    a slow backend is not hit with twice the load. The first attempt to succeed
+    wins and the other is cancelled. `won` is told which attempt won, counting
+    in the order they were started, so the caller can keep only its timings.
+
+    Attempts are async. Synchronous callers use `call` and `stream`, which run
+    the attempts on a private event loop on the calling thread, so the first
+    attempt runs inline and a losing attempt is cancelled all the same.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.hedged = 0
+        self.throttled = 0
+
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._tokens: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def latencies(self, key: str) -> LatencyWindow:
+        with self._lock:
+            latencies = self._windows.get(key, None)
+            if latencies is None:
+                latencies = self._windows[key] = LatencyWindow(self.window)
+            return latencies
+
+    def deadline(self, key: str, policy: HedgePolicy) -> float:
+        latencies = self.latencies(key)
+        if len(latencies) < policy.min_samples:
+            return policy.delay
+        return latencies.percentile(policy.percentile) or policy.delay
+
+    def _deposit(self, key: str, policy: HedgePolicy) -> None:
+        with self._lock:
+            tokens = self._tokens.get(key, policy.burst)
+            self._tokens[key] = min(policy.burst, tokens + policy.budget)
+
+    def _hedge(self, key: str) -> bool:
+        """
+        Take a token from the budget to hedge, False if there are none left
+        """
+        with self._lock:
+            tokens = self._tokens.get(key, 0.0)
+            if tokens < 1.0:
+                self.throttled += 1
+                hedge = False
+            else:
+                self._tokens[key] = tokens - 1.0
+                self.hedged += 1
+                hedge = True
+
+        if hedge:
+            verbose_logger.info("[Langflow] First byte deadline passed for %s, hedging", key)
+        else:
+            verbose_logger.debug("[Langflow] Hedge budget of %s spent, not hedging", key)
+        return hedge
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hedged": self.hedged, "throttled": self.throttled}
+
+    def call(
+        self,
+        key: str,
+        policy: HedgePolicy,
+        attempt: Callable[[], Awaitable[T]],
+        cleanup: Optional[Callable[[], Awaitable[None]]] = None,
+        won: Optional[Callable[[int], None]] = None,
+    ) -> T:
+        """
+        `acall` for callers without an event loop, run on a private loop on the
+        calling thread. `cleanup` runs on the loop before it is closed, to close
+        clients bound to it.
+        """
+
+        async def run() -> T:
+            try:
+                return await self.acall(key, policy, attempt, won)
+            finally:
+                if cleanup is not None:
+                    await cleanup()
+
+        return asyncio.run(run())
+
+    async def acall(
+        self,
+        key: str,
+        policy: HedgePolicy,
+        attempt: Callable[[], Awaitable[T]],
+        won: Optional[Callable[[int], None]] = None,
+    ) -> T:
+        async def timed() -> T:
+            started = time.monotonic()
+            result = await attempt()
+            self.latencies(key).record(time.monotonic() - started)
+            return result
+
+        self._deposit(key, policy)
+        tasks = [asyncio.ensure_future(timed())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.deadline(key, policy))
+            if not done and self._hedge(key):
+                tasks.append(asyncio.ensure_future(timed()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for index, task in enumerate(tasks):
+                    if task in done and task.exception() is None:
+                        if won is not None:
+                            won(index)
+                        return task.result()
+            if won is not None:
+                won(0)
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stream(
+        self,
+        key: str,
+        policy: HedgePolicy,
+        start: Callable[[], AsyncIterator[T]],
+        cleanup: Optional[Callable[[], Awaitable[None]]] = None,
+        won: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[T]:
+        """
+        `astream` for callers without an event loop, read a chunk at a time on
+        a private loop on the calling thread. `cleanup` runs on the loop before
+        it is closed.
+        """
+        loop = asyncio.new_event_loop()
+        chunks = self.astream(key, policy, start, won)
+        try:
+            while True:
+                try:
+                    chunk = loop.run_until_complete(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            try:
+                loop.run_until_complete(chunks.aclose())
+                if cleanup is not None:
+                    loop.run_until_complete(cleanup())
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+
+    async def astream(
+        self,
+        key: str,
+        policy: HedgePolicy,
+        start: Callable[[], AsyncIterator[T]],
+        won: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[T]:
+        """
+        Hedge a stream until its first chunk, the rest of the winning stream is
+        read by the caller. The losing attempt is cancelled, or closed if it
+        produced its first chunk too.
+        """
+
+        async def first_chunk() -> Tuple[AsyncIterator[T], object]:
+            started = time.monotonic()
+            iterator = start()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                chunk = _END
+            except BaseException:
+                await aclose_iterator(iterator)
+                raise
+            self.latencies(key).record(time.monotonic() - started)
+            return iterator, chunk
+
+        self._deposit(key, policy)
+        tasks = [asyncio.ensure_future(first_chunk())]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.deadline(key, policy))
+            if not done and self._hedge(key):
+                tasks.append(asyncio.ensure_future(first_chunk()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                succeeded = [
+                    task for task in tasks if task in done and task.exception() is None
+                ]
+                if succeeded:
+                    winner = succeeded[0]
+                    break
+            else:
+                winner = tasks[0]
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    await _acancel_stream(task)
+
+        if won is not None:
+            won(tasks.index(winner))
+        iterator, chunk = winner.result()
+        try:
+            if chunk is _END:
+                return
+            yield chunk  # type: ignore
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await aclose_iterator(iterator)
+
+
+async def _acancel_stream(task: asyncio.Future) -> None:
+    task.cancel()
+    await asyncio.wait({task})
+    if task.cancelled() or task.exception() is not None:
+        return
+    iterator, _ = task.result()
+    await aclose_iterator(iterator)
@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Callable, List
+
+
+@dataclass
+class HistoryPolicy:
+    """
+    Limits on the conversation history sent to LangFlow with each run.
+
+    `max_tokens` is the token budget for the history plus the new input, with 0
+    meaning unlimited. System messages and the last `keep_turns` turns are always
+    kept, then older turns are added back newest first while they fit the budget.
+    Dropped turns are replaced by a single marker message when `elide` is set.
+    """
+
+    max_tokens: int = 0
+    keep_turns: int = 4
+    elide: bool = True
+
+
+def _message_text(message) -> str:
+    if isinstance(message, dict):
+        return str(message.get("content", ""))
+    return str(message)
+
+
+def _is_role(message, role: str) -> bool:
+    return isinstance(message, dict) and message.get("role") == role
+
+
+def compact_history(
+    history: list,
+    current: dict,
+    policy: HistoryPolicy,
+    count_tokens: Callable[[str], int],
+) -> list:
+    """
+    Apply the history policy to the prior messages of a conversation. `current`
+    is the new input which always counts against the budget.
+    """
+    if policy.max_tokens <= 0 or len(history) == 0:
+        return history
+
+    costs = [count_tokens(_message_text(message)) for message in history]
+    current_cost = count_tokens(_message_text(current))
+    if sum(costs) + current_cost <= policy.max_tokens:
+        return history
+
+    # System messages are always kept, the rest is grouped into turns which
+    # each start at a user message
+    system = [index for index, message in enumerate(history) if _is_role(message, "system")]
+    turns: List[List[int]] = []
+    for index, message in enumerate(history):
+        if _is_role(message, "system"):
+            continue
+        if not turns or _is_role(message, "user"):
+            turns.append([])
+        turns[-1].append(index)
+
+    keep_turns = max(policy.keep_turns, 0)
+    recent = turns[len(turns) - keep_turns:] if keep_turns else []
+    older = turns[: len(turns) - len(recent)]
+
+    kept = set(system)
+    for turn in recent:
+        kept.update(turn)
+    used = sum(costs[index] for index in kept) + current_cost
+
+    # Add back older turns, newest first, while they fit in the budget
+    for turn in reversed(older):
+        cost = sum(costs[index] for index in turn)
+        if used + cost > policy.max_tokens:
+            break
+        kept.update(turn)
+        used += cost
+
+    dropped = len(history) - len(kept)
+    if dropped == 0:
+        return history
+
+    compacted = []
+    elided = False
+    for index, message in enumerate(history):
+        if index in kept:
+            compacted.append(message)
+        elif policy.elide and not elided:
+            compacted.append(
+                {"role": "system", "content": f"[{dropped} earlier messages omitted]"}
+            )
+            elided = True
+    return compacted
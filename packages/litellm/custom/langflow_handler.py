@@ -1,6 +1,13 @@
-from typing import Iterator, AsyncIterator, Optional, Union, Callable
+from typing import Awaitable, Dict, Iterator, AsyncIterator, List, Optional, Tuple, Union, Callable
+from dataclasses import asdict
+import asyncio
+import atexit
 import os
 import json
+import random
+import tempfile
+import threading
+import time
 
 import httpx  # type: ignore
 
@@ -13,6 +20,35 @@ from litellm.types.utils import GenericStreamingChunk
 from litellm._logging import verbose_logger
 from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler, HTTPHandler
 
+from .admission import BATCH, INTERACTIVE, AdaptiveLimiter, FairQueue
+from .batch import BatchProgress, run_batch
+from .cancellation import CancelledRuns, aclose_iterator, close_iterator
+from .chunk_coalescer import acoalesce_chunks, coalesce_chunks
+from .client_pool import LangflowClientPool
+from .exceptions import BaseLLMException
+from .flow_cache import FlowMetadata, FlowMetadataCache
+from .hedging import Hedger, HedgePolicy
+from .history import HistoryPolicy, compact_history
+from .load_balancer import LangflowLoadBalancer
+from .model_mapping import ModelMapping, apply_mapping
+from .phase_timings import AttemptTimings, RequestTimings
+from .profiling import ProfileStore, RequestProfile
+from .read_ahead import read_ahead
+from .response_cache import (
+    ResponseCache,
+    SqliteResponseCache,
+    arecord_chunks,
+    record_chunks,
+    replay_chunks,
+    response_cache_key,
+)
+from .single_flight import SingleFlight
+from .stream_decoder import DONE, StreamDecoder, loads
+from .stream_metrics import LazyJSON, StreamMetrics
+from .stream_usage import StreamUsage
+from .timeouts import RunTimeouts, earliest
+from .token_cache import TokenCountCache
+
 
 # Helper representation of an empty chunk
 # GenericStreamingChunk is a TypedDict, so we create it like a dict
@@ -21,38 +57,35 @@ EMPTY_CHUNK = GenericStreamingChunk(
 )
 
 
-class BaseLLMException(Exception):
+def _get_setting(optional_params: Optional[dict], name: str, default):
     """
-    Exception implementation for LLM errors. In the future this should be
-    imported from LiteLLM once it is exposed by the LiteLLM Library
+    Get a per-model setting. Settings are added to the model's `litellm_params`
+    in the LiteLLM config, which LiteLLM passes through as optional params, and
+    fall back to the `LANGFLOW_<NAME>` environment variable then the default.
+    The value is converted to the type of the default.
     """
+    value = None
+    if optional_params is not None:
+        value = optional_params.get(name, None)
+    if value is None:
+        value = os.environ.get(f"LANGFLOW_{name.upper()}", None)
+    if value is None or default is None:
+        return value if value is not None else default
+
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
 
-    def __init__(
-        self,
-        status_code: int,
-        message: str,
-        headers: Optional[Union[dict, httpx.Headers]] = None,
-        request: Optional[httpx.Request] = None,
-        response: Optional[httpx.Response] = None,
-    ):
-        self.status_code = status_code
-        self.message: str = message
-        self.headers = headers
-        if request:
-            self.request = request
-        else:
-            self.request = httpx.Request(
-                method="POST", url="https://docs.litellm.ai/docs"
-            )
-        if response:
-            self.response = response
-        else:
-            self.response = httpx.Response(
-                status_code=status_code, request=self.request
-            )
-        super().__init__(
-            self.message
-        )  # Call the base class constructor with the parameters it needs
+
+def _loop_running() -> bool:
+    """
+    Whether the calling thread is running an event loop
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
 
 
 def _create_openai_streaming_iterator(
@@ -63,24 +96,16 @@ def _create_openai_streaming_iterator(
     Uses httpx streaming context manager properly - context stays open during iteration.
     """
 
-    def _parse_chunk(chunk_text: str) -> GenericStreamingChunk:
+    def _parse_chunk(chunk_text: bytes) -> GenericStreamingChunk:
         """
         Parse a chunk from OpenAI-compatible format.
-        chunk_text should already have 'data: ' prefix removed.
+        chunk_text should already have 'data: ' prefix removed by the StreamDecoder.
         Always returns a GenericStreamingChunk object, never a dict.
         """
-        verbose_logger.debug(
-            f"[Langflow Streaming] Parsing chunk text: {chunk_text[:200]}..."
-        )
-
         if len(chunk_text) == 0:
-            verbose_logger.debug(
-                "[Langflow Streaming] Empty chunk text, returning EMPTY_CHUNK"
-            )
             return EMPTY_CHUNK
 
-        if chunk_text == "[DONE]":
-            verbose_logger.info("[Langflow Streaming] Received [DONE] marker in chunk")
+        if chunk_text == DONE:
             return GenericStreamingChunk(
                 text="",
                 is_finished=True,
@@ -91,32 +116,29 @@ def _create_openai_streaming_iterator(
             )
 
         try:
-            chunk_json = json.loads(chunk_text)
-            verbose_logger.debug(
-                f"[Langflow Streaming] Parsed JSON: {json.dumps(chunk_json, indent=2) if isinstance(chunk_json, dict) else str(chunk_json)}"
-            )
+            chunk_json = loads(chunk_text)
 
             # Safety check: ensure chunk_json is a dict
             if not isinstance(chunk_json, dict):
                 verbose_logger.error(
-                    f"[Langflow Streaming] Parsed JSON is not a dict, type: {type(chunk_json)}, value: {chunk_json}"
+                    "[Langflow Streaming] Parsed JSON is not a dict, type: %s, value: %s",
+                    type(chunk_json),
+                    chunk_json,
                 )
                 return EMPTY_CHUNK
 
         except (json.JSONDecodeError, UnicodeDecodeError) as e:
             verbose_logger.error(
-                f"[Langflow Streaming] Failed to parse chunk JSON: {chunk_text}"
+                "[Langflow Streaming] Failed to parse chunk JSON: %r", chunk_text
             )
             verbose_logger.error(f"[Langflow Streaming] Error: {str(e)}", exc_info=True)
             # Return EMPTY_CHUNK instead of raising to avoid breaking the stream
             return EMPTY_CHUNK
 
-        # Check if this is a completion chunk
-        status = chunk_json.get("status")
-        verbose_logger.debug(f"[Langflow Streaming] Chunk status: {status}")
+        verbose_logger.debug("[Langflow Streaming] Parsed JSON: %s", LazyJSON(chunk_json))
 
-        if status == "completed":
-            verbose_logger.info("[Langflow Streaming] Chunk marked as completed")
+        # Check if this is a completion chunk
+        if chunk_json.get("status") == "completed":
             return GenericStreamingChunk(
                 text="",
                 is_finished=True,
@@ -128,20 +150,13 @@ def _create_openai_streaming_iterator(
 
         # Extract content from delta
         delta = chunk_json.get("delta", {})
-        verbose_logger.info(
-            f"[Langflow Streaming] Delta object: {json.dumps(delta, indent=2) if isinstance(delta, dict) else str(delta)}"
-        )
-        verbose_logger.info(
-            f"[Langflow Streaming] Full chunk_json keys: {list(chunk_json.keys())}"
-        )
-        verbose_logger.info(
-            f"[Langflow Streaming] Full chunk_json: {json.dumps(chunk_json, indent=2)}"
-        )
 
         # Ensure delta is a dict
         if not isinstance(delta, dict):
             verbose_logger.warning(
-                f"[Langflow Streaming] Delta is not a dict, type: {type(delta)}, value: {delta}"
+                "[Langflow Streaming] Delta is not a dict, type: %s, value: %s",
+                type(delta),
+                delta,
             )
             return EMPTY_CHUNK
 
@@ -149,24 +164,16 @@ def _create_openai_streaming_iterator(
         # Ensure content is a string
         if not isinstance(content, str):
             verbose_logger.warning(
-                f"[Langflow Streaming] Content is not a string, type: {type(content)}, value: {content}"
+                "[Langflow Streaming] Content is not a string, type: %s, value: %s",
+                type(content),
+                content,
             )
             content = str(content) if content is not None else ""
 
-        verbose_logger.info(
-            f"[Langflow Streaming] Extracted content (length={len(content)}): {content[:100]}..."
-        )
-
         if not content:
-            verbose_logger.debug(
-                "[Langflow Streaming] No content in delta, returning EMPTY_CHUNK"
-            )
             return EMPTY_CHUNK
 
-        verbose_logger.info(
-            f"[Langflow Streaming] Creating chunk with content (length={len(content)}): {content[:100]}..."
-        )
-        chunk = GenericStreamingChunk(
+        return GenericStreamingChunk(
             text=content,
             is_finished=False,
             finish_reason="",
@@ -174,146 +181,66 @@ def _create_openai_streaming_iterator(
             index=0,
             tool_use=None,
         )
-        verbose_logger.info(
-            f"[Langflow Streaming] Created chunk: text_length={len(chunk.get('text', ''))}, is_finished={chunk.get('is_finished', False)}"
-        )
-        return chunk
 
     # Use httpx streaming context manager - this properly keeps connection open during iteration
-    verbose_logger.info(f"[Langflow Streaming] Opening streaming context for: {url}")
-    verbose_logger.info(
-        f"[Langflow Streaming] Request body: {json.dumps(request_body, indent=2)}"
-    )
-    verbose_logger.info(
-        f"[Langflow Streaming] Request headers: {json.dumps({k: '***' if k == 'x-api-key' else v for k, v in headers.items()}, indent=2)}"
+    verbose_logger.debug("[Langflow Streaming] Opening streaming context for: %s", url)
+    verbose_logger.debug("[Langflow Streaming] Request body: %s", LazyJSON(request_body))
+    verbose_logger.debug(
+        "[Langflow Streaming] Request headers: %s",
+        LazyJSON({k: "***" if k == "x-api-key" else v for k, v in headers.items()}),
     )
 
+    metrics = StreamMetrics("openai", str(request_body.get("model", "")))
+    decoder = StreamDecoder(sse=True)
+    status = "incomplete"
     try:
         with httpx_client.stream(
             "POST", url, json=request_body, headers=headers
         ) as response:
-            verbose_logger.info(
-                f"[Langflow Streaming] Response status: {response.status_code}"
-            )
-            verbose_logger.info(
-                f"[Langflow Streaming] Response headers: {dict(response.headers)}"
+            verbose_logger.debug(
+                "[Langflow Streaming] Response status: %s, headers: %s",
+                response.status_code,
+                response.headers,
             )
 
             response.raise_for_status()
 
-            content_type = response.headers.get("content-type", "")
-            verbose_logger.info(
-                f"[Langflow Streaming] Response Content-Type: {content_type}"
-            )
-
-            # Log first few bytes to see what we're receiving
-            verbose_logger.info(
-                "[Langflow Streaming] Starting to read stream from Langflow"
-            )
-
-            # Iterate over lines from the streaming response
-            line_count = 0
-            chunk_count = 0
-            chunks_with_content = 0
-            chunks_yielded = 0
-            for line in response.iter_lines():
-                line_count += 1
-                if line_count <= 10 or line_count % 5 == 0:
-                    verbose_logger.info(
-                        f"[Langflow Streaming] Received line {line_count} (length={len(line)}): {line[:300]}..."
-                    )
-                else:
-                    verbose_logger.debug(
-                        f"[Langflow Streaming] Received line {line_count} (length={len(line)}): {line[:200]}..."
-                    )
-
-                if not line:
-                    verbose_logger.debug("[Langflow Streaming] Skipping empty line")
-                    continue
-
-                # Handle SSE format: "data: {...}\n\n"
-                if line.startswith("data: "):
-                    chunk_count += 1
-                    chunk_text = line[6:].strip()
-                    verbose_logger.info(
-                        f"[Langflow Streaming] Chunk {chunk_count} - Parsing SSE chunk: {chunk_text[:300]}..."
-                    )
-
-                    try:
-                        chunk = _parse_chunk(chunk_text)
-                        # GenericStreamingChunk is a TypedDict, so we check for required keys instead of isinstance
-                        # Verify chunk has the expected structure (TypedDict is essentially a dict)
-                        if not isinstance(chunk, dict) or "is_finished" not in chunk:
-                            chunk_keys = (
-                                list(chunk.keys())
-                                if isinstance(chunk, dict)
-                                else 'N/A'
-                            )
-                            verbose_logger.error(
-                                f"[Langflow Streaming] _parse_chunk returned invalid chunk: "
-                                f"{type(chunk)}, keys: {chunk_keys}"
-                            )
-                            # Skip this chunk
-                            continue
-
-                        if chunk.get("is_finished", False):
-                            chunks_yielded += 1
-                            verbose_logger.info(
-                                "[Langflow Streaming] Received finished chunk, ending stream"
-                            )
-                            verbose_logger.info(
-                                f"[Langflow Streaming] Stream summary: lines={line_count}, "
-                                f"chunks_parsed={chunk_count}, "
-                                f"chunks_with_content={chunks_with_content}, "
-                                f"chunks_yielded={chunks_yielded}"
-                            )
-                            yield chunk
-                            return
-                        elif chunk.get("text"):  # Only yield non-empty chunks
-                            chunk_text_value = chunk.get("text", "")
-                            chunks_with_content += 1
-                            chunks_yielded += 1
-                            verbose_logger.info(
-                                f"[Langflow Streaming] Yielding chunk {chunks_yielded} with text (length={len(chunk_text_value)}): {chunk_text_value[:100]}..."
-                            )
-                            yield chunk
-                        else:
-                            verbose_logger.debug(
-                                "[Langflow Streaming] Chunk has no text, skipping"
-                            )
-                    except Exception as parse_err:
+            # Frame events directly from the raw byte stream
+            for chunk_text in decoder.iter_events(response.iter_bytes()):
+                try:
+                    chunk = _parse_chunk(chunk_text)
+                    # GenericStreamingChunk is a TypedDict, so we check for required keys instead of isinstance
+                    # Verify chunk has the expected structure (TypedDict is essentially a dict)
+                    if not isinstance(chunk, dict) or "is_finished" not in chunk:
+                        chunk_keys = (
+                            list(chunk.keys())
+                            if isinstance(chunk, dict)
+                            else 'N/A'
+                        )
                         verbose_logger.error(
-                            f"[Langflow Streaming] Error parsing chunk: {str(parse_err)}",
-                            exc_info=True,
+                            f"[Langflow Streaming] _parse_chunk returned invalid chunk: "
+                            f"{type(chunk)}, keys: {chunk_keys}"
                         )
-                        # Continue processing other chunks instead of breaking the stream
+                        # Skip this chunk
                         continue
-                elif line.strip() == "[DONE]":
-                    verbose_logger.info(
-                        "[Langflow Streaming] Received [DONE] marker on standalone line"
-                    )
-                    yield GenericStreamingChunk(
-                        text="",
-                        is_finished=True,
-                        finish_reason="stop",
-                        usage=None,
-                        index=0,
-                        tool_use=None,
-                    )
-                    return
-                else:
-                    verbose_logger.debug(
-                        f"[Langflow Streaming] Line does not match SSE format: {line[:100]}..."
+                except Exception as parse_err:
+                    verbose_logger.error(
+                        f"[Langflow Streaming] Error parsing chunk: {str(parse_err)}",
+                        exc_info=True,
                     )
+                    # Continue processing other chunks instead of breaking the stream
+                    continue
 
-            verbose_logger.info("[Langflow Streaming] Stream ended - no more lines")
-            verbose_logger.info(
-                f"[Langflow Streaming] Final summary: lines={line_count}, "
-                f"chunks_parsed={chunk_count}, "
-                f"chunks_with_content={chunks_with_content}, "
-                f"chunks_yielded={chunks_yielded}"
-            )
+                if chunk["is_finished"]:
+                    status = "completed"
+                    metrics.finish(status, decoder.bytes_received)
+                    yield chunk
+                    return
+                elif chunk["text"]:  # Only yield non-empty chunks
+                    metrics.record_chunk(chunk["text"])
+                    yield chunk
     except httpx.HTTPStatusError as e:
+        status = "error"
         error_text = ""
         try:
             if hasattr(e.response, "read"):
@@ -333,12 +260,18 @@ def _create_openai_streaming_iterator(
             message=error_text,
             headers=getattr(e.response, "headers", None),
         )
+    except GeneratorExit:
+        status = "cancelled"
+        raise
     except Exception as e:
+        status = "error"
         verbose_logger.error(
             f"[Langflow Streaming] Unexpected error in generator: {str(e)}",
             exc_info=True,
         )
         raise
+    finally:
+        metrics.finish(status, decoder.bytes_received)
 
 
 class LangflowChunkParser:
@@ -352,14 +285,22 @@ class LangflowChunkParser:
         self.langflow_response = langflow_response
         self.sync_stream = sync_stream
 
-        # Use old format parser
-        self.stream = self.langflow_response.iter_lines()
-        self.astream = self.langflow_response.aiter_lines()
+        # Langflow's native format is newline delimited JSON events
+        self.decoder = StreamDecoder()
+        self.stream = self.decoder.iter_events(self.langflow_response.iter_bytes())
+        self.astream = self.decoder.aiter_events(self.langflow_response.aiter_bytes())
 
         # Helper to determine if the request is agentic (doesn't produce token messages)
         # As soon as a token payload is recieved, this is set to False
         self.agentic = True
 
+        # Agentic text already streamed from partial messages, which later
+        # messages and the end payload are diffed against
+        self.sent = ""
+
+        # Time spent parsing events, excluding waiting on LangFlow
+        self.parse_seconds = 0.0
+
     def _parse_token_chunk(self, payload: dict) -> GenericStreamingChunk:
         # Get the token content from the chunk
         data = payload.get("data", None)
@@ -422,6 +363,20 @@ class LangflowChunkParser:
             verbose_logger.warning(f"text missing on chunk: {payload}")
             raise BaseLLMException(500, message="Missing text on Langflow chunk")
 
+        # Only the part not already streamed from the partial messages is sent.
+        # Text that diverges from what was streamed cannot be taken back, so
+        # only what follows the part both have in common is sent.
+        if text.startswith(self.sent):
+            text = text[len(self.sent):]
+        else:
+            common = len(os.path.commonprefix([self.sent, text]))
+            verbose_logger.warning(
+                "Langflow end payload diverges from the streamed messages after %s of %s characters",
+                common,
+                len(self.sent),
+            )
+            text = text[common:]
+
         return GenericStreamingChunk(
             text=text,
             is_finished=True,
@@ -431,15 +386,43 @@ class LangflowChunkParser:
             tool_use=None,
         )
 
-    def _parse_chunck(self, raw: str) -> GenericStreamingChunk:
+    def _parse_agentic_message(self, payload: dict) -> GenericStreamingChunk:
+        # Agentic flows send the answer so far as partial messages while they
+        # run. Completed messages are skipped as standard flows also send one
+        # ahead of their tokens, and the end payload carries the final text.
+        data = payload.get("data", None)
+        if not self.agentic or not isinstance(data, dict) or data.get("sender", None) == "User":
+            return EMPTY_CHUNK
+        if (data.get("properties", None) or {}).get("state", None) != "partial":
+            return EMPTY_CHUNK
+
+        # Messages hold the whole text so far, so only the new part is sent. A
+        # message that does not continue the text sent, such as another
+        # agent's, is left to the end payload.
+        text = data.get("text", None)
+        if not isinstance(text, str) or len(text) <= len(self.sent) or not text.startswith(self.sent):
+            return EMPTY_CHUNK
+
+        delta = text[len(self.sent):]
+        self.sent = text
+        return GenericStreamingChunk(
+            text=delta,
+            is_finished=False,
+            finish_reason="",
+            usage=None,
+            index=0,
+            tool_use=None,
+        )
+
+    def _parse_chunck(self, raw: Union[str, bytes]) -> GenericStreamingChunk:
         if len(raw) == 0:
             return EMPTY_CHUNK
 
         # Convert the chunk to JSON
         try:
-            chunk_json = json.loads(raw)
+            chunk_json = loads(raw)
         except (json.JSONDecodeError, UnicodeDecodeError) as e:
-            verbose_logger.warning(f"Failed to parse string: {raw}")
+            verbose_logger.warning(f"Failed to parse string: {raw!r}")
             raise BaseLLMException(500, message=str(e))
 
         # Get the type from the chunk
@@ -448,10 +431,9 @@ class LangflowChunkParser:
             verbose_logger.warning(f"event type missing on chunk: {raw}")
             raise BaseLLMException(500, message="Missing event type in Langflow chunk")
 
-        # Some events are not passed back to the user and an empty chunk is sent instead
-        unused_event_types = ["add_message"]
-        if event_type in unused_event_types:
-            return EMPTY_CHUNK
+        # Messages only carry text for agentic flows, otherwise an empty chunk is sent instead
+        if event_type == "add_message":
+            return self._parse_agentic_message(chunk_json)
 
         # Token message handling
         if event_type == "token":
@@ -489,7 +471,9 @@ class LangflowChunkParser:
         next_chunk = next(self.stream)
 
         # Parse the chunk
+        started = time.perf_counter()
         parsed = self._parse_chunck(next_chunk)
+        self.parse_seconds += time.perf_counter() - started
 
         return parsed
 
@@ -501,11 +485,42 @@ class LangflowChunkParser:
         next_chunk = await anext(self.astream)
 
         # Parse the chunk
+        started = time.perf_counter()
         parsed = self._parse_chunck(next_chunk)
+        self.parse_seconds += time.perf_counter() - started
 
         return parsed
 
 
+class _Attempts:
+    """
+    Timeouts and timings of the attempts of a request. Each attempt, of which a
+    hedged request may start two, gets its own first byte clock and timings, and
+    only the timings of the attempt that won are added to the request's.
+    """
+
+    def __init__(self, timeouts: RunTimeouts, timings: RequestTimings):
+        self.timeouts = timeouts
+        self.timings = timings
+        self.winner: Optional[int] = None
+        self._timings: List[AttemptTimings] = []
+        self._lock = threading.Lock()
+
+    def new(self) -> Tuple[RunTimeouts, AttemptTimings]:
+        timings = self.timings.attempt()
+        with self._lock:
+            self._timings.append(timings)
+            if len(self._timings) - 1 == self.winner:
+                timings.publish()
+        return self.timeouts.attempt(), timings
+
+    def won(self, index: int) -> None:
+        with self._lock:
+            self.winner = index
+            if index < len(self._timings):
+                self._timings[index].publish()
+
+
 class Langflow(CustomLLM):
     """
     Implementation of the LangFlow Custom provider. Can communicate with a number
@@ -515,43 +530,157 @@ class Langflow(CustomLLM):
     def __init__(self):
         self.mapping_endpoint = f"{os.environ['HELPER_BACKEND']}/mapping"
 
+        # Model names are resolved to flows through the helper backend's mapping,
+        # held in memory and refreshed in the background
+        self.model_mapping: Optional[ModelMapping] = None
+        if _get_setting(None, "model_mapping", False):
+            self.model_mapping = ModelMapping(
+                self.mapping_endpoint,
+                refresh_interval=_get_setting(None, "model_mapping_refresh", 60.0),
+            )
+            self.model_mapping.start()
+
+        # Flow documents are large, so the parts needed per request are cached
+        self.flow_cache = FlowMetadataCache(
+            ttl=float(os.environ.get("LANGFLOW_FLOW_CACHE_TTL", 300)),
+            max_entries=int(os.environ.get("LANGFLOW_FLOW_CACHE_SIZE", 256)),
+        )
+
+        # Connections to LangFlow are pooled per base URL and reused between requests
+        self.clients = LangflowClientPool(
+            max_connections=int(os.environ.get("LANGFLOW_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(
+                os.environ.get("LANGFLOW_MAX_KEEPALIVE_CONNECTIONS", 20)
+            ),
+            keepalive_expiry=float(os.environ.get("LANGFLOW_KEEPALIVE_EXPIRY", 30)),
+            http2_bases=[
+                base.strip()
+                for base in os.environ.get("LANGFLOW_HTTP2_BASES", "").split(",")
+                if base.strip()
+            ],
+        )
+
+        # Conversations resend their earlier messages every turn, so token counts
+        # are memoized per message
+        self.token_cache = TokenCountCache(
+            max_entries=int(os.environ.get("LANGFLOW_TOKEN_CACHE_SIZE", 4096)),
+        )
+
+        # Response caches of the models that opt in, shared by models with the same settings
+        self.response_caches: Dict[Tuple[str, float, int], ResponseCache] = {}
+        self._response_caches_lock = threading.Lock()
+
+        # Identical in-flight streams of models that opt in share one upstream run
+        self.single_flight = SingleFlight()
+
+        # Models can be served by several LangFlow replicas, see `_get_api_bases`
+        self.balancer = LangflowLoadBalancer(
+            probe_interval=float(os.environ.get("LANGFLOW_HEALTH_PROBE_INTERVAL", 10)),
+            probe_path=os.environ.get("LANGFLOW_HEALTH_PROBE_PATH", "/health"),
+            cooldown=float(os.environ.get("LANGFLOW_REPLICA_COOLDOWN", 30)),
+            circuit_failures=int(os.environ.get("LANGFLOW_CIRCUIT_FAILURES", 5)),
+            circuit_reset=float(os.environ.get("LANGFLOW_CIRCUIT_RESET", 30)),
+        )
+
+        # Runs of models that opt in are hedged once they pass their first byte deadline
+        self.hedger = Hedger()
+
+        # Concurrency limits of the flows that set `concurrency_limit`, with the
+        # settings they were last configured from
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self._limiter_settings: Dict[str, tuple] = {}
+        self._limiters_lock = threading.Lock()
+
+        # Streaming runs closed before they finished, which LangFlow cancels
+        self.cancelled_runs = CancelledRuns()
+
+        # Directories profiles of sampled requests are saved to
+        self.profile_stores: Dict[Tuple[str, int, int], ProfileStore] = {}
+        self._profile_stores_lock = threading.Lock()
+
+    def token_cache_stats(self) -> dict:
+        """
+        Hit rate of the memoized token counts
+        """
+        return self.token_cache.stats()
+
+    def admission_stats(self) -> dict:
+        """
+        Concurrency limit, queue depth and queue wait times of each limited flow
+        """
+        with self._limiters_lock:
+            limiters = dict(self.limiters)
+        return {model: limiter.stats() for model, limiter in limiters.items()}
+
+    def backend_stats(self) -> dict:
+        """
+        In-flight runs and health of each LangFlow replica
+        """
+        return self.balancer.stats()
+
+    def hedging_stats(self) -> dict:
+        """
+        Runs hedged, and runs past their deadline not hedged as the budget was spent
+        """
+        return self.hedger.stats()
+
+    def cancellation_stats(self) -> dict:
+        """
+        Runs cancelled upstream because their stream was closed early
+        """
+        return self.cancelled_runs.stats()
+
+    def model_mapping_stats(self) -> dict:
+        """
+        Size and refresh state of the model to flow mapping
+        """
+        if self.model_mapping is None:
+            return {}
+        return self.model_mapping.stats()
+
+    def refresh_model_mapping(self) -> None:
+        """
+        Reload the model to flow mapping in the background, for when it changes
+        """
+        if self.model_mapping is not None:
+            self.model_mapping.notify()
+
+    def connection_stats(self) -> dict:
+        """
+        Number of streams carried by each pooled connection per LangFlow base URL
+        """
+        return self.clients.connection_stats()
+
+    def close(self) -> None:
+        """
+        Close the pooled connections to LangFlow, called on proxy shutdown
+        """
+        self.clients.close()
+        self.balancer.close()
+        if self.model_mapping is not None:
+            self.model_mapping.close()
+        with self._response_caches_lock:
+            for cache in self.response_caches.values():
+                cache.close()
+            self.response_caches.clear()
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled connections to LangFlow including the async clients
+        """
+        await self.clients.aclose()
+
     def _calculate_token_usage(
         self, model: str, messages: list, completion_text: str, encoding=None
     ) -> Usage:
         """
         Calculate token usage for prompt and completion.
         Uses encoding if provided, otherwise falls back to litellm.token_counter.
+        Counts are memoized per message, so only new messages are tokenized.
         """
         try:
-            if encoding is not None:
-                # Use the provided encoding if available
-                prompt_tokens = sum(
-                    len(encoding.encode(str(msg.get("content", ""))))
-                    for msg in messages
-                    if isinstance(msg, dict) and "content" in msg
-                )
-                completion_tokens = len(encoding.encode(completion_text))
-            else:
-                # Fall back to litellm.token_counter for model-specific tokenization
-                try:
-                    prompt_tokens = litellm.token_counter(
-                        model=model, messages=messages
-                    )
-                    completion_tokens = litellm.token_counter(
-                        model=model, text=completion_text
-                    )
-                except Exception as e:
-                    verbose_logger.warning(
-                        f"Failed to use litellm.token_counter: {e}, using approximation"
-                    )
-                    # Fallback approximation: ~4 characters per token
-                    prompt_text = " ".join(
-                        str(msg.get("content", ""))
-                        for msg in messages
-                        if isinstance(msg, dict)
-                    )
-                    prompt_tokens = len(prompt_text) // 4
-                    completion_tokens = len(completion_text) // 4
+            prompt_tokens = self._count_prompt_tokens(model, messages, encoding)
+            completion_tokens = self._count_tokens(model, completion_text, encoding)
 
             total_tokens = prompt_tokens + completion_tokens
 
@@ -566,17 +695,37 @@ class Langflow(CustomLLM):
             )
             return Usage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
 
-    def _get_history_component_id(
-        self, model: str, base_url: str, client: HTTPHandler, api_key: str
-    ) -> Optional[str]:
+    def _fetch_history_component_id(
+        self,
+        model: str,
+        base_url: str,
+        client: HTTPHandler,
+        api_key: str,
+        cached: Optional[FlowMetadata],
+        timeouts: Optional[RunTimeouts] = None,
+    ) -> FlowMetadata:
         """
         Get the history component ID. This relies on the LangFlow API to find the flow based on the
         model name and parse the components. The history component should start with `CompletionInterface`.
+        When a previously cached entry is provided it is revalidated rather than rebuilt.
         """
-        # Make the request to get the flow data and handle any errors
+        timeouts = timeouts or RunTimeouts(model)
+        # Make the request to get the flow data and handle any errors. LiteLLM's
+        # handler takes no timeout for a GET, so its httpx client is used directly
         request_url = f"{base_url}/api/v1/flows/{model}"
         try:
-            response = client.get(request_url, headers={"x-api-key": api_key}).json()
+            response = client.client.get(
+                request_url,
+                headers=self._flow_request_headers(api_key, cached),
+                timeout=timeouts.lookup_timeout(),
+            )
+            if response.status_code == 304 and cached is not None:
+                return cached
+            response.raise_for_status()
+            etag = response.headers.get("etag", None)
+            response = response.json()
+        except httpx.TimeoutException as e:
+            raise timeouts.expired(f"flow lookup {timeouts.phase(e)}")
         except httpx.HTTPStatusError as e:
             error_headers = getattr(e, "headers", None)
             error_response = getattr(e, "response", None)
@@ -593,6 +742,11 @@ class Langflow(CustomLLM):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
 
+        # The flow has not changed since it was last parsed
+        updated_at = response.get("updated_at", None)
+        if cached is not None and updated_at is not None and updated_at == cached.updated_at:
+            return FlowMetadata(cached.history_component, etag, updated_at)
+
         # Get the data off of the response
         flow_data = response.get("data", None)
         if flow_data is None:
@@ -617,24 +771,42 @@ class Langflow(CustomLLM):
             type = data.get("type", None)
             id = data.get("id", None)
             if type is not None and type.startswith("CompletionInterface"):
-                return id
+                return FlowMetadata(id, etag, updated_at)
 
         # No history component node found
-        return None
+        return FlowMetadata(None, etag, updated_at)
 
-    async def _aget_history_component_id(
-        self, model: str, base_url: str, client: AsyncHTTPHandler, api_key: str
-    ) -> Optional[str]:
+    async def _afetch_history_component_id(
+        self,
+        model: str,
+        base_url: str,
+        client: AsyncHTTPHandler,
+        api_key: str,
+        cached: Optional[FlowMetadata],
+        timeouts: Optional[RunTimeouts] = None,
+    ) -> FlowMetadata:
         """
         Get the history component ID. This relies on the LangFlow API to find the flow based on the
         model name and parse the components. The history component should start with `CompletionInterface`.
+        When a previously cached entry is provided it is revalidated rather than rebuilt.
         """
-        # Make the request to get the flow data and handle any errors
+        timeouts = timeouts or RunTimeouts(model)
+        # Make the request to get the flow data and handle any errors. LiteLLM's
+        # handler takes no timeout for a GET, so its httpx client is used directly
         request_url = f"{base_url}/api/v1/flows/{model}"
         try:
-            response = (
-                await client.get(request_url, headers={"x-api-key": api_key})
-            ).json()
+            response = await client.client.get(
+                request_url,
+                headers=self._flow_request_headers(api_key, cached),
+                timeout=timeouts.lookup_timeout(),
+            )
+            if response.status_code == 304 and cached is not None:
+                return cached
+            response.raise_for_status()
+            etag = response.headers.get("etag", None)
+            response = response.json()
+        except httpx.TimeoutException as e:
+            raise timeouts.expired(f"flow lookup {timeouts.phase(e)}")
         except httpx.HTTPStatusError as e:
             error_headers = getattr(e, "headers", None)
             error_response = getattr(e, "response", None)
@@ -651,6 +823,11 @@ class Langflow(CustomLLM):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
 
+        # The flow has not changed since it was last parsed
+        updated_at = response.get("updated_at", None)
+        if cached is not None and updated_at is not None and updated_at == cached.updated_at:
+            return FlowMetadata(cached.history_component, etag, updated_at)
+
         # Get the data off of the response
         flow_data = response.get("data", None)
         if flow_data is None:
@@ -671,21 +848,179 @@ class Langflow(CustomLLM):
         for node in nodes:
             id = node.get("id", None)
             if id is not None and id.startswith("CompletionInterface"):
-                return id
+                return FlowMetadata(id, etag, updated_at)
 
         # No history component node found
-        return None
+        return FlowMetadata(None, etag, updated_at)
+
+    def _flow_request_headers(
+        self, api_key: str, cached: Optional[FlowMetadata]
+    ) -> dict:
+        headers = {"x-api-key": api_key}
+        if cached is not None and cached.etag is not None:
+            headers["If-None-Match"] = cached.etag
+        return headers
+
+    def _get_history_component_id(
+        self,
+        model: str,
+        base_url: str,
+        client: HTTPHandler,
+        api_key: str,
+        timeouts: Optional[RunTimeouts] = None,
+    ) -> Optional[str]:
+        """
+        Get the history component ID, using the flow metadata cache so the flow document
+        is only fetched from LangFlow when it is missing or has expired.
+        """
+        metadata = self.flow_cache.get(
+            (base_url, model),
+            lambda cached: self._fetch_history_component_id(
+                model, base_url, client, api_key, cached, timeouts
+            ),
+        )
+        return metadata.history_component
+
+    async def _aget_history_component_id(
+        self,
+        model: str,
+        base_url: str,
+        client: AsyncHTTPHandler,
+        api_key: str,
+        timeouts: Optional[RunTimeouts] = None,
+    ) -> Optional[str]:
+        """
+        Get the history component ID, using the flow metadata cache so the flow document
+        is only fetched from LangFlow when it is missing or has expired.
+        """
+        metadata = await self.flow_cache.aget(
+            (base_url, model),
+            lambda cached: self._afetch_history_component_id(
+                model, base_url, client, api_key, cached, timeouts
+            ),
+        )
+        return metadata.history_component
 
     def _get_completion_response(self, response: httpx.Response) -> str:
         return response.json()["outputs"][0]["outputs"][0]["results"]["message"][
             "data"
         ]["text"]
 
+    def _token_counter(self, model: str, encoding=None) -> Callable[[str], int]:
+        """
+        Tokenizer used for usage accounting, the encoding if provided, otherwise
+        litellm.token_counter
+        """
+        if encoding is not None:
+            return lambda text: len(encoding.encode(text))
+        return lambda text: litellm.token_counter(model=model, text=text)
+
+    def _count_tokens(self, model: str, text: str, encoding=None) -> int:
+        """
+        Count the tokens in a piece of text with the same tokenizer used for usage accounting.
+        Falls back to an approximation if the tokenizer fails. Counts are memoized by
+        tokenizer and content hash.
+        """
+        if encoding is not None:
+            tokenizer = ("encoding", getattr(encoding, "name", None) or id(encoding))
+        else:
+            tokenizer = ("model", model)
+        try:
+            return self.token_cache.count(
+                tokenizer, text, self._token_counter(model, encoding)
+            )
+        except Exception:
+            # Fallback approximation: ~4 characters per token
+            return len(text) // 4
+
+    def _count_prompt_tokens(self, model: str, messages: list, encoding=None) -> int:
+        if encoding is not None:
+            # Use the provided encoding if available
+            return sum(
+                self._count_tokens(model, str(msg.get("content", "")), encoding)
+                for msg in messages
+                if isinstance(msg, dict) and "content" in msg
+            )
+        return self._count_message_tokens(model, messages)
+
+    def _stream_usage(self, model: str, messages: list, encoding=None) -> StreamUsage:
+        """
+        Usage accumulator for a streamed response. Partial completions are not
+        worth memoizing, so they are counted with the tokenizer directly.
+        """
+        counter = self._token_counter(model, encoding)
+
+        def count_tokens(text: str) -> int:
+            try:
+                return counter(text)
+            except Exception:
+                return len(text) // 4
+
+        return StreamUsage(
+            self._count_prompt_tokens(model, messages, encoding), count_tokens
+        )
+
+    def _count_message_tokens(self, model: str, messages: list) -> int:
+        """
+        Count the prompt tokens of chat messages the way litellm.token_counter does
+        for OpenAI style chat formatting: every string field of a message is counted,
+        plus 3 tokens per message, 1 per name, and 3 to prime the reply. List fields,
+        such as multimodal content, count their text parts, and their images as
+        LiteLLM's default image size rather than fetching them. Each text goes
+        through the memoized counter so only unseen messages are tokenized.
+        """
+        tokens = 3
+        for message in messages:
+            if not isinstance(message, dict):
+                continue
+            tokens += 3
+            for key, value in message.items():
+                if isinstance(value, str):
+                    tokens += self._count_tokens(model, value)
+                    if key == "name":
+                        tokens += 1
+                elif isinstance(value, list):
+                    tokens += sum(self._count_part_tokens(model, part) for part in value)
+        return tokens
+
+    def _count_part_tokens(self, model: str, part) -> int:
+        """
+        Count the tokens of one part of list content, see `_count_message_tokens`
+        """
+        if not isinstance(part, dict):
+            return 0
+        if part.get("type") == "text":
+            return self._count_tokens(model, str(part.get("text", "")))
+        if part.get("type") == "image_url":
+            image = part.get("image_url")
+            detail = image.get("detail", "auto") if isinstance(image, dict) else "auto"
+            return litellm.utils.calculate_img_tokens(
+                None, detail, use_default_image_token_count=detail == "high"
+            )
+        return 0
+
+    def _get_history_policy(self, optional_params: Optional[dict]) -> HistoryPolicy:
+        return HistoryPolicy(
+            max_tokens=_get_setting(optional_params, "history_max_tokens", 0),
+            keep_turns=_get_setting(optional_params, "history_keep_turns", 4),
+            elide=_get_setting(optional_params, "history_elide", True),
+        )
+
     def _make_request_body(
-        self, messages: list, history_componet: Optional[str]
+        self,
+        messages: list,
+        history_componet: Optional[str],
+        model: str = "",
+        optional_params: Optional[dict] = None,
+        encoding=None,
     ) -> dict:
         history = dict()
-        history["content"] = [messages[index] for index in range(0, len(messages) - 1)]
+        history["content"] = compact_history(
+            [messages[index] for index in range(0, len(messages) - 1)],
+            messages[-1],
+            self._get_history_policy(optional_params),
+            lambda text: self._count_tokens(model, text, encoding),
+        )
         tweaks = dict()
 
         if history_componet is not None:
@@ -698,6 +1033,82 @@ class Langflow(CustomLLM):
             "tweaks": tweaks,
         }
 
+    def _get_response_cache(
+        self, optional_params: Optional[dict]
+    ) -> Optional[ResponseCache]:
+        """
+        Response cache for the model, None unless `response_cache` is enabled for it
+        """
+        if not _get_setting(optional_params, "response_cache", False):
+            return None
+
+        path = _get_setting(optional_params, "response_cache_path", "")
+        ttl = _get_setting(optional_params, "response_cache_ttl", 3600.0)
+        max_entries = _get_setting(optional_params, "response_cache_size", 1024)
+
+        settings = (path, ttl, max_entries)
+        with self._response_caches_lock:
+            cache = self.response_caches.get(settings, None)
+            if cache is None:
+                if path:
+                    cache = SqliteResponseCache(path, ttl, max_entries)
+                else:
+                    cache = ResponseCache(ttl, max_entries)
+                self.response_caches[settings] = cache
+        return cache
+
+    def _response_cache_key(
+        self, model: str, messages: list, optional_params: Optional[dict]
+    ) -> str:
+        """
+        Key of a run's answer in the response cache. It names the flow rather
+        than a replica, so an answer from any replica serves the others, and the
+        history settings, which with the messages make up the run's tweaks.
+        """
+        return response_cache_key(
+            model, messages, {"history": asdict(self._get_history_policy(optional_params))}
+        )
+
+    def _get_cached_answer(
+        self, model: str, messages: list, optional_params: Optional[dict]
+    ) -> Optional[str]:
+        """
+        Cached answer of a run, looked up before the run is admitted so a hit
+        neither waits for a slot nor needs a healthy replica
+        """
+        cache = self._get_response_cache(optional_params)
+        if cache is None:
+            return None
+        return cache.get(self._response_cache_key(model, messages, optional_params))
+
+    def _make_model_response(
+        self, model: str, messages: list, completion_text: str, encoding=None
+    ) -> ModelResponse:
+        usage = self._calculate_token_usage(model, messages, completion_text, encoding)
+
+        return ModelResponse(
+            choices=[
+                litellm.Choices(
+                    finish_reason="stop", message=Message(content=completion_text)
+                )
+            ],
+            usage=usage,
+        )
+
+    def _replay_cached(
+        self, model: str, messages: list, completion_text: str, encoding=None
+    ) -> Iterator[GenericStreamingChunk]:
+        verbose_logger.debug("[Langflow Streaming] Replaying cached response for %s", model)
+        usage = self._stream_usage(model, messages, encoding)
+        for chunk in replay_chunks(completion_text):
+            yield usage.track(chunk)
+
+    async def _areplay_cached(
+        self, model: str, messages: list, completion_text: str, encoding=None
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        for chunk in self._replay_cached(model, messages, completion_text, encoding):
+            yield chunk
+
     def _make_completion(
         self,
         model: str,
@@ -706,22 +1117,42 @@ class Langflow(CustomLLM):
         client: HTTPHandler,
         api_key: str,
         encoding=None,
+        optional_params: Optional[dict] = None,
+        timeouts: Optional[RunTimeouts] = None,
+        timings: Optional[RequestTimings] = None,
     ) -> ModelResponse:
         """
         Make a single completition request
         """
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
+        timings = timings or RequestTimings(model, "completion")
+        timings.attempts += 1
         execution_url = f"{base_url}/api/v1/run/{model}"
-        history_component = self._get_history_component_id(
-            model, base_url, client, api_key
+        with timings.phase("flow_lookup"):
+            history_component = self._get_history_component_id(
+                model, base_url, client, api_key, timeouts
+            )
+        request_body = self._make_request_body(
+            messages, history_component, model, optional_params, encoding
         )
 
+        # Cached answers are served before the run is admitted, it only records
+        cache = self._get_response_cache(optional_params)
+        cache_key = self._response_cache_key(model, messages, optional_params)
+
         try:
-            response = client.post(
-                execution_url,
-                params={"stream": False},
-                json=self._make_request_body(messages, history_component),
-                headers={"x-api-key": api_key},
-            )
+            timeouts.check(False)
+            with timings.phase("first_event"):
+                response = client.post(
+                    execution_url,
+                    params={"stream": False},
+                    json=request_body,
+                    headers={"x-api-key": api_key},
+                    timeout=timeouts.first_byte_timeout(),
+                )
+        except (httpx.TimeoutException, litellm.Timeout) as e:
+            # LiteLLM's handler raises its own timeout in place of httpx's
+            raise timeouts.expired(timeouts.phase(e))
         except httpx.HTTPStatusError as e:
             error_headers = getattr(e, "headers", None)
             error_response = getattr(e, "response", None)
@@ -738,17 +1169,12 @@ class Langflow(CustomLLM):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
 
-        completion_text = self._get_completion_response(response)
-        usage = self._calculate_token_usage(model, messages, completion_text, encoding)
+        with timings.phase("parse"):
+            completion_text = self._get_completion_response(response)
+        if cache is not None:
+            cache.set(cache_key, completion_text)
 
-        return ModelResponse(
-            choices=[
-                litellm.Choices(
-                    finish_reason="stop", message=Message(content=completion_text)
-                )
-            ],
-            usage=usage,
-        )
+        return self._make_model_response(model, messages, completion_text, encoding)
 
     async def _amake_completion(
         self,
@@ -758,22 +1184,47 @@ class Langflow(CustomLLM):
         client: AsyncHTTPHandler,
         api_key: str,
         encoding=None,
+        optional_params: Optional[dict] = None,
+        timeouts: Optional[RunTimeouts] = None,
+        history_components: Optional[Dict[str, Optional[str]]] = None,
+        timings: Optional[RequestTimings] = None,
     ) -> ModelResponse:
         """
-        Make a single completition request
+        Make a single completition request. History components already resolved
+        per base URL, as for a batch, can be passed in `history_components`.
         """
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
+        timings = timings or RequestTimings(model, "completion")
+        timings.attempts += 1
         execution_url = f"{base_url}/api/v1/run/{model}"
-        history_component = await self._aget_history_component_id(
-            model, base_url, client, api_key
+        if history_components is not None and base_url in history_components:
+            history_component = history_components[base_url]
+        else:
+            with timings.phase("flow_lookup"):
+                history_component = await self._aget_history_component_id(
+                    model, base_url, client, api_key, timeouts
+                )
+        request_body = self._make_request_body(
+            messages, history_component, model, optional_params, encoding
         )
 
+        # Cached answers are served before the run is admitted, it only records
+        cache = self._get_response_cache(optional_params)
+        cache_key = self._response_cache_key(model, messages, optional_params)
+
         try:
-            response = await client.post(
-                execution_url,
-                params={"stream": False},
-                json=self._make_request_body(messages, history_component),
-                headers={"x-api-key": api_key},
-            )
+            timeouts.check(False)
+            with timings.phase("first_event"):
+                response = await client.post(
+                    execution_url,
+                    params={"stream": False},
+                    json=request_body,
+                    headers={"x-api-key": api_key},
+                    timeout=timeouts.first_byte_timeout(),
+                )
+        except (httpx.TimeoutException, litellm.Timeout) as e:
+            # LiteLLM's handler raises its own timeout in place of httpx's
+            raise timeouts.expired(timeouts.phase(e))
         except httpx.HTTPStatusError as e:
             error_headers = getattr(e, "headers", None)
             error_response = getattr(e, "response", None)
@@ -790,17 +1241,12 @@ class Langflow(CustomLLM):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
 
-        completion_text = self._get_completion_response(response)
-        usage = self._calculate_token_usage(model, messages, completion_text, encoding)
+        with timings.phase("parse"):
+            completion_text = self._get_completion_response(response)
+        if cache is not None:
+            cache.set(cache_key, completion_text)
 
-        return ModelResponse(
-            choices=[
-                litellm.Choices(
-                    finish_reason="stop", message=Message(content=completion_text)
-                )
-            ],
-            usage=usage,
-        )
+        return self._make_model_response(model, messages, completion_text, encoding)
 
     def _make_streaming(
         self,
@@ -810,37 +1256,91 @@ class Langflow(CustomLLM):
         client: HTTPHandler,
         sync_stream: bool,
         api_key,
+        optional_params: Optional[dict] = None,
+        encoding=None,
+        timeouts: Optional[RunTimeouts] = None,
+        timings: Optional[RequestTimings] = None,
     ) -> Iterator[GenericStreamingChunk]:
         """
         Stream responses using Langflow's /api/v1/run endpoint.
         This endpoint provides reliable streaming and supports full message history.
         """
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
+        timings = timings or RequestTimings(model, "stream")
+        timings.attempts += 1
         execution_url = f"{base_url}/api/v1/run/{model}"
-        history_component = self._get_history_component_id(
-            model, base_url, client, api_key
+        with timings.phase("flow_lookup"):
+            history_component = self._get_history_component_id(
+                model, base_url, client, api_key, timeouts
+            )
+        request_body = self._make_request_body(
+            messages, history_component, model, optional_params, encoding
+        )
+        verbose_logger.debug(
+            "[Langflow Streaming] Request body: %s", LazyJSON(request_body)
         )
-        request_body = self._make_request_body(messages, history_component)
 
+        # Cached answers are served before the run is admitted, it only records
+        cache = self._get_response_cache(optional_params)
+        cache_key = self._response_cache_key(model, messages, optional_params)
+
+        usage = self._stream_usage(model, messages, encoding)
+        metrics = StreamMetrics("run", model)
+        status = "incomplete"
+        parser = None
+        first_event = None
         try:
-            httpx_client = httpx.Client(timeout=60.0)
+            httpx_client = self.clients.get_client(base_url)
             headers = {"x-api-key": api_key, "Content-Type": "application/json"}
 
+            timeouts.check(False)
+            sent = time.perf_counter()
             with httpx_client.stream(
                 "POST",
                 execution_url,
                 params={"stream": True},
                 json=request_body,
                 headers=headers,
+                timeout=timeouts.first_byte_timeout(),
             ) as response:
                 response.raise_for_status()
+                timeouts.idle_timeout(response)
 
                 # Parse Langflow's native streaming format
                 parser = LangflowChunkParser(response, sync_stream=sync_stream)
+                chunks = (
+                    parser
+                    if cache is None
+                    else record_chunks(parser, cache, cache_key)
+                )
 
-                for chunk in parser:
-                    yield chunk
-
+                output_started = False
+                for chunk in chunks:
+                    if first_event is None:
+                        first_event = time.perf_counter()
+                        timings.record("first_event", sent, first_event)
+                    if chunk["text"]:
+                        metrics.record_chunk(chunk["text"])
+                        output_started = True
+                    if chunk["is_finished"]:
+                        status = "completed"
+                        timings.end_stream(first_event, parser.parse_seconds)
+                    else:
+                        timeouts.check(output_started)
+                    yield usage.track(chunk)
+
+        except GeneratorExit:
+            # Leaving the `with` block closes the connection, which makes LangFlow
+            # cancel the run
+            if status != "completed":
+                status = "cancelled"
+                self.cancelled_runs.record(model, time.perf_counter() - metrics.started)
+            raise
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            raise timeouts.expired(timeouts.phase(e))
         except httpx.HTTPStatusError as e:
+            status = "error"
             error_text = ""
             try:
                 if hasattr(e.response, "read"):
@@ -868,6 +1368,7 @@ class Langflow(CustomLLM):
                 headers=error_headers,
             )
         except Exception as e:
+            status = "error"
             verbose_logger.error(
                 f"[Langflow Streaming] Unexpected error: {str(e)}", exc_info=True
             )
@@ -875,6 +1376,157 @@ class Langflow(CustomLLM):
                 if isinstance(e, exception):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
+        finally:
+            if status != "completed" and parser is not None:
+                timings.end_stream(first_event, parser.parse_seconds)
+            metrics.finish(
+                status, parser.decoder.bytes_received if parser is not None else 0
+            )
+
+    async def _amake_run_streaming(
+        self,
+        model: str,
+        messages: list,
+        base_url: str,
+        client: AsyncHTTPHandler,
+        api_key,
+        optional_params: Optional[dict] = None,
+        encoding=None,
+        timeouts: Optional[RunTimeouts] = None,
+        timings: Optional[RequestTimings] = None,
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_make_streaming`, reading the run over the pooled async
+        client so a stream waiting on LangFlow never blocks the event loop
+        """
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
+        timings = timings or RequestTimings(model, "stream")
+        timings.attempts += 1
+        execution_url = f"{base_url}/api/v1/run/{model}"
+        with timings.phase("flow_lookup"):
+            history_component = await self._aget_history_component_id(
+                model, base_url, client, api_key, timeouts
+            )
+        request_body = self._make_request_body(
+            messages, history_component, model, optional_params, encoding
+        )
+        verbose_logger.debug(
+            "[Langflow Async Streaming] Request body: %s", LazyJSON(request_body)
+        )
+
+        # Cached answers are served before the run is admitted, it only records
+        cache = self._get_response_cache(optional_params)
+        cache_key = self._response_cache_key(model, messages, optional_params)
+
+        usage = self._stream_usage(model, messages, encoding)
+        metrics = StreamMetrics("run", model)
+        status = "incomplete"
+        parser = None
+        first_event = None
+        try:
+            async_client = self.clients.get_async_client(base_url)
+            headers = {"x-api-key": api_key, "Content-Type": "application/json"}
+
+            timeouts.check(False)
+            sent = time.perf_counter()
+            async with async_client.stream(
+                "POST",
+                execution_url,
+                params={"stream": True},
+                json=request_body,
+                headers=headers,
+                timeout=timeouts.first_byte_timeout(),
+            ) as response:
+                response.raise_for_status()
+                timeouts.idle_timeout(response)
+
+                # Parse Langflow's native streaming format, optionally read
+                # ahead of the consumer so upstream reads overlap with delivery
+                parser = LangflowChunkParser(response, sync_stream=False)
+                chunks = (
+                    parser
+                    if cache is None
+                    else arecord_chunks(parser, cache, cache_key)
+                )
+
+                output_started = False
+                async with read_ahead(
+                    chunks,
+                    _get_setting(optional_params, "stream_read_ahead", 0),
+                    _get_setting(optional_params, "stream_read_ahead_stall_ms", 0.0) / 1000 or None,
+                    response.aclose,
+                ) as chunks:
+                    async for chunk in chunks:
+                        if first_event is None:
+                            first_event = time.perf_counter()
+                            timings.record("first_event", sent, first_event)
+                        if chunk["text"]:
+                            metrics.record_chunk(chunk["text"])
+                            output_started = True
+                        if chunk["is_finished"]:
+                            status = "completed"
+                            timings.end_stream(first_event, parser.parse_seconds)
+                        else:
+                            timeouts.check(output_started)
+                        yield usage.track(chunk)
+
+        except (GeneratorExit, asyncio.CancelledError):
+            # Leaving the `async with` block closes the connection, which makes
+            # LangFlow cancel the run
+            if status != "completed":
+                status = "cancelled"
+                self.cancelled_runs.record(model, time.perf_counter() - metrics.started)
+            raise
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            raise timeouts.expired(timeouts.phase(e))
+        except httpx.HTTPStatusError as e:
+            status = "error"
+            error_text = ""
+            try:
+                if hasattr(e.response, "aread"):
+                    error_text = str(await e.response.aread())
+                elif hasattr(e.response, "text"):
+                    error_text = str(e.response.text)
+                else:
+                    error_text = str(e)
+            except Exception as read_err:
+                error_text = f"Error reading response: {str(read_err)}"
+
+            verbose_logger.error(
+                f"[Langflow Async Streaming] HTTP error {e.response.status_code}: {error_text}"
+            )
+            verbose_logger.error(f"[Langflow Async Streaming] Request URL: {execution_url}")
+
+            error_headers = getattr(e, "headers", None)
+            error_response = getattr(e, "response", None)
+            if error_headers is None and error_response:
+                error_headers = getattr(error_response, "headers", None)
+
+            raise BaseLLMException(
+                status_code=e.response.status_code,
+                message=error_text,
+                headers=error_headers,
+            )
+        except BaseLLMException as e:
+            status = "error"
+            verbose_logger.error(f"[Langflow Async Streaming] {e.message}")
+            raise
+        except Exception as e:
+            status = "error"
+            verbose_logger.error(
+                f"[Langflow Async Streaming] Unexpected error: {str(e)}", exc_info=True
+            )
+            for exception in litellm.exceptions.LITELLM_EXCEPTION_TYPES:
+                if isinstance(e, exception):
+                    raise e
+            raise BaseLLMException(status_code=500, message=str(e))
+        finally:
+            if status != "completed" and parser is not None:
+                timings.end_stream(first_event, parser.parse_seconds)
+            metrics.finish(
+                status, parser.decoder.bytes_received if parser is not None else 0
+            )
 
     def _make_streaming_fallback_run(
         self,
@@ -884,81 +1536,109 @@ class Langflow(CustomLLM):
         client: HTTPHandler,
         sync_stream: bool,
         api_key,
+        optional_params: Optional[dict] = None,
+        encoding=None,
+        timeouts: Optional[RunTimeouts] = None,
+        timings: Optional[RequestTimings] = None,
     ) -> Iterator[GenericStreamingChunk]:
         """
         Fallback streaming method using /api/v1/run endpoint.
         This endpoint supports full messages array with conversation history.
         """
-        verbose_logger.info("[Langflow Streaming Fallback] Using /api/v1/run endpoint")
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
+        timings = timings or RequestTimings(model, "stream")
+        timings.attempts += 1
         execution_url = f"{base_url}/api/v1/run/{model}"
-        history_component = self._get_history_component_id(
-            model, base_url, client, api_key
-        )
+        with timings.phase("flow_lookup"):
+            history_component = self._get_history_component_id(
+                model, base_url, client, api_key, timeouts
+            )
 
-        verbose_logger.info(
-            f"[Langflow Streaming Fallback] Execution URL: {execution_url}"
-        )
-        verbose_logger.info(
-            f"[Langflow Streaming Fallback] History component: {history_component}"
+        verbose_logger.debug(
+            "[Langflow Streaming Fallback] Execution URL: %s, history component: %s",
+            execution_url,
+            history_component,
         )
 
-        request_body = self._make_request_body(messages, history_component)
+        request_body = self._make_request_body(
+            messages, history_component, model, optional_params, encoding
+        )
         verbose_logger.debug(
-            f"[Langflow Streaming Fallback] Request body: {json.dumps(request_body, indent=2)}"
+            "[Langflow Streaming Fallback] Request body: %s", LazyJSON(request_body)
         )
 
+        cache = self._get_response_cache(optional_params)
+        if cache is not None:
+            cache_key = self._response_cache_key(model, messages, optional_params)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                yield from self._replay_cached(model, messages, cached, encoding)
+                return
+
+        usage = self._stream_usage(model, messages, encoding)
+        metrics = StreamMetrics("run_fallback", model)
+        status = "incomplete"
+        parser = None
+        first_event = None
         try:
-            # Use httpx.Client directly for streaming
-            httpx_client = httpx.Client(timeout=60.0)
+            # Use the pooled httpx.Client directly for streaming
+            httpx_client = self.clients.get_client(base_url)
             headers = {"x-api-key": api_key, "Content-Type": "application/json"}
 
-            verbose_logger.info(
-                "[Langflow Streaming Fallback] Making streaming POST request with stream=True param"
-            )
-
             # Use httpx streaming - this uses Langflow's native format
+            timeouts.check(False)
+            sent = time.perf_counter()
             with httpx_client.stream(
                 "POST",
                 execution_url,
                 params={"stream": True},
                 json=request_body,
                 headers=headers,
+                timeout=timeouts.first_byte_timeout(),
             ) as response:
-                verbose_logger.info(
-                    f"[Langflow Streaming Fallback] Response status: {response.status_code}"
-                )
                 verbose_logger.debug(
-                    f"[Langflow Streaming Fallback] Response headers: {dict(response.headers)}"
+                    "[Langflow Streaming Fallback] Response status: %s, headers: %s",
+                    response.status_code,
+                    response.headers,
                 )
 
                 response.raise_for_status()
-
-                content_type = response.headers.get("content-type", "")
-                verbose_logger.info(
-                    f"[Langflow Streaming Fallback] Response Content-Type: {content_type}"
-                )
+                timeouts.idle_timeout(response)
 
                 # Use the old LangflowChunkParser for Langflow's native format
                 parser = LangflowChunkParser(response, sync_stream=sync_stream)
-                verbose_logger.info(
-                    "[Langflow Streaming Fallback] Created LangflowChunkParser, returning"
+                chunks = (
+                    parser
+                    if cache is None
+                    else record_chunks(parser, cache, cache_key)
                 )
 
                 # Return iterator that yields from the parser
-                for chunk in parser:
-                    text_length = (
-                        len(chunk.get('text', ''))
-                        if chunk.get('text')
-                        else 0
-                    )
-                    verbose_logger.debug(
-                        f"[Langflow Streaming Fallback] Yielding chunk: "
-                        f"finished={chunk.get('is_finished', False)}, "
-                        f"text_length={text_length}"
-                    )
-                    yield chunk
-
+                output_started = False
+                for chunk in chunks:
+                    if first_event is None:
+                        first_event = time.perf_counter()
+                        timings.record("first_event", sent, first_event)
+                    if chunk["text"]:
+                        metrics.record_chunk(chunk["text"])
+                        output_started = True
+                    if chunk["is_finished"]:
+                        status = "completed"
+                        timings.end_stream(first_event, parser.parse_seconds)
+                    else:
+                        timeouts.check(output_started)
+                    yield usage.track(chunk)
+
+        except GeneratorExit:
+            if status != "completed":
+                status = "cancelled"
+                self.cancelled_runs.record(model, time.perf_counter() - metrics.started)
+            raise
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            raise timeouts.expired(timeouts.phase(e))
         except httpx.HTTPStatusError as e:
+            status = "error"
             error_text = ""
             try:
                 if hasattr(e.response, "read"):
@@ -979,11 +1659,18 @@ class Langflow(CustomLLM):
                 headers=getattr(e.response, "headers", None),
             )
         except Exception as e:
+            status = "error"
             verbose_logger.error(
                 f"[Langflow Streaming Fallback] Unexpected error: {str(e)}",
                 exc_info=True,
             )
             raise
+        finally:
+            if status != "completed" and parser is not None:
+                timings.end_stream(first_event, parser.parse_seconds)
+            metrics.finish(
+                status, parser.decoder.bytes_received if parser is not None else 0
+            )
 
     async def _amake_streaming(
         self,
@@ -992,41 +1679,32 @@ class Langflow(CustomLLM):
         base_url: str,
         client: AsyncHTTPHandler,
         api_key: str,
+        optional_params: Optional[dict] = None,
+        encoding=None,
+        timeouts: Optional[RunTimeouts] = None,
     ) -> AsyncIterator[GenericStreamingChunk]:
-        verbose_logger.info(
-            f"[Langflow Async Streaming] Starting async streaming request for model: {model}"
-        )
-        verbose_logger.info(f"[Langflow Async Streaming] Base URL: {base_url}")
-        verbose_logger.info(
-            f"[Langflow Async Streaming] Messages count: {len(messages)}"
-        )
+        timeouts = timeouts or self._get_timeouts(model, None, optional_params)
         verbose_logger.debug(
-            f"[Langflow Async Streaming] Messages: {json.dumps(messages, indent=2)}"
+            "[Langflow Async Streaming] Starting async streaming request for model: %s, base URL: %s, messages: %s",
+            model,
+            base_url,
+            LazyJSON(messages),
         )
 
         # Use OpenAI-compatible /api/v1/responses endpoint for better streaming support
         execution_url = f"{base_url}/api/v1/responses"
-        verbose_logger.info(
-            f"[Langflow Async Streaming] Execution URL: {execution_url}"
-        )
 
         # Convert messages to OpenAI-compatible format - extract last user message as input
         input_text = None
         for msg in reversed(messages):
             if isinstance(msg, dict) and msg.get("role") == "user":
                 input_text = msg.get("content", "")
-                verbose_logger.debug(
-                    f"[Langflow Async Streaming] Found user message: {input_text[:100]}..."
-                )
                 break
 
         if not input_text:
             # Fallback: use the last message content
             if messages and isinstance(messages[-1], dict):
                 input_text = messages[-1].get("content", "")
-                verbose_logger.debug(
-                    f"[Langflow Async Streaming] Using last message as fallback: {input_text[:100]}..."
-                )
 
         if not input_text:
             verbose_logger.error(
@@ -1042,148 +1720,125 @@ class Langflow(CustomLLM):
             "stream": True,
         }
 
-        verbose_logger.info(
-            f"[Langflow Async Streaming] Request body: model={model}, input_length={len(input_text)}, stream=True"
-        )
+        # The responses endpoint takes no tweaks
+        cache = self._get_response_cache(optional_params)
+        parts = []
+        if cache is not None:
+            cache_key = response_cache_key(model, messages, {})
+            cached = cache.get(cache_key)
+            if cached is not None:
+                for chunk in self._replay_cached(model, messages, cached, encoding):
+                    yield chunk
+                return
 
+        usage = self._stream_usage(model, messages, encoding)
+        metrics = StreamMetrics("responses", model)
+        decoder = StreamDecoder(sse=True)
+        stream_status = "incomplete"
+        output_started = False
         try:
-            # For async streaming, use httpx.AsyncClient as context manager
             headers = {"x-api-key": api_key, "Content-Type": "application/json"}
 
-            verbose_logger.info(
-                f"[Langflow Async Streaming] Making async POST request to {execution_url}"
-            )
-            verbose_logger.debug(
-                "[Langflow Async Streaming] Headers: x-api-key present, Content-Type: application/json"
-            )
-
-            # Use async client and streaming context manager
-            async with httpx.AsyncClient(timeout=60.0) as async_client:
-                async with async_client.stream(
-                    "POST", execution_url, json=request_body, headers=headers
-                ) as response:
-                    verbose_logger.info(
-                        f"[Langflow Async Streaming] Response status: {response.status_code}"
-                    )
-                    verbose_logger.debug(
-                        f"[Langflow Async Streaming] Response headers: {dict(response.headers)}"
-                    )
-
-                    response.raise_for_status()
-
-                    content_type = response.headers.get("content-type", "")
-                    verbose_logger.info(
-                        f"[Langflow Async Streaming] Response Content-Type: {content_type}"
-                    )
+            # Use the pooled async client and streaming context manager
+            async_client = self.clients.get_async_client(base_url)
+            timeouts.check(False)
+            async with async_client.stream(
+                "POST",
+                execution_url,
+                json=request_body,
+                headers=headers,
+                timeout=timeouts.first_byte_timeout(),
+            ) as response:
+                verbose_logger.debug(
+                    "[Langflow Async Streaming] Response status: %s, headers: %s",
+                    response.status_code,
+                    response.headers,
+                )
 
-                    # Create async generator that yields chunks
-                    async for line in response.aiter_lines():
-                        verbose_logger.debug(
-                            f"[Langflow Async Streaming] Received line (length={len(line)}): {line[:200]}..."
-                        )
+                response.raise_for_status()
+                timeouts.idle_timeout(response)
+
+                # Frame events directly from the raw byte stream, optionally read
+                # ahead of the consumer so upstream reads overlap with delivery
+                async with read_ahead(
+                    decoder.aiter_events(response.aiter_bytes()),
+                    _get_setting(optional_params, "stream_read_ahead", 0),
+                    _get_setting(optional_params, "stream_read_ahead_stall_ms", 0.0) / 1000 or None,
+                    response.aclose,
+                ) as events:
+                    async for chunk_text in events:
+                        if chunk_text == DONE:
+                            stream_status = "completed"
+                            if cache is not None:
+                                cache.set(cache_key, "".join(parts))
+                            yield GenericStreamingChunk(
+                                text="",
+                                is_finished=True,
+                                finish_reason="stop",
+                                usage=usage.usage(),
+                                index=0,
+                                tool_use=None,
+                            )
+                            return
 
-                        if not line:
-                            verbose_logger.debug(
-                                "[Langflow Async Streaming] Skipping empty line"
+                        try:
+                            chunk_json = loads(chunk_text)
+                        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                            verbose_logger.error(
+                                "[Langflow Async Streaming] Failed to parse chunk: %r",
+                                chunk_text,
+                            )
+                            verbose_logger.error(
+                                f"[Langflow Async Streaming] Error: {str(e)}",
+                                exc_info=True,
                             )
                             continue
 
-                        # Handle SSE format
-                        if line.startswith("data: "):
-                            chunk_text = line[6:].strip()
-                            verbose_logger.debug(
-                                f"[Langflow Async Streaming] Parsing SSE chunk: {chunk_text[:200]}..."
-                            )
+                        verbose_logger.debug(
+                            "[Langflow Async Streaming] Parsed JSON: %s", LazyJSON(chunk_json)
+                        )
 
-                            if chunk_text == "[DONE]":
-                                verbose_logger.info(
-                                    "[Langflow Async Streaming] Received [DONE] marker"
-                                )
-                                yield GenericStreamingChunk(
-                                    text="",
-                                    is_finished=True,
-                                    finish_reason="stop",
-                                    usage=None,
-                                    index=0,
-                                    tool_use=None,
-                                )
-                                return
-
-                            try:
-                                chunk_json = json.loads(chunk_text)
-                                verbose_logger.debug(
-                                    f"[Langflow Async Streaming] Parsed JSON: {json.dumps(chunk_json, indent=2)}"
-                                )
-
-                                status = chunk_json.get("status")
-                                verbose_logger.debug(
-                                    f"[Langflow Async Streaming] Chunk status: {status}"
-                                )
-
-                                if status == "completed":
-                                    verbose_logger.info(
-                                        "[Langflow Async Streaming] Chunk marked as completed"
-                                    )
-                                    yield GenericStreamingChunk(
-                                        text="",
-                                        is_finished=True,
-                                        finish_reason="stop",
-                                        usage=None,
-                                        index=0,
-                                        tool_use=None,
-                                    )
-                                    return
-
-                                delta = chunk_json.get("delta", {})
-                                verbose_logger.debug(
-                                    f"[Langflow Async Streaming] Delta object: {json.dumps(delta, indent=2)}"
-                                )
-
-                                content = delta.get("content", "")
-                                verbose_logger.debug(
-                                    f"[Langflow Async Streaming] Extracted content (length={len(content)}): {content[:100]}..."
-                                )
-
-                                if content:
-                                    verbose_logger.debug(
-                                        f"[Langflow Async Streaming] Yielding chunk with content: {content[:100]}..."
-                                    )
-                                    yield GenericStreamingChunk(
-                                        text=content,
-                                        is_finished=False,
-                                        finish_reason="",
-                                        usage=None,
-                                        index=0,
-                                        tool_use=None,
-                                    )
-                            except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                                verbose_logger.error(
-                                    f"[Langflow Async Streaming] Failed to parse chunk: {chunk_text}"
-                                )
-                                verbose_logger.error(
-                                    f"[Langflow Async Streaming] Error: {str(e)}",
-                                    exc_info=True,
-                                )
-                                continue
-                        elif line.strip() == "[DONE]":
-                            verbose_logger.info(
-                                "[Langflow Async Streaming] Received [DONE] marker on standalone line"
-                            )
+                        if chunk_json.get("status") == "completed":
+                            stream_status = "completed"
+                            if cache is not None:
+                                cache.set(cache_key, "".join(parts))
                             yield GenericStreamingChunk(
                                 text="",
                                 is_finished=True,
                                 finish_reason="stop",
-                                usage=None,
+                                usage=usage.usage(),
                                 index=0,
                                 tool_use=None,
                             )
                             return
-                        else:
-                            verbose_logger.debug(
-                                f"[Langflow Async Streaming] Line does not match SSE format: {line[:100]}..."
+
+                        content = chunk_json.get("delta", {}).get("content", "")
+                        output_started = output_started or bool(content)
+                        timeouts.check(output_started)
+                        if content:
+                            metrics.record_chunk(content)
+                            usage.add(content)
+                            if cache is not None:
+                                parts.append(content)
+                            yield GenericStreamingChunk(
+                                text=content,
+                                is_finished=False,
+                                finish_reason="",
+                                usage=None,
+                                index=0,
+                                tool_use=None,
                             )
 
+        except (GeneratorExit, asyncio.CancelledError):
+            if stream_status != "completed":
+                stream_status = "cancelled"
+                self.cancelled_runs.record(model, time.perf_counter() - metrics.started)
+            raise
+        except httpx.TimeoutException as e:
+            stream_status = "timeout"
+            raise timeouts.expired(timeouts.phase(e))
         except httpx.HTTPStatusError as e:
+            stream_status = "error"
             error_headers = getattr(e, "headers", None)
             error_response = getattr(e, "response", None)
             if error_headers is None and error_response:
@@ -1191,8 +1846,8 @@ class Langflow(CustomLLM):
 
             error_text = ""
             try:
-                if hasattr(e.response, "read"):
-                    error_text = str(e.response.read())
+                if hasattr(e.response, "aread"):
+                    error_text = str(await e.response.aread())
                 elif hasattr(e.response, "text"):
                     error_text = str(e.response.text)
                 else:
@@ -1206,8 +1861,8 @@ class Langflow(CustomLLM):
             verbose_logger.error(
                 f"[Langflow Async Streaming] Request URL: {execution_url}"
             )
-            verbose_logger.error(
-                f"[Langflow Async Streaming] Request body: {json.dumps(request_body, indent=2)}"
+            verbose_logger.debug(
+                "[Langflow Async Streaming] Request body: %s", LazyJSON(request_body)
             )
 
             raise BaseLLMException(
@@ -1215,7 +1870,12 @@ class Langflow(CustomLLM):
                 message=error_text,
                 headers=error_headers,
             )
+        except BaseLLMException as e:
+            stream_status = "error"
+            verbose_logger.error(f"[Langflow Async Streaming] {e.message}")
+            raise
         except Exception as e:
+            stream_status = "error"
             verbose_logger.error(
                 f"[Langflow Async Streaming] Unexpected error: {str(e)}", exc_info=True
             )
@@ -1223,6 +1883,605 @@ class Langflow(CustomLLM):
                 if isinstance(e, exception):
                     raise e
             raise BaseLLMException(status_code=500, message=str(e))
+        finally:
+            metrics.finish(stream_status, decoder.bytes_received)
+
+    def _coalesce(
+        self, stream: Iterator[GenericStreamingChunk], optional_params: Optional[dict]
+    ) -> Iterator[GenericStreamingChunk]:
+        """
+        Optionally merge small adjacent text chunks before they reach LiteLLM's
+        per-chunk callbacks. Disabled unless `stream_coalesce_chars` is set.
+        """
+        max_chars = _get_setting(optional_params, "stream_coalesce_chars", 0)
+        if max_chars <= 0:
+            return stream
+
+        max_delay = _get_setting(optional_params, "stream_coalesce_ms", 30.0) / 1000
+        return coalesce_chunks(stream, max_chars, max_delay)
+
+    def _acoalesce(
+        self,
+        stream: AsyncIterator[GenericStreamingChunk],
+        optional_params: Optional[dict],
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_coalesce`, which flushes buffered text on a timer
+        """
+        max_chars = _get_setting(optional_params, "stream_coalesce_chars", 0)
+        if max_chars <= 0:
+            return stream
+
+        max_delay = _get_setting(optional_params, "stream_coalesce_ms", 30.0) / 1000
+        return acoalesce_chunks(stream, max_chars, max_delay)
+
+    def _get_api_bases(self, api_base: str, optional_params: Optional[dict]) -> List[str]:
+        """
+        LangFlow replicas serving the model, from the `api_bases` setting as a list
+        or comma separated string, otherwise just the model's `api_base`
+        """
+        api_bases = _get_setting(optional_params, "api_bases", None)
+        if isinstance(api_bases, str):
+            api_bases = api_bases.split(",")
+        api_bases = [base.strip().rstrip("/") for base in api_bases or [] if base.strip()]
+        return api_bases or [api_base]
+
+    def _get_hedge_policy(self, optional_params: Optional[dict]) -> Optional[HedgePolicy]:
+        """
+        Hedging policy of the model, None unless `hedge` is enabled for it
+        """
+        if not _get_setting(optional_params, "hedge", False):
+            return None
+        return HedgePolicy(
+            delay=_get_setting(optional_params, "hedge_delay_ms", 2000.0) / 1000,
+            percentile=_get_setting(optional_params, "hedge_percentile", 0.95),
+            budget=_get_setting(optional_params, "hedge_budget", 0.05),
+            burst=_get_setting(optional_params, "hedge_burst", 2.0),
+        )
+
+    def _get_timeouts(
+        self,
+        model: str,
+        timeout: Optional[Union[float, str, httpx.Timeout]],
+        optional_params: Optional[dict],
+    ) -> RunTimeouts:
+        """
+        Time budgets of a run from the model's settings, tightened by the caller's
+        timeout. A number is the caller's deadline for the whole run, while an
+        `httpx.Timeout` bounds connecting and each read.
+        """
+        def budget(name: str, default_ms: float) -> Optional[float]:
+            return _get_setting(optional_params, name, default_ms) / 1000 or None
+
+        connect = budget("connect_timeout_ms", 10000.0)
+        idle = budget("idle_timeout_ms", 60000.0)
+        total = budget("total_timeout_ms", 0.0)
+        if isinstance(timeout, httpx.Timeout):
+            connect = earliest(connect, timeout.connect)
+            idle = earliest(idle, timeout.read)
+        elif timeout:
+            total = earliest(total, float(timeout))
+
+        return RunTimeouts(
+            model,
+            connect=connect,
+            first_byte=budget("first_byte_timeout_ms", 0.0),
+            idle=idle,
+            total=total,
+        )
+
+    def _get_profile(
+        self,
+        model: str,
+        request: str,
+        optional_params: Optional[dict],
+        litellm_params: Optional[dict],
+    ) -> Optional[RequestProfile]:
+        """
+        Profile of the request, for the `profile_sample_rate` fraction of requests
+        and those setting `profile` in their metadata, otherwise None
+        """
+        metadata = (litellm_params or {}).get("metadata", None) or {}
+        if not metadata.get("profile", False):
+            rate = _get_setting(optional_params, "profile_sample_rate", 0.0)
+            if rate <= 0 or random.random() >= rate:
+                return None
+
+        settings = (
+            _get_setting(
+                optional_params,
+                "profile_dir",
+                os.path.join(tempfile.gettempdir(), "langflow-profiles"),
+            ),
+            _get_setting(optional_params, "profile_max_files", 100),
+            _get_setting(optional_params, "profile_max_mb", 100),
+        )
+        with self._profile_stores_lock:
+            store = self.profile_stores.get(settings, None)
+            if store is None:
+                store = self.profile_stores[settings] = ProfileStore(
+                    settings[0], settings[1], settings[2] * 1024 * 1024
+                )
+
+        return RequestProfile(
+            store,
+            model,
+            request,
+            mode=_get_setting(optional_params, "profile_mode", "cprofile"),
+            interval=_get_setting(optional_params, "profile_interval_ms", 5.0) / 1000,
+        )
+
+    def _get_limiter(
+        self, model: str, optional_params: Optional[dict]
+    ) -> Optional[AdaptiveLimiter]:
+        """
+        Concurrency limiter of the flow, None unless `concurrency_limit` is set for it.
+        The limiter is shared by the flow's requests, so settings that differ from
+        the ones it was last configured from are applied to it.
+        """
+        limit = _get_setting(optional_params, "concurrency_limit", 0)
+        if limit <= 0:
+            return None
+
+        weights = _get_setting(optional_params, "fair_share_weights", None)
+        settings = (
+            limit,
+            _get_setting(optional_params, "concurrency_max", 0) or limit * 4,
+            _get_setting(optional_params, "queue_size", 100),
+            _get_setting(optional_params, "queue_timeout_ms", 10000.0) / 1000,
+            dict(weights) if isinstance(weights, dict) else weights,
+        )
+        with self._limiters_lock:
+            limiter = self.limiters.get(model, None)
+            if limiter is not None and self._limiter_settings[model] == settings:
+                return limiter
+
+            limit, max_limit, queue_size, queue_timeout, _ = settings
+            weights = self._get_fair_share_weights(weights)
+            if limiter is None:
+                limiter = self.limiters[model] = AdaptiveLimiter(
+                    model,
+                    limit,
+                    max_limit,
+                    queue_size=queue_size,
+                    queue_timeout=queue_timeout,
+                    queue=FairQueue(weights),
+                )
+            else:
+                limiter.configure(limit, max_limit, queue_size, queue_timeout, weights)
+            self._limiter_settings[model] = settings
+        return limiter
+
+    def _get_fair_share_weights(self, weights: Union[dict, str, None]) -> dict:
+        """
+        Share of the flow's slots per API key alias (or team), from a mapping or
+        JSON object
+        """
+        if isinstance(weights, str):
+            try:
+                weights = json.loads(weights)
+            except json.JSONDecodeError as e:
+                raise BaseLLMException(
+                    400, message=f"fair_share_weights is not valid JSON: {e}"
+                ) from e
+        if weights and not (
+            isinstance(weights, dict)
+            and all(isinstance(weight, (int, float)) for weight in weights.values())
+        ):
+            raise BaseLLMException(
+                400,
+                message="fair_share_weights must map API key aliases or teams to weights",
+            )
+        return weights or {}
+
+    def _get_tenant(
+        self, litellm_params: Optional[dict], optional_params: Optional[dict]
+    ) -> str:
+        """
+        Who a request is queued as for fair sharing, the caller's API key alias
+        (or its hash) or the caller's team when `fair_share_by` is `team`
+        """
+        metadata = (litellm_params or {}).get("metadata", None) or {}
+        if _get_setting(optional_params, "fair_share_by", "key") == "team":
+            tenant = metadata.get("user_api_key_team_id", None)
+        else:
+            tenant = metadata.get("user_api_key_alias", None) or metadata.get(
+                "user_api_key_hash", None
+            )
+        return tenant or "default"
+
+    def _get_priority(self, litellm_params: Optional[dict], default: int) -> int:
+        """
+        Streams are interactive and completions batch, unless the request sets
+        `priority` to `interactive` or `batch` in its metadata
+        """
+        metadata = (litellm_params or {}).get("metadata", None) or {}
+        return {"interactive": INTERACTIVE, "batch": BATCH}.get(
+            metadata.get("priority", None), default
+        )
+
+    def _admit_stream(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        litellm_params: Optional[dict],
+        start: Callable[[], Iterator[GenericStreamingChunk]],
+        timings: Optional[RequestTimings] = None,
+    ) -> Iterator[GenericStreamingChunk]:
+        limiter = self._get_limiter(model, optional_params)
+        if limiter is None:
+            return start()
+
+        queued = time.perf_counter()
+
+        def admitted() -> Iterator[GenericStreamingChunk]:
+            if timings is not None:
+                timings.record("queue", queued)
+            return start()
+
+        return limiter.stream(
+            admitted,
+            self._get_tenant(litellm_params, optional_params),
+            self._get_priority(litellm_params, INTERACTIVE),
+        )
+
+    def _aadmit_stream(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        litellm_params: Optional[dict],
+        start: Callable[[], AsyncIterator[GenericStreamingChunk]],
+        timings: Optional[RequestTimings] = None,
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_admit_stream`, queueing on the event loop rather than
+        blocking it
+        """
+        limiter = self._get_limiter(model, optional_params)
+        if limiter is None:
+            return start()
+
+        queued = time.perf_counter()
+
+        def admitted() -> AsyncIterator[GenericStreamingChunk]:
+            if timings is not None:
+                timings.record("queue", queued)
+            return start()
+
+        return limiter.astream(
+            admitted,
+            self._get_tenant(litellm_params, optional_params),
+            self._get_priority(litellm_params, INTERACTIVE),
+        )
+
+    def _report_timings(
+        self, timings: RequestTimings, status: str, litellm_params: Optional[dict]
+    ) -> dict:
+        """
+        Finish the request's timings, adding the breakdown to the request metadata
+        that callbacks such as Langfuse log
+        """
+        breakdown = timings.finish(status)
+        metadata = (litellm_params or {}).get("metadata", None)
+        if isinstance(metadata, dict):
+            metadata["langflow_timings"] = breakdown
+        return breakdown
+
+    def _timed_stream(
+        self,
+        stream: Iterator[GenericStreamingChunk],
+        timings: RequestTimings,
+        litellm_params: Optional[dict],
+    ) -> Iterator[GenericStreamingChunk]:
+        """
+        Attach the request's time breakdown to the final chunk, where LiteLLM sets
+        `provider_specific_fields` on the streamed response
+        """
+        status = "incomplete"
+        try:
+            for chunk in stream:
+                if chunk["is_finished"]:
+                    status = "completed"
+                    fields = dict(chunk.get("provider_specific_fields", None) or {})
+                    fields["langflow_timings"] = self._report_timings(
+                        timings, status, litellm_params
+                    )
+                    chunk = GenericStreamingChunk(
+                        **{**chunk, "provider_specific_fields": fields}
+                    )
+                yield chunk
+        except GeneratorExit:
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            close_iterator(stream)
+            self._report_timings(timings, status, litellm_params)
+
+    async def _atimed_stream(
+        self,
+        stream: AsyncIterator[GenericStreamingChunk],
+        timings: RequestTimings,
+        litellm_params: Optional[dict],
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_timed_stream`
+        """
+        status = "incomplete"
+        try:
+            async for chunk in stream:
+                if chunk["is_finished"]:
+                    status = "completed"
+                    fields = dict(chunk.get("provider_specific_fields", None) or {})
+                    fields["langflow_timings"] = self._report_timings(
+                        timings, status, litellm_params
+                    )
+                    chunk = GenericStreamingChunk(
+                        **{**chunk, "provider_specific_fields": fields}
+                    )
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            await aclose_iterator(stream)
+            self._report_timings(timings, status, litellm_params)
+
+    def _hedge_call(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        attempt: Callable[[], ModelResponse],
+        aattempt: Callable[[], Awaitable[ModelResponse]],
+        attempts: _Attempts,
+    ) -> ModelResponse:
+        """
+        Hedge a synchronous run. The hedger races the async version of the
+        attempt on a private event loop, which cannot be started from a thread
+        that is already running one, so such callers are not hedged.
+        """
+        policy = self._get_hedge_policy(optional_params)
+        if policy is None or _loop_running():
+            attempts.won(0)
+            return attempt()
+        return self.hedger.call(
+            model, policy, aattempt, self._aclose_loop_clients, attempts.won
+        )
+
+    async def _ahedge_call(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        attempt: Callable[[], Awaitable[ModelResponse]],
+        attempts: _Attempts,
+    ) -> ModelResponse:
+        policy = self._get_hedge_policy(optional_params)
+        if policy is None:
+            attempts.won(0)
+            return await attempt()
+        return await self.hedger.acall(model, policy, attempt, attempts.won)
+
+    def _hedge_stream(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        start: Callable[[], Iterator[GenericStreamingChunk]],
+        astart: Callable[[], AsyncIterator[GenericStreamingChunk]],
+        attempts: _Attempts,
+    ) -> Iterator[GenericStreamingChunk]:
+        """
+        Hedge a synchronous stream, on a private event loop like `_hedge_call`
+        """
+        policy = self._get_hedge_policy(optional_params)
+        if policy is None or _loop_running():
+            attempts.won(0)
+            return start()
+        return self.hedger.stream(
+            model, policy, astart, self._aclose_loop_clients, attempts.won
+        )
+
+    async def _aclose_loop_clients(self) -> None:
+        """
+        Close the async clients of a private event loop before it ends
+        """
+        await self.clients.aclose(sync_clients=False)
+
+    def _ahedge_stream(
+        self,
+        model: str,
+        optional_params: Optional[dict],
+        start: Callable[[], AsyncIterator[GenericStreamingChunk]],
+        attempts: _Attempts,
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        policy = self._get_hedge_policy(optional_params)
+        if policy is None:
+            attempts.won(0)
+            return start()
+        return self.hedger.astream(model, policy, start, attempts.won)
+
+    def _single_flight(
+        self,
+        model: str,
+        messages: list,
+        base_url: str,
+        optional_params: Optional[dict],
+        start: Callable[[], Iterator[GenericStreamingChunk]],
+    ) -> Iterator[GenericStreamingChunk]:
+        """
+        Attach to an identical in-flight stream if `stream_single_flight` is enabled
+        for the model, otherwise start a new one
+        """
+        if not _get_setting(optional_params, "stream_single_flight", False):
+            return start()
+
+        return self.single_flight.subscribe(
+            response_cache_key(f"{base_url}/{model}", messages, {}),
+            start,
+            _get_setting(optional_params, "stream_single_flight_buffer", 1024),
+        )
+
+    def _asingle_flight(
+        self,
+        model: str,
+        messages: list,
+        base_url: str,
+        optional_params: Optional[dict],
+        start: Callable[[], AsyncIterator[GenericStreamingChunk]],
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_single_flight`
+        """
+        if not _get_setting(optional_params, "stream_single_flight", False):
+            return start()
+
+        return self.single_flight.asubscribe(
+            response_cache_key(f"{base_url}/{model}", messages, {}),
+            start,
+            _get_setting(optional_params, "stream_single_flight_buffer", 1024),
+        )
+
+    def _stream_run(
+        self,
+        model: str,
+        messages: list,
+        api_base: str,
+        client: Optional[HTTPHandler],
+        sync_stream: bool,
+        api_key,
+        optional_params: Optional[dict],
+        encoding,
+        litellm_params: Optional[dict] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+    ) -> Iterator[GenericStreamingChunk]:
+        """
+        Stream a run. From the outside in, identical streams share one run, the
+        run waits for a slot of the flow's concurrency limit, is hedged past its
+        first byte deadline, and goes to the replica picked by the load balancer.
+        """
+        api_bases = self._get_api_bases(api_base, optional_params)
+        timeouts = self._get_timeouts(model, timeout, optional_params)
+        timings = RequestTimings(model, "stream")
+
+        cached = self._get_cached_answer(model, messages, optional_params)
+        if cached is not None:
+            return self._timed_stream(
+                self._replay_cached(model, messages, cached, encoding), timings, litellm_params
+            )
+
+        attempts = _Attempts(timeouts, timings)
+
+        def balanced() -> Iterator[GenericStreamingChunk]:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return self.balancer.stream(
+                api_bases,
+                lambda base_url: self._make_streaming(
+                    model,
+                    messages,
+                    base_url,
+                    client or self.clients.get_handler(base_url),
+                    sync_stream,
+                    api_key,
+                    optional_params,
+                    encoding,
+                    attempt_timeouts,
+                    attempt_timings,
+                ),
+            )
+
+        def abalanced() -> AsyncIterator[GenericStreamingChunk]:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return self.balancer.astream(
+                api_bases,
+                lambda base_url: self._amake_run_streaming(
+                    model,
+                    messages,
+                    base_url,
+                    self.clients.get_async_handler(base_url),
+                    api_key,
+                    optional_params,
+                    encoding,
+                    attempt_timeouts,
+                    attempt_timings,
+                ),
+            )
+
+        def hedged() -> Iterator[GenericStreamingChunk]:
+            return self._hedge_stream(
+                model, optional_params, balanced, abalanced, attempts
+            )
+
+        def admitted() -> Iterator[GenericStreamingChunk]:
+            return self._admit_stream(
+                model, optional_params, litellm_params, hedged, timings
+            )
+
+        stream = self._single_flight(model, messages, api_base, optional_params, admitted)
+        return self._timed_stream(
+            self._coalesce(stream, optional_params), timings, litellm_params
+        )
+
+    def _astream_run(
+        self,
+        model: str,
+        messages: list,
+        api_base: str,
+        client: Optional[AsyncHTTPHandler],
+        api_key,
+        optional_params: Optional[dict],
+        encoding,
+        litellm_params: Optional[dict] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `_stream_run`. Every stage runs on the event loop, so
+        waiting for a slot, a hedge or LangFlow leaves it free for other requests.
+        """
+        api_bases = self._get_api_bases(api_base, optional_params)
+        timeouts = self._get_timeouts(model, timeout, optional_params)
+        timings = RequestTimings(model, "stream")
+
+        cached = self._get_cached_answer(model, messages, optional_params)
+        if cached is not None:
+            return self._atimed_stream(
+                self._areplay_cached(model, messages, cached, encoding), timings, litellm_params
+            )
+
+        attempts = _Attempts(timeouts, timings)
+
+        def balanced() -> AsyncIterator[GenericStreamingChunk]:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return self.balancer.astream(
+                api_bases,
+                lambda base_url: self._amake_run_streaming(
+                    model,
+                    messages,
+                    base_url,
+                    client or self.clients.get_async_handler(base_url),
+                    api_key,
+                    optional_params,
+                    encoding,
+                    attempt_timeouts,
+                    attempt_timings,
+                ),
+            )
+
+        def hedged() -> AsyncIterator[GenericStreamingChunk]:
+            return self._ahedge_stream(model, optional_params, balanced, attempts)
+
+        def admitted() -> AsyncIterator[GenericStreamingChunk]:
+            return self._aadmit_stream(
+                model, optional_params, litellm_params, hedged, timings
+            )
+
+        stream = self._asingle_flight(model, messages, api_base, optional_params, admitted)
+        return self._atimed_stream(
+            self._acoalesce(stream, optional_params), timings, litellm_params
+        )
 
     def completion(
         self,
@@ -1243,11 +2502,82 @@ class Langflow(CustomLLM):
         timeout: Optional[Union[float, httpx.Timeout]] = None,
         client: Optional[HTTPHandler] = None,
     ) -> ModelResponse:
-        client = client or HTTPHandler()
+        model, optional_params = apply_mapping(self.model_mapping, model, optional_params)
+        api_bases = self._get_api_bases(api_base, optional_params)
+        timeouts = self._get_timeouts(model, timeout, optional_params)
+        timings = RequestTimings(model, "completion")
+
+        cached = self._get_cached_answer(model, messages, optional_params)
+        if cached is not None:
+            response = self._make_model_response(model, messages, cached, encoding)
+            response._hidden_params["langflow_timings"] = self._report_timings(
+                timings, "cached", litellm_params
+            )
+            return response
+
+        attempts = _Attempts(timeouts, timings)
+
+        def attempt() -> ModelResponse:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return self.balancer.call(
+                api_bases,
+                lambda base_url: self._make_completion(
+                    model,
+                    messages,
+                    base_url,
+                    client or self.clients.get_handler(base_url),
+                    api_key,
+                    encoding,
+                    optional_params,
+                    attempt_timeouts,
+                    attempt_timings,
+                ),
+            )
 
-        return self._make_completion(
-            model, messages, api_base, client, api_key, encoding
+        async def aattempt() -> ModelResponse:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return await self.balancer.acall(
+                api_bases,
+                lambda base_url: self._amake_completion(
+                    model,
+                    messages,
+                    base_url,
+                    self.clients.get_async_handler(base_url),
+                    api_key,
+                    encoding,
+                    optional_params,
+                    attempt_timeouts,
+                    None,
+                    attempt_timings,
+                ),
+            )
+
+        def run() -> ModelResponse:
+            limiter = self._get_limiter(model, optional_params)
+            if limiter is None:
+                return self._hedge_call(
+                    model, optional_params, attempt, aattempt, attempts
+                )
+            queued = time.perf_counter()
+            with limiter.slot(
+                self._get_tenant(litellm_params, optional_params),
+                self._get_priority(litellm_params, BATCH),
+            ):
+                timings.record("queue", queued)
+                return self._hedge_call(
+                    model, optional_params, attempt, aattempt, attempts
+                )
+
+        profile = self._get_profile(model, "completion", optional_params, litellm_params)
+        try:
+            response = run() if profile is None else profile.call(run)
+        except BaseException:
+            self._report_timings(timings, "error", litellm_params)
+            raise
+        response._hidden_params["langflow_timings"] = self._report_timings(
+            timings, "completed", litellm_params
         )
+        return response
 
     async def acompletion(
         self,
@@ -1268,12 +2598,165 @@ class Langflow(CustomLLM):
         timeout: Optional[Union[float, httpx.Timeout]] = None,
         client: Optional[AsyncHTTPHandler] = None,
     ) -> litellm.types.utils.ModelResponse:
-        client = client or AsyncHTTPHandler()
+        model, optional_params = apply_mapping(self.model_mapping, model, optional_params)
+        return await self._arun_completion(
+            model,
+            messages,
+            api_base,
+            api_key,
+            optional_params,
+            encoding,
+            litellm_params,
+            timeout,
+            client,
+        )
+
+    async def _arun_completion(
+        self,
+        model: str,
+        messages: list,
+        api_base: str,
+        api_key: str,
+        optional_params: Optional[dict],
+        encoding=None,
+        litellm_params: Optional[dict] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+        client: Optional[AsyncHTTPHandler] = None,
+        history_components: Optional[Dict[str, Optional[str]]] = None,
+    ) -> ModelResponse:
+        """
+        Run a completion through the flow's concurrency limit, hedging and the
+        load balancer
+        """
+        api_bases = self._get_api_bases(api_base, optional_params)
+        timeouts = self._get_timeouts(model, timeout, optional_params)
+        timings = RequestTimings(model, "completion")
+
+        cached = self._get_cached_answer(model, messages, optional_params)
+        if cached is not None:
+            response = self._make_model_response(model, messages, cached, encoding)
+            response._hidden_params["langflow_timings"] = self._report_timings(
+                timings, "cached", litellm_params
+            )
+            return response
+
+        attempts = _Attempts(timeouts, timings)
+
+        async def attempt() -> ModelResponse:
+            attempt_timeouts, attempt_timings = attempts.new()
+            return await self.balancer.acall(
+                api_bases,
+                lambda base_url: self._amake_completion(
+                    model,
+                    messages,
+                    base_url,
+                    client or self.clients.get_async_handler(base_url),
+                    api_key,
+                    encoding,
+                    optional_params,
+                    attempt_timeouts,
+                    history_components,
+                    attempt_timings,
+                ),
+            )
+
+        async def run() -> ModelResponse:
+            limiter = self._get_limiter(model, optional_params)
+            if limiter is None:
+                return await self._ahedge_call(
+                    model, optional_params, attempt, attempts
+                )
+            queued = time.perf_counter()
+            async with limiter.aslot(
+                self._get_tenant(litellm_params, optional_params),
+                self._get_priority(litellm_params, BATCH),
+            ):
+                timings.record("queue", queued)
+                return await self._ahedge_call(
+                    model, optional_params, attempt, attempts
+                )
+
+        try:
+            response = await run()
+        except BaseException:
+            self._report_timings(timings, "error", litellm_params)
+            raise
+        response._hidden_params["langflow_timings"] = self._report_timings(
+            timings, "completed", litellm_params
+        )
+        return response
+
+    async def abatch_completion(
+        self,
+        model: str,
+        messages_list: List[list],
+        api_base: str,
+        api_key: str,
+        optional_params: Optional[dict] = None,
+        concurrency: int = 8,
+        retries: int = 2,
+        on_progress: Optional[Callable[[BatchProgress], None]] = None,
+        encoding=None,
+        litellm_params: Optional[dict] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+    ) -> List[Union[ModelResponse, BaseException]]:
+        """
+        Run a completion of the flow for each message array, such as an evaluation
+        set, with at most `concurrency` runs in flight over the shared async
+        clients. Results are in the order of `messages_list`, with the error in
+        place of any item that still failed after `retries` retries. The flow's
+        history component is resolved once for the whole batch.
+        """
+        model, optional_params = apply_mapping(self.model_mapping, model, optional_params)
+        history_components: Dict[str, Optional[str]] = {}
+        for base_url in self._get_api_bases(api_base, optional_params):
+            try:
+                history_components[base_url] = await self._aget_history_component_id(
+                    model,
+                    base_url,
+                    self.clients.get_async_handler(base_url),
+                    api_key,
+                    self._get_timeouts(model, timeout, optional_params),
+                )
+            except Exception as e:
+                # Left to each run, which can fail over to another replica
+                verbose_logger.warning(
+                    f"[Langflow Batch] Could not resolve {model} on {base_url}: {e}"
+                )
 
-        return await self._amake_completion(
-            model, messages, api_base, client, api_key, encoding
+        return await run_batch(
+            messages_list,
+            lambda messages: self._arun_completion(
+                model,
+                messages,
+                api_base,
+                api_key,
+                optional_params,
+                encoding,
+                litellm_params,
+                timeout,
+                None,
+                history_components,
+            ),
+            concurrency=concurrency,
+            retries=retries,
+            on_progress=on_progress,
         )
 
+    def batch_completion(self, *args, **kwargs) -> List[Union[ModelResponse, BaseException]]:
+        """
+        Synchronous version of `abatch_completion`, for scripts without an event loop
+        """
+
+        async def run() -> List[Union[ModelResponse, BaseException]]:
+            try:
+                return await self.abatch_completion(*args, **kwargs)
+            finally:
+                # The async clients are bound to this loop, which ends with the batch
+                await self.clients.aclose(sync_clients=False)
+
+        return asyncio.run(run())
+
     def streaming(
         self,
         model: str,
@@ -1293,9 +2776,24 @@ class Langflow(CustomLLM):
         timeout: Optional[Union[float, httpx.Timeout]] = None,
         client: Optional[HTTPHandler] = None,
     ) -> Iterator[GenericStreamingChunk]:
-        client = client or HTTPHandler()
+        model, optional_params = apply_mapping(self.model_mapping, model, optional_params)
+
+        def start() -> Iterator[GenericStreamingChunk]:
+            return self._stream_run(
+                model,
+                messages,
+                api_base,
+                client,
+                False,
+                api_key,
+                optional_params,
+                encoding,
+                litellm_params,
+                timeout,
+            )
 
-        return self._make_streaming(model, messages, api_base, client, False, api_key)
+        profile = self._get_profile(model, "stream", optional_params, litellm_params)
+        return start() if profile is None else profile.stream(start)
 
     def astreaming(
         self,
@@ -1315,22 +2813,32 @@ class Langflow(CustomLLM):
         headers=...,
         timeout: Optional[Union[float, httpx.Timeout]] = None,
         client: Optional[AsyncHTTPHandler] = None,
-    ) -> Iterator[GenericStreamingChunk]:
+    ) -> AsyncIterator[GenericStreamingChunk]:
         """
-        NOTE: The implementation is currently a work around. It seems like this astreaming
-        function is called further down the line but not awaited. Thus an error is thrown
-        where the iterator is attempted to be used without waiting on the coroutine. To
-        get around that, the synchronous streaming call is made to generate an iterator without
-        the use of a coroutine.
+        Stream a run for LiteLLM's async path. LiteLLM calls this from a worker
+        thread but reads the returned async iterator on the event loop, so the
+        stages that need the loop only start once the iterator is first read.
         """
-        sync_client = HTTPHandler()
-        result = self._make_streaming(
-            model, messages, api_base, sync_client, True, api_key
-        )
+        model, optional_params = apply_mapping(self.model_mapping, model, optional_params)
+
+        def start() -> AsyncIterator[GenericStreamingChunk]:
+            return self._astream_run(
+                model,
+                messages,
+                api_base,
+                client,
+                api_key,
+                optional_params,
+                encoding,
+                litellm_params,
+                timeout,
+            )
 
-        return result
+        profile = self._get_profile(model, "stream", optional_params, litellm_params)
+        return start() if profile is None else profile.astream(start)
 
 
 langflow = Langflow()
+atexit.register(langflow.close)
 
 litellm.custom_provider_map = [{"provider": "langflow", "custom_handler": langflow}]
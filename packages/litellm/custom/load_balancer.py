@@ -0,0 +1,380 @@
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Set, TypeVar
+import math
+import threading
+import time
+
+import httpx  # type: ignore
+
+from litellm._logging import verbose_logger
+
+from .cancellation import aclose_iterator, close_iterator
+from .exceptions import BaseLLMException
+
+T = TypeVar("T")
+
+# Status codes that mean the replica, rather than the request, is at fault
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """
+    Whether an error means the replica could not serve the run, in which case
+    the run can be retried on another replica
+    """
+    # Timeouts of a run tell whether the replica or the caller's deadline is at fault
+    backend_failure = getattr(error, "backend_failure", None)
+    if backend_failure is not None:
+        return backend_failure
+    if isinstance(error, httpx.TransportError):
+        return True
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    # The handler wraps transport errors in a 500 `BaseLLMException`
+    return isinstance(error.__context__, httpx.TransportError)
+
+
+class Replica:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.in_flight = 0
+        self.down_until = 0.0
+
+        # Circuit breaker, open while `now < open_until`, then half open until a
+        # single trial run succeeds or fails
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def circuit(self, now: float, threshold: int) -> str:
+        if threshold <= 0 or self.failures < threshold:
+            return "closed"
+        if now < self.open_until:
+            return "open"
+        return "half_open"
+
+
+class LangflowLoadBalancer:
+    """
+    Routes each run to the healthy replica of a model with the fewest in-flight
+    runs, counting streams for as long as they are open. Replicas are taken out of
+    rotation when a run fails to reach them or an active health probe fails, and
+    put back once a probe succeeds or `cooldown` seconds pass. When no replica is
+    healthy every replica is tried.
+
+    Each replica also has a circuit breaker which opens after `circuit_failures`
+    consecutive failed runs. Runs fail fast while every replica's circuit is open,
+    and after `circuit_reset` seconds a single trial run decides whether the
+    circuit closes again.
+    """
+
+    def __init__(
+        self,
+        probe_interval: float = 10.0,
+        probe_timeout: float = 2.0,
+        probe_path: str = "/health",
+        cooldown: float = 30.0,
+        circuit_failures: int = 5,
+        circuit_reset: float = 30.0,
+    ):
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe_path = probe_path
+        self.cooldown = cooldown
+        self.circuit_failures = circuit_failures
+        self.circuit_reset = circuit_reset
+
+        self._replicas: Dict[str, Replica] = {}
+        self._probed: Set[str] = set()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def _replica(self, base_url: str) -> Replica:
+        replica = self._replicas.get(base_url, None)
+        if replica is None:
+            replica = self._replicas[base_url] = Replica(base_url)
+        return replica
+
+    def choose(self, bases: List[str], exclude: Optional[Set[str]] = None) -> str:
+        """
+        Pick the replica to send a run to, ties are broken round robin. Raises a
+        503 if the circuit of every replica is open.
+        """
+        exclude = exclude or set()
+        now = time.monotonic()
+        with self._lock:
+            replicas = [
+                self._replica(base) for base in bases if base not in exclude
+            ] or [self._replica(base) for base in bases]
+            if len(bases) > 1:
+                self._probed.update(bases)
+
+            replicas = [
+                replica
+                for replica in replicas
+                if self._admits(replica, now)
+            ]
+            if not replicas:
+                retry_after = min(
+                    self._replica(base).open_until for base in bases
+                ) - now
+                raise BaseLLMException(
+                    503,
+                    message="Circuit open for every LangFlow replica",
+                    headers={"retry-after": str(max(1, math.ceil(retry_after)))},
+                )
+
+            candidates = [replica for replica in replicas if replica.healthy(now)]
+            candidates = candidates or replicas
+
+            fewest = min(replica.in_flight for replica in candidates)
+            least_loaded = [
+                replica for replica in candidates if replica.in_flight == fewest
+            ]
+            self._counter += 1
+            chosen = least_loaded[self._counter % len(least_loaded)]
+            if chosen.circuit(now, self.circuit_failures) == "half_open":
+                chosen.trial = True
+
+        if len(bases) > 1:
+            self._start_prober()
+        return chosen.base_url
+
+    def _admits(self, replica: Replica, now: float) -> bool:
+        state = replica.circuit(now, self.circuit_failures)
+        if state == "open":
+            return False
+        if state == "half_open":
+            return not replica.trial
+        return True
+
+    @contextmanager
+    def track(self, base_url: str) -> Iterator[None]:
+        """
+        Count a run against a replica while it is in flight
+        """
+        with self._lock:
+            self._replica(base_url).in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                replica = self._replica(base_url)
+                replica.in_flight -= 1
+                # A cancelled trial run lets the next run try the circuit instead
+                replica.trial = False
+
+    def mark_success(self, base_url: str) -> None:
+        with self._lock:
+            replica = self._replica(base_url)
+            if replica.failures >= self.circuit_failures > 0:
+                verbose_logger.warning("[Langflow] Circuit for %s closed", base_url)
+            replica.failures = 0
+            replica.trial = False
+
+    def mark_failure(self, base_url: str) -> None:
+        with self._lock:
+            replica = self._replica(base_url)
+            now = time.monotonic()
+            replica.down_until = max(replica.down_until, now + self.cooldown)
+            replica.failures += 1
+            replica.trial = False
+            opened = replica.failures >= self.circuit_failures > 0
+            if opened:
+                replica.open_until = now + self.circuit_reset
+
+        if opened:
+            verbose_logger.warning(
+                "[Langflow] Replica %s failed %s times in a row, opening its circuit",
+                base_url,
+                replica.failures,
+            )
+        else:
+            verbose_logger.warning(
+                "[Langflow] Replica %s failed, taking it out of rotation", base_url
+            )
+
+    def call(self, bases: List[str], run: Callable[[str], T]) -> T:
+        """
+        Run on the chosen replica, falling back to the rest of the pool if the
+        replica cannot be reached
+        """
+        tried: Set[str] = set()
+        while True:
+            base_url = self.choose(bases, tried)
+            with self.track(base_url):
+                try:
+                    result = run(base_url)
+                except Exception as e:
+                    tried.add(base_url)
+                    if not is_backend_failure(e):
+                        # The replica answered, the run itself failed
+                        self.mark_success(base_url)
+                        raise
+                    self.mark_failure(base_url)
+                    if tried.issuperset(bases):
+                        raise
+                    continue
+            self.mark_success(base_url)
+            return result
+
+    async def acall(self, bases: List[str], run: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Async version of `call`
+        """
+        tried: Set[str] = set()
+        while True:
+            base_url = self.choose(bases, tried)
+            with self.track(base_url):
+                try:
+                    result = await run(base_url)
+                except Exception as e:
+                    tried.add(base_url)
+                    if not is_backend_failure(e):
+                        # The replica answered, the run itself failed
+                        self.mark_success(base_url)
+                        raise
+                    self.mark_failure(base_url)
+                    if tried.issuperset(bases):
+                        raise
+                    continue
+            self.mark_success(base_url)
+            return result
+
+    def stream(self, bases: List[str], start: Callable[[str], Iterator[T]]) -> Iterator[T]:
+        """
+        Stream from the chosen replica. A stream can only fall back to another
+        replica before its first chunk has been passed on.
+        """
+        tried: Set[str] = set()
+        while True:
+            base_url = self.choose(bases, tried)
+            started = False
+            chunks = None
+            with self.track(base_url):
+                try:
+                    chunks = start(base_url)
+                    for chunk in chunks:
+                        if not started:
+                            started = True
+                            self.mark_success(base_url)
+                        yield chunk
+                    return
+                except Exception as e:
+                    tried.add(base_url)
+                    if started:
+                        raise
+                    if not is_backend_failure(e):
+                        self.mark_success(base_url)
+                        raise
+                    self.mark_failure(base_url)
+                    if tried.issuperset(bases):
+                        raise
+                finally:
+                    # Closing a stream the client abandoned cancels its run
+                    if chunks is not None:
+                        close_iterator(chunks)
+
+    async def astream(
+        self, bases: List[str], start: Callable[[str], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """
+        Async version of `stream`
+        """
+        tried: Set[str] = set()
+        while True:
+            base_url = self.choose(bases, tried)
+            started = False
+            chunks = None
+            with self.track(base_url):
+                try:
+                    chunks = start(base_url)
+                    async for chunk in chunks:
+                        if not started:
+                            started = True
+                            self.mark_success(base_url)
+                        yield chunk
+                    return
+                except Exception as e:
+                    tried.add(base_url)
+                    if started:
+                        raise
+                    if not is_backend_failure(e):
+                        self.mark_success(base_url)
+                        raise
+                    self.mark_failure(base_url)
+                    if tried.issuperset(bases):
+                        raise
+                finally:
+                    if chunks is not None:
+                        await aclose_iterator(chunks)
+
+    def probe(self) -> None:
+        """
+        Check the health endpoint of every replica of a multi-replica model
+        """
+        with self._lock:
+            bases = sorted(self._probed)
+
+        with httpx.Client(timeout=self.probe_timeout) as client:
+            for base_url in bases:
+                try:
+                    healthy = client.get(f"{base_url}{self.probe_path}").is_success
+                except httpx.HTTPError:
+                    healthy = False
+
+                with self._lock:
+                    replica = self._replica(base_url)
+                    now = time.monotonic()
+                    was_healthy = replica.healthy(now)
+                    # Like a failed run, a failed probe only keeps the replica
+                    # out for the cooldown, so it comes back should it recover
+                    # without a probe succeeding
+                    replica.down_until = (
+                        0.0 if healthy else max(replica.down_until, now + self.cooldown)
+                    )
+                if was_healthy != healthy:
+                    verbose_logger.warning(
+                        "[Langflow] Replica %s is %s",
+                        base_url,
+                        "healthy" if healthy else "unhealthy",
+                    )
+
+    def _start_prober(self) -> None:
+        if self.probe_interval <= 0 or self._prober is not None:
+            return
+        with self._lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(
+                target=self._probe_loop, name="langflow-health-probe", daemon=True
+            )
+        self._prober.start()
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:
+                verbose_logger.warning(f"[Langflow] Health probe failed: {e}")
+
+    def stats(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                base_url: {
+                    "in_flight": replica.in_flight,
+                    "healthy": replica.healthy(now),
+                    "circuit": replica.circuit(now, self.circuit_failures),
+                }
+                for base_url, replica in self._replicas.items()
+            }
+
+    def close(self) -> None:
+        self._stop.set()
@@ -0,0 +1,150 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+import httpx  # type: ignore
+
+from litellm._logging import verbose_logger
+
+
+@dataclass(frozen=True)
+class FlowMapping:
+    """
+    The flow a model name runs and the per-model settings it runs with
+    """
+
+    flow_id: str
+    settings: dict = field(default_factory=dict)
+
+
+def parse_mapping(payload) -> Dict[str, FlowMapping]:
+    """
+    Build the table from the mapping service's response, either an object of
+    model names to flow ids or to `{"flow_id": ..., "settings": {...}}`, or a
+    list of `{"model": ..., "flow_id": ..., "settings": {...}}`, optionally
+    wrapped in `{"mapping": ...}`
+    """
+    if isinstance(payload, dict) and "mapping" in payload:
+        payload = payload["mapping"]
+
+    if isinstance(payload, list):
+        entries = [(entry["model"], entry) for entry in payload]
+    elif isinstance(payload, dict):
+        entries = list(payload.items())
+    else:
+        raise ValueError(f"Unexpected model mapping of type {type(payload).__name__}")
+
+    table = {}
+    for model, entry in entries:
+        if isinstance(entry, str):
+            table[model] = FlowMapping(entry)
+        else:
+            table[model] = FlowMapping(entry["flow_id"], dict(entry.get("settings", None) or {}))
+    return table
+
+
+class ModelMapping:
+    """
+    In-memory table of model names to flows, loaded from the helper backend's
+    mapping endpoint. The table is refreshed by a background thread every
+    `refresh_interval` seconds, or right away when `notify` is called on a change,
+    so requests only ever read it. Refreshes revalidate with the last ETag, and
+    the last good table is kept while the endpoint cannot be reached.
+    """
+
+    def __init__(self, endpoint: str, refresh_interval: float = 60.0, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+
+        self._table: Dict[str, FlowMapping] = {}
+        self._etag: Optional[str] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+        self.refreshes = 0
+        self.failures = 0
+        self.refreshed_at: Optional[float] = None
+
+    def resolve(self, model: str) -> Optional[FlowMapping]:
+        return self._table.get(model, None)
+
+    def refresh(self) -> bool:
+        """
+        Fetch the table from the mapping endpoint, returning whether it changed
+        """
+        headers = {} if self._etag is None else {"If-None-Match": self._etag}
+        with httpx.Client(timeout=self.timeout) as client:
+            response = client.get(self.endpoint, headers=headers)
+        if response.status_code == 304:
+            self.refreshed_at = time.time()
+            return False
+        response.raise_for_status()
+
+        table = parse_mapping(response.json())
+        with self._lock:
+            changed = table != self._table
+            # Replaced whole, so readers never see a partly updated table
+            self._table = table
+            self._etag = response.headers.get("etag", None)
+            self.refreshes += 1
+            self.refreshed_at = time.time()
+        if changed:
+            verbose_logger.info(f"[Langflow] Loaded {len(table)} model mappings from {self.endpoint}")
+        return changed
+
+    def notify(self) -> None:
+        """
+        Refresh on the background thread now, as when the mapping has changed
+        """
+        self._wake.set()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="langflow-model-mapping", daemon=True
+            )
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failures += 1
+                verbose_logger.warning(f"[Langflow] Model mapping refresh failed: {e}")
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "models": len(self._table),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+
+def apply_mapping(
+    mapping: Optional[ModelMapping], model: str, optional_params: Optional[dict]
+) -> Tuple[str, Optional[dict]]:
+    """
+    The flow id and settings to run a model with. A mapped model runs its flow
+    with the mapping's settings under the model's own; any other model name is
+    taken to be a flow id.
+    """
+    entry = mapping.resolve(model) if mapping is not None else None
+    if entry is None:
+        return model, optional_params
+    if not entry.settings:
+        return entry.flow_id, optional_params
+    return entry.flow_id, {**entry.settings, **(optional_params or {})}
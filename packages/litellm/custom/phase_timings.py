@@ -0,0 +1,199 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import time
+
+try:
+    from opentelemetry import trace  # type: ignore
+
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+
+# Phases of a request in the order they happen
+PHASES = ("queue", "flow_lookup", "first_event", "stream", "parse")
+
+
+def get_tracer() -> Optional[Any]:
+    """
+    OpenTelemetry tracer for the phase spans. Spans are dropped by the API's
+    default no-op provider unless the process configures a tracer provider.
+    """
+    if not OTEL_AVAILABLE:
+        return None
+    return trace.get_tracer("langflow")
+
+
+def _span_context(parent: Any) -> Optional[Any]:
+    if not OTEL_AVAILABLE:
+        return None
+    return trace.set_span_in_context(parent)
+
+
+class _PhaseRecorder:
+    """
+    Ways of recording phases, built on `record`
+    """
+
+    def record(self, phase: str, start: float, end: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, phase: str, seconds: float) -> None:
+        """
+        Add time measured elsewhere to `phase`, such as the parser's busy time
+        """
+        now = time.perf_counter()
+        self.record(phase, now - seconds, now)
+
+    def end_stream(self, first_event: Optional[float], parse_seconds: float) -> None:
+        """
+        Record the end of a stream whose first event arrived at `first_event`
+        """
+        if first_event is not None:
+            self.record("stream", first_event)
+        self.add("parse", parse_seconds)
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, start)
+
+
+class RequestTimings(_PhaseRecorder):
+    """
+    Where a request spent its time:
+
+    - `queue`: waiting for a slot of the flow's concurrency limit
+    - `flow_lookup`: resolving the flow's history component
+    - `first_event`: from sending the run to LangFlow until its first event (or
+      its response, for completions)
+    - `stream`: from the first event until the last
+    - `parse`: turning LangFlow's events into chunks, which is part of `stream`
+
+    Retried runs each add to the phases and `attempts` counts them. Hedged
+    attempts record into their own `AttemptTimings`, and only the winner's are
+    added. The breakdown is emitted as OpenTelemetry spans once the request
+    finishes.
+    """
+
+    def __init__(self, model: str, request: str):
+        self.model = model
+        self.request = request
+
+        self.started = time.perf_counter()
+        # Spans take wall clock times, which are derived from the monotonic ones
+        self._wall_offset = time.time() - self.started
+
+        self.attempts = 0
+        self.status: Optional[str] = None
+        self.finished: Optional[float] = None
+        self._phases: Dict[str, Dict[str, float]] = {}
+
+    def record(self, phase: str, start: float, end: Optional[float] = None) -> None:
+        """
+        Add the time from `start` to `end` (now by default) to `phase`
+        """
+        end = time.perf_counter() if end is None else end
+        entry = self._phases.get(phase, None)
+        if entry is None:
+            self._phases[phase] = {"start": start, "end": end, "seconds": end - start}
+        else:
+            entry["start"] = min(entry["start"], start)
+            entry["end"] = max(entry["end"], end)
+            entry["seconds"] += end - start
+
+    def attempt(self) -> "AttemptTimings":
+        return AttemptTimings(self)
+
+    def breakdown(self) -> Dict[str, Any]:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        breakdown: Dict[str, Any] = {
+            f"{phase}_ms": round(self._phases[phase]["seconds"] * 1000, 3)
+            for phase in PHASES
+            if phase in self._phases
+        }
+        breakdown["total_ms"] = round((end - self.started) * 1000, 3)
+        breakdown["attempts"] = self.attempts
+        if self.status is not None:
+            breakdown["status"] = self.status
+        return breakdown
+
+    def finish(self, status: str) -> Dict[str, Any]:
+        """
+        End the request, emitting its spans, and return the breakdown. Only the
+        first call emits spans.
+        """
+        if self.status is None:
+            self.status = status
+            self.finished = time.perf_counter()
+            self._emit_spans()
+        return self.breakdown()
+
+    def _wall_ns(self, timestamp: float) -> int:
+        return int((timestamp + self._wall_offset) * 1e9)
+
+    def _emit_spans(self) -> None:
+        tracer = get_tracer()
+        if tracer is None:
+            return
+
+        root = tracer.start_span(
+            f"langflow.{self.request}",
+            start_time=self._wall_ns(self.started),
+            attributes={
+                "langflow.model": self.model,
+                "langflow.status": self.status,
+                "langflow.attempts": self.attempts,
+            },
+        )
+        context = _span_context(root)
+        for phase in PHASES:
+            entry = self._phases.get(phase, None)
+            if entry is None:
+                continue
+            span = tracer.start_span(
+                f"langflow.{phase}",
+                context=context,
+                start_time=self._wall_ns(entry["start"]),
+                attributes={"langflow.busy_ms": round(entry["seconds"] * 1000, 3)},
+            )
+            span.end(end_time=self._wall_ns(entry["end"]))
+        root.end(end_time=self._wall_ns(self.finished))
+
+
+class AttemptTimings(_PhaseRecorder):
+    """
+    Timings of one attempt of a hedged request, held back until `publish` adds
+    them to the request, so the phases of a losing attempt are left out. Once
+    published, later phases such as the rest of the stream go straight to the
+    request. Every attempt counts towards the request's `attempts`.
+    """
+
+    def __init__(self, request: RequestTimings):
+        self.request = request
+        self.published = False
+        self._records: List[Tuple[str, float, float]] = []
+
+    @property
+    def attempts(self) -> int:
+        return self.request.attempts
+
+    @attempts.setter
+    def attempts(self, attempts: int) -> None:
+        self.request.attempts = attempts
+
+    def record(self, phase: str, start: float, end: Optional[float] = None) -> None:
+        end = time.perf_counter() if end is None else end
+        if self.published:
+            self.request.record(phase, start, end)
+        else:
+            self._records.append((phase, start, end))
+
+    def publish(self) -> None:
+        self.published = True
+        for phase, start, end in self._records:
+            self.request.record(phase, start, end)
+        self._records.clear()
@@ -0,0 +1,252 @@
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, TypeVar
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+
+from litellm._logging import verbose_logger
+
+from .cancellation import aclose_iterator, close_iterator
+
+T = TypeVar("T")
+
+# Profiling modes, deterministic profiling or sampling of the stack
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+
+
+class ProfileStore:
+    """
+    Directory of request profiles, rotated so it keeps at most `max_files`
+    profiles and `max_bytes` in total, dropping the oldest first
+    """
+
+    def __init__(self, directory: str, max_files: int = 100, max_bytes: int = 100 * 1024 * 1024):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, model: str, request: str, extension: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        stamp = time.strftime("%Y%m%dT%H%M%S") + f"{time.time() % 1:.6f}"[1:]
+        return os.path.join(
+            self.directory, f"{stamp}-{os.getpid()}-{name}-{request}.{extension}"
+        )
+
+    def save(self, write: Callable[[str], None], model: str, request: str, extension: str) -> str:
+        """
+        Write a profile with `write`, which is given its path, then rotate
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(model, request, extension)
+        write(path)
+        self.rotate()
+        return path
+
+    def rotate(self) -> None:
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+                files = sorted(
+                    ((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries),
+                    reverse=True,
+                )
+            except OSError:
+                return
+
+            total = 0
+            for index, (_, size, path) in enumerate(files):
+                total += size
+                if index >= self.max_files or total > self.max_bytes:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+class StackSampler:
+    """
+    Samples the stacks of the threads a request runs on every `interval`
+    seconds while it is active, counting identical stacks. Far cheaper than
+    cProfile on streams with many small chunks.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enable(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="langflow-stack-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def disable(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            if self._threads.get(ident, 0) <= 1:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] -= 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident, None)
+                if frame is not None:
+                    self._record(frame)
+
+    def _record(self, frame) -> None:
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        key = ";".join(reversed(stack))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def dump(self, path: str) -> None:
+        """
+        Write the stacks in the collapsed format read by flamegraph.pl and speedscope
+        """
+        with open(path, "w") as output:
+            for stack, count in sorted(self.stacks.items()):
+                output.write(f"{stack} {count}\n")
+
+
+class RequestProfile:
+    """
+    Profile of one request, collected only while the request's code runs: the
+    call of a completion, or each step of a stream. Time the stream spends
+    waiting on the client between chunks is left out.
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        model: str,
+        request: str,
+        mode: str = CPROFILE,
+        interval: float = 0.005,
+    ):
+        self.store = store
+        self.model = model
+        self.request = request
+        self.mode = mode
+
+        self.profiler = cProfile.Profile() if mode == CPROFILE else None
+        self.sampler = StackSampler(interval) if mode == SAMPLE else None
+        self.failed = False
+        self.saved: Optional[str] = None
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        if self.failed:
+            yield
+            return
+
+        try:
+            if self.profiler is not None:
+                self.profiler.enable()
+            else:
+                self.sampler.enable()
+        except ValueError as e:
+            # Only one cProfile profiler can be active at a time on Python 3.12+
+            verbose_logger.debug(f"[Langflow Profiling] Not profiling {self.model}: {e}")
+            self.failed = True
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            else:
+                self.sampler.disable()
+
+    def call(self, run: Callable[[], T]) -> T:
+        try:
+            with self.active():
+                return run()
+        finally:
+            self.save()
+
+    def stream(self, start: Callable[[], Iterator[T]]) -> Iterator[T]:
+        chunks = None
+        try:
+            with self.active():
+                chunks = start()
+            while True:
+                with self.active():
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        return
+                yield chunk
+        finally:
+            if chunks is not None:
+                close_iterator(chunks)
+            self.save()
+
+    async def astream(self, start: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Async version of `stream`. While a step waits on LangFlow the event loop
+        runs other tasks, which are then profiled along with the request.
+        """
+        chunks = None
+        try:
+            with self.active():
+                chunks = start()
+            while True:
+                with self.active():
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield chunk
+        finally:
+            if chunks is not None:
+                await aclose_iterator(chunks)
+            self.save()
+
+    def save(self) -> Optional[str]:
+        """
+        Write the profile to the store, once
+        """
+        if self.saved is not None or self.failed:
+            return self.saved
+
+        try:
+            if self.profiler is not None:
+                self.saved = self.store.save(self.profiler.dump_stats, self.model, self.request, "prof")
+            else:
+                self.sampler.stop()
+                self.saved = self.store.save(self.sampler.dump, self.model, self.request, "collapsed")
+        except OSError as e:
+            verbose_logger.warning(f"[Langflow Profiling] Could not save a profile of {self.model}: {e}")
+            self.failed = True
+            return None
+
+        verbose_logger.info(f"[Langflow Profiling] Saved a profile of {self.model} to {self.saved}")
+        return self.saved
@@ -0,0 +1,115 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Generic, Optional, TypeVar
+import asyncio
+
+from litellm._logging import verbose_logger
+
+from .exceptions import BaseLLMException
+
+T = TypeVar("T")
+
+# Marks the end of the stream in the queue
+_END = object()
+
+
+class ReadAhead(Generic[T]):
+    """
+    Reads a stream ahead of its consumer on a separate task, holding up to
+    `size` items in a queue, so reading upstream overlaps with delivering
+    downstream. Once the queue is full the reader stops reading, which pushes
+    back on the upstream connection. If the consumer then takes nothing for
+    `stall` seconds the upstream is closed with `close`, ending the run, and the
+    consumer gets the items already read followed by an error.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[T],
+        size: int,
+        stall: Optional[float] = None,
+        close: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.source = source
+        self.stall = stall
+        self.close = close
+
+        self.queue: "asyncio.Queue[object]" = asyncio.Queue(size)
+        self.error: Optional[BaseException] = None
+        self.stalled = False
+        self.finished = False
+        self.task = asyncio.ensure_future(self._read())
+
+    async def _put(self, item: object) -> None:
+        if self.stall is None:
+            await self.queue.put(item)
+            return
+        try:
+            await asyncio.wait_for(self.queue.put(item), self.stall)
+        except asyncio.TimeoutError:
+            self.stalled = True
+            raise BaseLLMException(
+                504, message=f"Stream consumer stalled for more than {self.stall:g}s"
+            )
+
+    async def _read(self) -> None:
+        try:
+            async for item in self.source:
+                await self._put(item)
+        except Exception as e:
+            self.error = e
+            if self.stalled and self.close is not None:
+                verbose_logger.warning(f"[Langflow Read Ahead] {e}, closing the upstream stream")
+                await self.close()
+        # Waits for room when the consumer stalled, until it catches up or closes
+        await self.queue.put(_END)
+
+    def __aiter__(self) -> "ReadAhead[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        if self.finished:
+            raise StopAsyncIteration
+        item = await self.queue.get()
+        if item is _END:
+            self.finished = True
+            if self.error is not None:
+                raise self.error
+            raise StopAsyncIteration
+        return item  # type: ignore
+
+    async def aclose(self) -> None:
+        """
+        Stop reading, waiting for the reader task to end
+        """
+        self.finished = True
+        if not self.task.done():
+            self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        aclose = getattr(self.source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+@asynccontextmanager
+async def read_ahead(
+    source: AsyncIterator[T],
+    size: int,
+    stall: Optional[float] = None,
+    close: Optional[Callable[[], Awaitable[None]]] = None,
+) -> AsyncIterator[AsyncIterator[T]]:
+    """
+    Read `source` ahead through a `ReadAhead` of `size` items, or read it
+    directly when `size` is 0
+    """
+    if size <= 0:
+        yield source
+        return
+
+    reader = ReadAhead(source, size, stall, close)
+    try:
+        yield reader
+    finally:
+        await reader.aclose()
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Tuple
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from litellm.types.utils import GenericStreamingChunk
+
+
+def response_cache_key(flow_id: str, messages: list, tweaks: dict) -> str:
+    """
+    Canonical hash of a flow run, stable across dict ordering and whitespace
+    """
+    payload = json.dumps(
+        [flow_id, messages, tweaks],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    In-memory cache of flow answers with a TTL and size-bounded LRU eviction.
+    Only meant for flows whose answer depends solely on the input, so it is
+    enabled per model.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+            text, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def set(self, key: str, text: str) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (text, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteResponseCache(ResponseCache):
+    """
+    Response cache stored in a sqlite database so answers survive restarts and
+    are shared between workers on the same host
+    """
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_entries: int = 1024):
+        super().__init__(ttl, max_entries)
+        self.path = path
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT text, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def set(self, key: str, text: str) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, text, now + self.ttl, now),
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()[0]
+
+
+def replay_chunks(text: str, chunk_chars: int = 64) -> Iterator[GenericStreamingChunk]:
+    """
+    Replay a cached answer as a chunk sequence, split at word boundaries, ending
+    with the finishing chunk
+    """
+    parts = []
+    size = 0
+    for match in re.finditer(r"\s*\S+", text):
+        parts.append(match.group())
+        size += len(parts[-1])
+        if size >= chunk_chars:
+            yield _replay_chunk("".join(parts), False)
+            parts, size = [], 0
+    trailing = text[len(text.rstrip()):]
+    yield _replay_chunk("".join(parts) + trailing, True)
+
+
+def _replay_chunk(text: str, finished: bool) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text=text,
+        is_finished=finished,
+        finish_reason="stop" if finished else "",
+        usage=None,
+        index=0,
+        tool_use=None,
+    )
+
+
+def record_chunks(
+    chunks: Iterable[GenericStreamingChunk], cache: ResponseCache, key: str
+) -> Iterator[GenericStreamingChunk]:
+    """
+    Pass chunks through, storing the full answer once the stream finishes
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk["text"])
+        if chunk["is_finished"]:
+            cache.set(key, "".join(parts))
+        yield chunk
+
+
+async def arecord_chunks(
+    chunks: AsyncIterable[GenericStreamingChunk], cache: ResponseCache, key: str
+) -> AsyncIterator[GenericStreamingChunk]:
+    """
+    Async version of `record_chunks`
+    """
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk["text"])
+        if chunk["is_finished"]:
+            cache.set(key, "".join(parts))
+        yield chunk
@@ -0,0 +1,263 @@
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+import asyncio
+import threading
+
+from litellm.types.utils import GenericStreamingChunk
+
+
+class _SharedStream:
+    """
+    One upstream stream read by any number of subscribers. Whichever subscriber
+    needs the next chunk first reads it from upstream, the rest wait for it.
+    """
+
+    def __init__(self, upstream: Iterator[GenericStreamingChunk], max_buffer: int):
+        self.upstream = upstream
+        self.max_buffer = max_buffer
+
+        # Chunks from index `offset` onwards, older ones are trimmed once no
+        # subscriber needs them
+        self.buffer: List[GenericStreamingChunk] = []
+        self.offset = 0
+        self.produced = 0
+        self.positions: Dict[int, int] = {}
+        self.joinable = True
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+        self._reading = False
+        self._next_subscriber = 0
+        self._condition = threading.Condition()
+
+    def join(self) -> Optional[int]:
+        """
+        Add a subscriber starting from the first chunk, None if the chunks it
+        would need to replay are no longer buffered
+        """
+        with self._condition:
+            if not self.joinable:
+                return None
+            subscriber = self._next_subscriber
+            self._next_subscriber += 1
+            self.positions[subscriber] = 0
+            return subscriber
+
+    def leave(self, subscriber: int) -> bool:
+        """
+        Remove a subscriber, returning True if it was the last one of an
+        unfinished stream
+        """
+        with self._condition:
+            self.positions.pop(subscriber, None)
+            self._trim()
+            abandoned = not self.positions and not self.done
+            if abandoned:
+                self.joinable = False
+            return abandoned
+
+    def next(self, subscriber: int) -> GenericStreamingChunk:
+        with self._condition:
+            while True:
+                position = self.positions[subscriber]
+                if position < self.produced:
+                    chunk = self.buffer[position - self.offset]
+                    self.positions[subscriber] = position + 1
+                    self._trim()
+                    return chunk
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    raise StopIteration
+                if not self._reading:
+                    break
+                self._condition.wait()
+            self._reading = True
+
+        # Read from upstream without holding the lock so other subscribers can
+        # keep replaying buffered chunks
+        try:
+            chunk = next(self.upstream)
+        except StopIteration:
+            self._finish(None)
+            return self.next(subscriber)
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+        with self._condition:
+            self.buffer.append(chunk)
+            self.produced += 1
+            if self.produced > self.max_buffer:
+                self.joinable = False
+            self._reading = False
+            self._condition.notify_all()
+        return self.next(subscriber)
+
+    def _finish(self, error: Optional[BaseException]) -> None:
+        with self._condition:
+            self.done = True
+            self.joinable = False
+            self.error = error
+            self._reading = False
+            self._condition.notify_all()
+
+    def _trim(self) -> None:
+        # While new subscribers can join, the whole stream is kept for replay
+        if self.joinable or not self.positions:
+            return
+        oldest = min(self.positions.values())
+        if oldest > self.offset:
+            del self.buffer[: oldest - self.offset]
+            self.offset = oldest
+
+
+class _AsyncSharedStream(_SharedStream):
+    """
+    `_SharedStream` over an async upstream, read by subscribers on one event
+    loop. The next chunk is read by a task that every waiting subscriber awaits,
+    so a subscriber cancelled mid-read does not break the stream for the rest.
+    """
+
+    def __init__(self, upstream: AsyncIterator[GenericStreamingChunk], max_buffer: int):
+        super().__init__(upstream, max_buffer)  # type: ignore
+        self.loop = asyncio.get_running_loop()
+        self._read: Optional[asyncio.Future] = None
+
+    async def anext(self, subscriber: int) -> GenericStreamingChunk:
+        while True:
+            with self._condition:
+                position = self.positions[subscriber]
+                if position < self.produced:
+                    chunk = self.buffer[position - self.offset]
+                    self.positions[subscriber] = position + 1
+                    self._trim()
+                    return chunk
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    raise StopAsyncIteration
+                if self._read is None:
+                    self._read = asyncio.ensure_future(self.upstream.__anext__())
+                read = self._read
+
+            await asyncio.wait({read})
+
+            with self._condition:
+                if self._read is not read:
+                    # Another subscriber already took the result
+                    continue
+                self._read = None
+                try:
+                    chunk = read.result()
+                except StopAsyncIteration:
+                    self._finish(None)
+                    continue
+                except BaseException as e:
+                    self._finish(e)
+                    continue
+                self.buffer.append(chunk)
+                self.produced += 1
+                if self.produced > self.max_buffer:
+                    self.joinable = False
+
+    async def aclose(self) -> None:
+        """
+        Stop reading and close the upstream run
+        """
+        read, self._read = self._read, None
+        if read is not None:
+            read.cancel()
+            await asyncio.wait({read})
+        aclose = getattr(self.upstream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class SingleFlight:
+    """
+    Collapses identical in-flight streaming requests onto one upstream stream.
+    Subscribers that attach late are replayed the chunks they missed, as long
+    as the stream has not produced more than `max_buffer` chunks yet.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, _SharedStream] = {}
+        self._astreams: Dict[str, _AsyncSharedStream] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        key: str,
+        start: Callable[[], Iterator[GenericStreamingChunk]],
+        max_buffer: int = 1024,
+    ) -> Iterator[GenericStreamingChunk]:
+        with self._lock:
+            stream = self._streams.get(key, None)
+            subscriber = stream.join() if stream is not None else None
+            if subscriber is None:
+                stream = _SharedStream(start(), max_buffer)
+                subscriber = stream.join()
+                self._streams[key] = stream
+
+        return self._iterate(key, stream, subscriber)
+
+    async def asubscribe(
+        self,
+        key: str,
+        start: Callable[[], AsyncIterator[GenericStreamingChunk]],
+        max_buffer: int = 1024,
+    ) -> AsyncIterator[GenericStreamingChunk]:
+        """
+        Async version of `subscribe`. Only streams read on the same event loop
+        are shared.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            stream = self._astreams.get(key, None)
+            subscriber = None
+            if stream is not None and stream.loop is loop:
+                subscriber = stream.join()
+            if subscriber is None:
+                stream = _AsyncSharedStream(start(), max_buffer)
+                subscriber = stream.join()
+                self._astreams[key] = stream
+
+        try:
+            while True:
+                try:
+                    chunk = await stream.anext(subscriber)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            abandoned = stream.leave(subscriber)
+            with self._lock:
+                if self._astreams.get(key, None) is stream and not stream.joinable:
+                    del self._astreams[key]
+            if abandoned:
+                await stream.aclose()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._streams) + len(self._astreams)
+
+    def _iterate(
+        self, key: str, stream: _SharedStream, subscriber: int
+    ) -> Iterator[GenericStreamingChunk]:
+        try:
+            while True:
+                try:
+                    chunk = stream.next(subscriber)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            abandoned = stream.leave(subscriber)
+            with self._lock:
+                if self._streams.get(key, None) is stream and not stream.joinable:
+                    del self._streams[key]
+            if abandoned:
+                # Nobody is left to read the run, so close it upstream
+                close = getattr(stream.upstream, "close", None)
+                if close is not None:
+                    close()
@@ -0,0 +1,80 @@
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List
+
+try:
+    # orjson is considerably faster and its JSONDecodeError subclasses json's
+    from orjson import loads  # type: ignore # noqa: F401
+except ImportError:
+    from json import loads  # noqa: F401
+
+
+# Payload sent by OpenAI compatible endpoints to mark the end of a stream
+DONE = b"[DONE]"
+
+
+class StreamDecoder:
+    """
+    Incremental decoder that frames events out of a raw byte stream. In SSE mode
+    only `data:` lines (and a bare `[DONE]`) are events and the `data:` prefix is
+    removed, otherwise every non-empty line is an event (newline delimited JSON).
+    Events are returned as bytes so they can be handed straight to `loads`.
+    """
+
+    def __init__(self, sse: bool = False):
+        self.sse = sse
+        self.bytes_received = 0
+
+        self._buffer = bytearray()
+
+    def _payload(self, line: bytearray) -> bytes:
+        line = line.strip()
+        if not self.sse or not line:
+            return bytes(line)
+
+        if line.startswith(b"data:"):
+            return bytes(line[5:].lstrip())
+
+        # Other SSE fields carry no content, only a bare [DONE] is kept
+        return DONE if line == DONE else b""
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Add bytes read from the stream, returning every event completed by them
+        """
+        self.bytes_received += len(data)
+
+        buffer = self._buffer
+        buffer += data
+
+        events = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            payload = self._payload(buffer[start:end])
+            if payload:
+                events.append(payload)
+            start = end + 1
+
+        del buffer[:start]
+        return events
+
+    def flush(self) -> List[bytes]:
+        """
+        Get the final event from a stream that does not end with a newline
+        """
+        payload = self._payload(self._buffer)
+        self._buffer = bytearray()
+        return [payload] if payload else []
+
+    def iter_events(self, stream: Iterable[bytes]) -> Iterator[bytes]:
+        for data in stream:
+            yield from self.feed(data)
+        yield from self.flush()
+
+    async def aiter_events(self, stream: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for data in stream:
+            for event in self.feed(data):
+                yield event
+        for event in self.flush():
+            yield event
@@ -0,0 +1,103 @@
+from typing import Any, Dict, Optional
+import bisect
+import json
+import time
+
+from litellm._logging import verbose_logger
+
+
+# Upper bounds (in milliseconds) of the inter-chunk latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LazyJSON:
+    """
+    Defers serializing a payload until a log record using it is actually
+    formatted, so debug dumps cost nothing when debug logging is off.
+    Pass it as a logging argument, `verbose_logger.debug("Body: %s", LazyJSON(body))`.
+    """
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        try:
+            return json.dumps(self.payload, indent=2, default=str)
+        except (TypeError, ValueError):
+            return repr(self.payload)
+
+
+class StreamMetrics:
+    """
+    Per-stream telemetry. Chunks are recorded with a couple of counter updates
+    and a single summary record is emitted when the stream ends, replacing
+    per-chunk logging.
+    """
+
+    def __init__(self, stream: str, model: str):
+        self.stream = stream
+        self.model = model
+
+        self.started = time.perf_counter()
+        self.first_chunk: Optional[float] = None
+        self.last_chunk: Optional[float] = None
+
+        self.chunks = 0
+        self.text_chars = 0
+        self.bytes = 0
+        self.status: Optional[str] = None
+        self.inter_chunk_ms = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record_chunk(self, text: str) -> None:
+        now = time.perf_counter()
+        if self.last_chunk is None:
+            self.first_chunk = now
+        else:
+            latency_ms = (now - self.last_chunk) * 1000
+            self.inter_chunk_ms[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.last_chunk = now
+
+        self.chunks += 1
+        self.text_chars += len(text)
+
+    def summary(self) -> Dict[str, Any]:
+        histogram = {
+            f"le_{bound}": count
+            for bound, count in zip(LATENCY_BUCKETS_MS, self.inter_chunk_ms)
+        }
+        histogram["inf"] = self.inter_chunk_ms[-1]
+
+        return {
+            "stream": self.stream,
+            "model": self.model,
+            "status": self.status,
+            "ttft_ms": (
+                round((self.first_chunk - self.started) * 1000, 3)
+                if self.first_chunk is not None
+                else None
+            ),
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "chunks": self.chunks,
+            "text_chars": self.text_chars,
+            "bytes": self.bytes,
+            "inter_chunk_ms": histogram,
+        }
+
+    def finish(self, status: str, bytes_received: Optional[int] = None) -> None:
+        """
+        Emit the summary record. Only the first call has an effect.
+        """
+        if self.status is not None:
+            return
+        self.status = status
+        if bytes_received is not None:
+            self.bytes = bytes_received
+
+        summary = self.summary()
+        verbose_logger.info(
+            "[Langflow Streaming] Stream summary: %s",
+            json.dumps(summary),
+            extra={"langflow_stream": summary},
+        )
@@ -0,0 +1,73 @@
+from typing import Callable
+
+from litellm.types.llms.openai import ChatCompletionUsageBlock
+from litellm.types.utils import GenericStreamingChunk
+
+
+# Pending text without a word boundary is counted anyway past this many characters
+MAX_PENDING_CHARS = 256
+
+
+def _word_boundary(text: str) -> int:
+    """
+    Index of the last space that starts a new word, or 0 if there is none. BPE
+    tokenizers attach a single leading space to the following word, so text split
+    there tokenizes the same as the joined text. Newlines are not used since they
+    can merge with preceding punctuation.
+    """
+    for index in range(len(text) - 1, 0, -1):
+        if text[index] == " " and not text[index - 1].isspace():
+            return index
+    return 0
+
+
+class StreamUsage:
+    """
+    Token usage of a streamed response. Prompt tokens are counted once up front
+    and completion tokens are counted as chunks pass through, so the text is never
+    buffered beyond the last partial word. The final usage is attached to the
+    terminating chunk.
+    """
+
+    def __init__(self, prompt_tokens: int, count_tokens: Callable[[str], int]):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+
+        self._count_tokens = count_tokens
+        self._pending = ""
+
+    def add(self, text: str) -> None:
+        if not text:
+            return
+        self._pending += text
+
+        cut = _word_boundary(self._pending)
+        if cut == 0 and len(self._pending) > MAX_PENDING_CHARS:
+            cut = len(self._pending)
+        if cut > 0:
+            self.completion_tokens += self._count_tokens(self._pending[:cut])
+            self._pending = self._pending[cut:]
+
+    def usage(self) -> ChatCompletionUsageBlock:
+        if self._pending:
+            self.completion_tokens += self._count_tokens(self._pending)
+            self._pending = ""
+
+        return ChatCompletionUsageBlock(
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+        )
+
+    def track(self, chunk: GenericStreamingChunk) -> GenericStreamingChunk:
+        """
+        Count the text of a chunk, returning a copy with the usage attached if it
+        is the terminating chunk
+        """
+        self.add(chunk["text"])
+        if not chunk["is_finished"]:
+            return chunk
+
+        finished = GenericStreamingChunk(**chunk)
+        finished["usage"] = self.usage()
+        return finished
@@ -0,0 +1,147 @@
+from typing import Optional
+import copy
+import time
+
+import httpx  # type: ignore
+
+import litellm
+
+
+def earliest(*budgets: Optional[float]) -> Optional[float]:
+    """
+    Tightest of the given budgets, None if none of them is limited
+    """
+    budgets = tuple(budget for budget in budgets if budget is not None)
+    return min(budgets) if budgets else None
+
+
+class RunTimeouts:
+    """
+    Time budgets of a run in seconds, None meaning no limit. `connect` bounds
+    connecting to LangFlow, `first_byte` the wait for the run's first output,
+    `idle` the silence between bytes of a stream and `total` the whole run,
+    including retries on other replicas and hedged attempts.
+
+    httpx applies its read timeout to every socket read, so the first byte
+    budget is used while waiting for the response headers and the idle budget
+    for the body of a stream. Without a first byte budget the run may take
+    until its total deadline to answer, or the idle budget when it has none.
+    The first byte clock starts when the run's request is sent, so time spent
+    queued for a slot or looking up the flow only counts against the total.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        connect: Optional[float] = 10.0,
+        first_byte: Optional[float] = None,
+        idle: Optional[float] = 60.0,
+        total: Optional[float] = None,
+    ):
+        self.model = model
+        self.connect = connect
+        self.first_byte = first_byte
+        self.idle = idle
+        self.total = total
+
+        self.started = time.monotonic()
+        self.deadline = None if total is None else self.started + total
+        self.sent: Optional[float] = None
+
+    def attempt(self) -> "RunTimeouts":
+        """
+        Budgets for one of several concurrent attempts of the run, sharing its
+        total deadline but keeping its own first byte clock
+        """
+        timeouts = copy.copy(self)
+        timeouts.sent = None
+        return timeouts
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def _timeout(self, read: Optional[float]) -> httpx.Timeout:
+        remaining = self.remaining()
+        connect = earliest(self.connect, remaining)
+        return httpx.Timeout(
+            connect=connect,
+            read=earliest(read, remaining),
+            write=connect,
+            pool=connect,
+        )
+
+    def _first_byte_read(self) -> Optional[float]:
+        if self.first_byte is not None:
+            return self.first_byte
+        return None if self.deadline is not None else self.idle
+
+    def lookup_timeout(self) -> httpx.Timeout:
+        """
+        Timeout of the flow lookup made before a run, which gets the same read
+        budget as the run's first byte
+        """
+        return self._timeout(self._first_byte_read())
+
+    def first_byte_timeout(self) -> httpx.Timeout:
+        """
+        Timeout of a request until its response headers arrive, starting the
+        first byte clock of the attempt about to be sent
+        """
+        self.sent = time.monotonic()
+        return self._timeout(self._first_byte_read())
+
+    def idle_timeout(self, response: httpx.Response) -> None:
+        """
+        Switch a streaming response over to the idle budget for its body
+        """
+        response.request.extensions["timeout"] = self._timeout(self.idle).as_dict()
+
+    def check(self, output_started: bool) -> None:
+        """
+        Raise if the run is past its total deadline, or past its first byte
+        deadline without having produced any output
+        """
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            raise self.expired("total deadline")
+        if (
+            not output_started
+            and self.first_byte is not None
+            and self.sent is not None
+            and now - self.sent >= self.first_byte
+        ):
+            raise self.expired("first byte deadline")
+
+    def expired(self, phase: str) -> litellm.Timeout:
+        """
+        Error of a run that ran out of time. Running out of the model's connect,
+        first byte or idle budget counts against the replica, while passing the
+        total deadline, which is usually the caller's, says nothing about it.
+        """
+        error = litellm.Timeout(
+            message=(
+                f"LangFlow run of {self.model} timed out, {phase} passed after "
+                f"{time.monotonic() - self.started:.1f}s"
+            ),
+            model=self.model,
+            llm_provider="langflow",
+        )
+        error.backend_failure = not phase.endswith("total deadline")
+        return error
+
+    def phase(self, error: Exception) -> str:
+        """
+        Which budget an httpx timeout ran out. LiteLLM's HTTP handlers replace
+        the httpx timeout with a `litellm.Timeout`, leaving it as the context.
+        """
+        if isinstance(error, litellm.Timeout) and error.__context__ is not None:
+            error = error.__context__
+        if self.remaining() == 0.0:
+            return "total deadline"
+        if isinstance(error, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return "connect timeout"
+        if isinstance(error, httpx.WriteTimeout):
+            return "write timeout"
+        return "read timeout"
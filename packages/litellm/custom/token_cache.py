@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+import hashlib
+import threading
+
+
+class TokenCountCache:
+    """
+    Bounded LRU cache of token counts keyed by (tokenizer, content hash). Each
+    turn of a conversation resends every earlier message, so only messages not
+    seen before need to be encoded.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[Tuple[Hashable, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, tokenizer: Hashable, text: str, encode: Callable[[str], int]) -> int:
+        """
+        Get the token count for the text, calling `encode` on a miss
+        """
+        if self.max_entries <= 0:
+            return encode(text)
+
+        key = (
+            tokenizer,
+            hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest(),
+        )
+        with self._lock:
+            count = self._entries.get(key, None)
+            if count is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return count
+            self.misses += 1
+
+        count = encode(text)
+
+        with self._lock:
+            self._entries[key] = count
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return count
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,324 @@
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import litellm
+import pytest
+from litellm.types.utils import GenericStreamingChunk
+
+from custom.admission import BATCH, INTERACTIVE, AdaptiveLimiter, FairQueue, Waiter
+from custom.exceptions import BaseLLMException
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+def _limiter(**kwargs) -> AdaptiveLimiter:
+    settings = {'limit': 1, 'max_limit': 4, 'queue_size': 2, 'queue_timeout': 1.0}
+    settings.update(kwargs)
+    return AdaptiveLimiter('CourseTutorLarge', **settings)
+
+
+class TestQueue:
+    def test_waits_for_slot(self):
+        """ Requests over the limit wait until a slot is released """
+        limiter = _limiter()
+        limiter.acquire()
+        admitted = threading.Event()
+
+        def waiter():
+            limiter.acquire()
+            admitted.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        assert not admitted.is_set()
+        assert limiter.stats()['queue_depth'] == 1
+
+        limiter.release(None, False)
+        thread.join(1.0)
+        assert admitted.is_set()
+        stats = limiter.stats()
+        assert stats['in_flight'] == 1
+        assert stats['queue_depth'] == 0
+        assert stats['admitted'] == 2
+        assert stats['wait_ms_avg'] > 0
+
+    def test_queue_full(self):
+        """ Requests beyond the queue are shed right away with a Retry-After """
+        limiter = _limiter(queue_size=0)
+        limiter.acquire()
+
+        with pytest.raises(BaseLLMException) as error:
+            limiter.acquire()
+
+        assert error.value.status_code == 429
+        assert int(error.value.headers['retry-after']) >= 1
+        assert limiter.stats()['shed'] == 1
+
+    def test_queue_timeout(self):
+        """ Requests waiting past the deadline are shed """
+        limiter = _limiter(queue_timeout=0.05)
+        limiter.acquire()
+
+        with pytest.raises(BaseLLMException) as error:
+            limiter.acquire()
+
+        assert error.value.status_code == 429
+        assert limiter.stats()['queue_depth'] == 0
+
+    def test_async_wait(self):
+        """ Async requests wait without blocking the loop and leave the queue when cancelled """
+        limiter = _limiter()
+
+        async def run():
+            await limiter.aacquire()
+            waiting = asyncio.ensure_future(limiter.aacquire())
+            cancelled = asyncio.ensure_future(limiter.aacquire())
+            await asyncio.sleep(0.01)
+            assert limiter.stats()['queue_depth'] == 2
+
+            cancelled.cancel()
+            await asyncio.sleep(0.01)
+            assert limiter.stats()['queue_depth'] == 1
+
+            limiter.release(None, False)
+            await asyncio.wait_for(waiting, 1.0)
+
+        asyncio.run(run())
+        assert limiter.stats()['in_flight'] == 1
+
+
+class TestAIMD:
+    def test_additive_increase(self):
+        """ Runs within the latency tolerance raise the limit """
+        limiter = _limiter()
+        for _ in range(6):
+            limiter.acquire()
+            limiter.release(0.1, False)
+
+        assert limiter.stats()['limit'] >= 3
+
+    def test_configure_grants_waiters(self):
+        """ Raising the limit of a limiter in use admits queued requests """
+        limiter = _limiter()
+        limiter.acquire()
+        waiter = Waiter()
+        assert not limiter._enqueue(waiter)
+
+        limiter.configure(2, 4, 2, 1.0)
+
+        assert waiter.granted
+        assert limiter.stats()['in_flight'] == 2
+
+    def test_multiplicative_decrease(self):
+        """ Errors and slow runs cut the limit """
+        limiter = _limiter(limit=4, max_limit=8)
+        limiter.acquire()
+        limiter.release(0.1, False)
+        limiter.acquire()
+        limiter.release(1.0, False)
+        assert limiter.limit < 4
+
+        before = limiter.limit
+        limiter.acquire()
+        limiter.release(None, True)
+        assert limiter.limit == pytest.approx(before * 0.75)
+
+    def test_overload_errors(self):
+        """ Server errors count against the limit while bad requests do not """
+        limiter = _limiter(limit=4, max_limit=4)
+
+        with pytest.raises(BaseLLMException):
+            with limiter.slot():
+                raise BaseLLMException(400, message='bad request')
+        assert limiter.limit == 4
+
+        with pytest.raises(BaseLLMException):
+            with limiter.slot():
+                raise BaseLLMException(503, message='unavailable')
+        assert limiter.limit == 3
+
+    def test_stream_holds_slot(self):
+        """ A stream holds its slot until it is closed """
+        limiter = _limiter()
+        stream = limiter.stream(lambda: iter(['a', 'b']))
+
+        assert next(stream) == 'a'
+        assert limiter.stats()['in_flight'] == 1
+        stream.close()
+        assert limiter.stats()['in_flight'] == 0
+
+
+class TestLangflowAdmission:
+    def _call(self, langflow, optional_params):
+        return langflow.completion(
+            'CourseTutorLarge', [{'role': 'user', 'content': 'hi'}], 'http://langflow', {}, None, print,
+            None, 'key', None, optional_params,
+        )
+
+    def test_completion_limited(self):
+        """ Completions of a limited flow take a slot of its limiter """
+        langflow = Langflow()
+
+        def in_flight(*args):
+            return MagicMock(in_flight=langflow.limiters['CourseTutorLarge'].stats()['in_flight'])
+
+        langflow._make_completion = MagicMock(side_effect=in_flight)
+        langflow._amake_completion = AsyncMock(side_effect=in_flight)
+
+        assert self._call(langflow, {'concurrency_limit': 2}).in_flight == 1
+        assert self._call(langflow, {'concurrency_limit': 2, 'hedge': True}).in_flight == 1
+        assert langflow.admission_stats()['CourseTutorLarge']['in_flight'] == 0
+
+    def test_settings_reread(self):
+        """ Changed settings are applied to the flow's limiter, unchanged ones leave it be """
+        langflow = Langflow()
+        limiter = langflow._get_limiter('CourseTutorLarge', {'concurrency_limit': 2})
+        limiter.limit = 3.5
+
+        assert langflow._get_limiter('CourseTutorLarge', {'concurrency_limit': 2}).limit == 3.5
+        assert langflow._get_limiter('CourseTutorLarge', {
+            'concurrency_limit': 2, 'queue_size': 5, 'fair_share_weights': '{"course-a": 3}',
+        }) is limiter
+        assert limiter.limit == 3.5
+        assert limiter.queue_size == 5
+        assert limiter._queue.weights == {'course-a': 3}
+
+        langflow._get_limiter('CourseTutorLarge', {'concurrency_limit': 1, 'concurrency_max': 2})
+        assert limiter.stats()['limit'] == 1
+        assert limiter.max_limit == 2
+
+    def test_invalid_fair_share_weights(self):
+        """ Weights that are not a JSON object of numbers are rejected as a bad request """
+        langflow = Langflow()
+
+        for weights in ['{"course-a": 3', '[3, 1]', '{"course-a": "high"}']:
+            with pytest.raises(BaseLLMException) as e:
+                self._call(langflow, {'concurrency_limit': 2, 'fair_share_weights': weights})
+            assert e.value.status_code == 400
+            assert 'fair_share_weights' in e.value.message
+
+    def test_astreaming_queues_on_loop(self, monkeypatch):
+        """ An async stream waiting for a slot leaves the event loop free """
+        langflow = Langflow()
+        monkeypatch.setattr(litellm, 'custom_provider_map', [{'provider': 'langflow', 'custom_handler': langflow}])
+        released = {}
+
+        async def run_stream(*args):
+            await released['event'].wait()
+            for text, finished in (('office ', False), ('hours', False), ('', True)):
+                yield GenericStreamingChunk(
+                    text=text, is_finished=finished, finish_reason='stop' if finished else '',
+                    usage=None, index=0, tool_use=None,
+                )
+
+        langflow._amake_run_streaming = run_stream
+
+        async def read(stream) -> str:
+            return ''.join([chunk.choices[0].delta.content or '' async for chunk in stream])
+
+        async def run():
+            released['event'] = asyncio.Event()
+            streams = [
+                await litellm.acompletion(
+                    model='langflow/CourseTutorLarge', messages=[{'role': 'user', 'content': 'hi'}], stream=True,
+                    api_base='http://langflow', api_key='key', concurrency_limit=1, queue_timeout_ms=5000,
+                )
+                for _ in range(2)
+            ]
+            reads = [asyncio.ensure_future(read(stream)) for stream in streams]
+
+            # One stream holds the only slot and the other queues, while the loop keeps running
+            started = time.monotonic()
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+            assert time.monotonic() - started < 1.0
+            stats = langflow.admission_stats()['CourseTutorLarge']
+            assert stats['in_flight'] == 1
+            assert stats['queue_depth'] == 1
+
+            released['event'].set()
+            return await asyncio.wait_for(asyncio.gather(*reads), 5.0)
+
+        assert asyncio.run(run()) == ['office hours', 'office hours']
+        assert langflow.admission_stats()['CourseTutorLarge']['in_flight'] == 0
+
+
+class TestFairQueue:
+    def _queued(self, limiter, key, priority=INTERACTIVE):
+        waiter = Waiter(key=key, priority=priority)
+        assert not limiter._enqueue(waiter)
+        return waiter
+
+    def _serve(self, limiter, count):
+        served = []
+        for _ in range(count):
+            waiter = limiter._queue.pop()
+            served.append(waiter.key)
+        return served
+
+    def test_weighted_share(self):
+        """ Queued keys are served in proportion to their weights """
+        limiter = _limiter(queue_size=100, queue=FairQueue({'course-a': 3}))
+        limiter.acquire()
+        for _ in range(8):
+            self._queued(limiter, 'course-a')
+        for _ in range(8):
+            self._queued(limiter, 'course-b')
+
+        served = self._serve(limiter, 8)
+        assert served.count('course-a') == 6
+        assert served.count('course-b') == 2
+
+    def test_busy_key_does_not_starve(self):
+        """ A key arriving behind a long backlog is served next """
+        limiter = _limiter(queue_size=100, queue=FairQueue())
+        limiter.acquire()
+        for _ in range(10):
+            self._queued(limiter, 'course-a')
+        self._queued(limiter, 'course-b')
+
+        assert 'course-b' in self._serve(limiter, 2)
+
+    def test_interactive_first(self):
+        """ Interactive requests are served before batch ones """
+        limiter = _limiter(queue_size=100, queue=FairQueue())
+        limiter.acquire()
+        self._queued(limiter, 'course-a', BATCH)
+        self._queued(limiter, 'course-b', BATCH)
+        self._queued(limiter, 'course-c', INTERACTIVE)
+
+        assert self._serve(limiter, 3) == ['course-c', 'course-a', 'course-b']
+
+    def test_key_stats(self):
+        """ Queue latency is reported per key """
+        limiter = _limiter(queue=FairQueue())
+        limiter.acquire('course-a')
+        waiter = self._queued(limiter, 'course-b')
+        time.sleep(0.02)
+        limiter.release(None, False)
+        limiter._dequeue(waiter)
+
+        keys = limiter.stats()['keys']
+        assert keys['course-a']['wait_ms_avg'] == 0.0
+        assert keys['course-b']['admitted'] == 1
+        assert keys['course-b']['wait_ms_max'] >= 20
+
+    def test_tenant_and_priority(self):
+        """ Requests are queued by API key alias or team, with priority from metadata """
+        langflow = Langflow()
+        litellm_params = {'metadata': {
+            'user_api_key_alias': 'course-a', 'user_api_key_hash': 'abc',
+            'user_api_key_team_id': 'team-1', 'priority': 'batch',
+        }}
+
+        assert langflow._get_tenant(litellm_params, {}) == 'course-a'
+        assert langflow._get_tenant(litellm_params, {'fair_share_by': 'team'}) == 'team-1'
+        assert langflow._get_tenant({'metadata': {'user_api_key_hash': 'abc'}}, {}) == 'abc'
+        assert langflow._get_tenant(None, {}) == 'default'
+        assert langflow._get_priority(litellm_params, INTERACTIVE) == BATCH
+        assert langflow._get_priority({}, INTERACTIVE) == INTERACTIVE
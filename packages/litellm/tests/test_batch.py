@@ -0,0 +1,102 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom.batch import run_batch
+from custom.exceptions import BaseLLMException
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+class TestRunBatch:
+    def test_ordered_and_bounded(self):
+        """ Results keep the order of the items while at most `concurrency` run at once """
+        in_flight = 0
+        peak = 0
+
+        async def run(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01 * (item % 3))
+            in_flight -= 1
+            return item * 2
+
+        results = asyncio.run(run_batch(list(range(20)), run, concurrency=4))
+
+        assert results == [item * 2 for item in range(20)]
+        assert peak == 4
+
+    def test_retries(self):
+        """ Retryable failures are retried while other failures are returned in place """
+        attempts = {}
+
+        async def run(item):
+            attempts[item] = attempts.get(item, 0) + 1
+            if item == 'flaky' and attempts[item] < 3:
+                raise BaseLLMException(503, message='unavailable')
+            if item == 'bad':
+                raise BaseLLMException(400, message='bad request')
+            return item
+
+        results = asyncio.run(run_batch(['flaky', 'bad', 'ok'], run, retries=2, retry_backoff=0))
+
+        assert results[0] == 'flaky'
+        assert isinstance(results[1], BaseLLMException)
+        assert results[2] == 'ok'
+        assert attempts == {'flaky': 3, 'bad': 1, 'ok': 1}
+
+    def test_retries_exhausted(self):
+        """ An item that keeps failing ends with its last error """
+        async def run(item):
+            raise BaseLLMException(429, message='busy')
+
+        results = asyncio.run(run_batch(['a'], run, retries=1, retry_backoff=0))
+
+        assert results[0].status_code == 429
+
+    def test_progress(self):
+        """ Progress is reported as items finish """
+        reports = []
+
+        async def run(item):
+            if item == 2:
+                raise BaseLLMException(400, message='bad request')
+            return item
+
+        asyncio.run(run_batch([1, 2, 3], run, concurrency=1, on_progress=lambda p: reports.append(p.stats())))
+
+        assert [report['completed'] + report['failed'] for report in reports] == [1, 2, 3]
+        assert reports[-1]['failed'] == 1
+        assert reports[-1]['eta_s'] == 0
+
+
+class TestLangflowBatch:
+    def _client(self):
+        async def post(url, params, json, headers, timeout):
+            response = MagicMock()
+            response.json.return_value = {
+                'outputs': [{'outputs': [{'results': {'message': {'data': {'text': f"re: {json['input_value']}"}}}}]}]
+            }
+            return response
+
+        client = MagicMock()
+        client.post = post
+        return client
+
+    def test_batch_completion(self):
+        """ A batch answers every prompt in order and looks up the flow once """
+        langflow = Langflow()
+        langflow._aget_history_component_id = AsyncMock(return_value='ChatHistory-1')
+        messages_list = [[{'role': 'user', 'content': f'question {index}'}] for index in range(10)]
+
+        with patch.object(langflow.clients, 'get_async_handler', return_value=self._client()):
+            results = langflow.batch_completion(
+                'flow', messages_list, 'http://langflow', 'key', {}, concurrency=3
+            )
+
+        assert [result.choices[0].message.content for result in results] == [
+            f're: question {index}' for index in range(10)
+        ]
+        langflow._aget_history_component_id.assert_awaited_once()
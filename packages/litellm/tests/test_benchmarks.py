@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import httpx
+
+from benchmarks import parser as parser_benchmark
+from benchmarks import run as benchmark
+from benchmarks.stub_server import HISTORY_COMPONENT, StubLangflow, serve
+
+
+def _get(app, method, url, **kwargs) -> httpx.Response:
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://stub') as client:
+            return await client.request(method, url, **kwargs)
+
+    return asyncio.run(request())
+
+
+class TestStubLangflow:
+    def test_flow(self):
+        """ The flow document has a history component and is padded to size """
+        response = _get(StubLangflow(flow_chars=5000), 'GET', '/api/v1/flows/flow')
+
+        assert response.json()['data']['nodes'][0]['id'] == HISTORY_COMPONENT
+        assert len(response.content) >= 5000
+
+    def test_run_stream(self):
+        """ Streamed runs send one token event per chunk and an end event """
+        app = StubLangflow(tokens=5, chunk_chars=3)
+        response = _get(app, 'POST', '/api/v1/run/flow', params={'stream': True}, json={})
+
+        events = [event for event in response.text.split('\n\n') if event]
+        assert len(events) == 7
+        assert ''.join(app.chunks()) == app.answer
+        assert len(app.answer) == 15
+
+    def test_responses(self):
+        """ The responses endpoint streams SSE deltas ending with [DONE] """
+        response = _get(StubLangflow(tokens=3), 'POST', '/api/v1/responses', json={})
+
+        assert response.text.startswith('data: {"delta"')
+        assert response.text.endswith('data: [DONE]\n\n')
+
+
+class TestBenchmark:
+    def test_builtin_server(self):
+        """ The built-in server streams responses over keep-alive connections """
+        async def run():
+            ready = asyncio.get_running_loop().create_future()
+            server = asyncio.ensure_future(serve(StubLangflow(tokens=4), on_ready=ready.set_result))
+            port = await ready
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}') as client:
+                first = await client.post('/api/v1/run/flow', params={'stream': False}, json={})
+                second = await client.post('/api/v1/run/flow', params={'stream': True}, json={})
+            server.cancel()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first.json()['outputs'][0]['outputs'][0]['results']['message']['data']['text']
+        assert second.text.count('"token"') == 4
+
+    def test_report(self, tmp_path):
+        """ A small run reports every mode and level without errors """
+        report = benchmark.main([
+            '--modes', 'streaming,acompletion', '--concurrency', '1,2', '--requests', '2',
+            '--tokens', '10', '--output', str(tmp_path / 'report.json'),
+        ])
+
+        for mode in ('streaming', 'acompletion'):
+            for level in ('1', '2'):
+                metrics = report['results'][mode][level]
+                assert metrics['errors'] == 0
+                assert metrics['throughput_rps'] > 0
+                assert metrics['ttft_ms_p50'] is not None
+        assert (tmp_path / 'report.json').exists()
+        assert benchmark.compare(report, report)[0].startswith('streaming x1: throughput_rps +0.0%')
+
+
+class TestParserBenchmark:
+    def test_workloads(self):
+        """ Every workload parses the same with the sync and async iterators """
+        for name, raw in parser_benchmark.workloads().items():
+            assert parser_benchmark.parse_sync(raw) == parser_benchmark.parse_async(raw), name
+
+        chunks = parser_benchmark.parse_sync(parser_benchmark.token_stream(10))
+        assert ''.join(chunk['text'] for chunk in chunks) == ''.join(f' word{index}' for index in range(10))
+        chunks = parser_benchmark.parse_sync(parser_benchmark.agentic_stream(1000, messages=2))
+        assert len(chunks[-1]['text']) == 1000
+
+    def test_check(self):
+        """ Throughput is compared against the baseline scaled by the machine speed """
+        baseline = {
+            'iterators': {'tokens.sync': {'events_per_s': 1000.0, 'calibration_per_s': 100.0}},
+            'methods': {'_parse_token_chunk': {'calls_per_s': 500.0, 'calibration_per_s': 100.0}},
+        }
+        slower_machine = {
+            'iterators': {'tokens.sync': {'events_per_s': 480.0, 'calibration_per_s': 50.0}},
+            'methods': {'_parse_token_chunk': {'calls_per_s': 150.0, 'calibration_per_s': 50.0}},
+        }
+
+        regressions = parser_benchmark.check(slower_machine, baseline, 0.2)
+
+        assert len(regressions) == 1
+        assert regressions[0].startswith('methods._parse_token_chunk')
+        assert parser_benchmark.check(baseline, baseline, 0.2) == []
+
+    def test_main(self, tmp_path):
+        """ A run can be stored as the baseline and checked against it """
+        baseline = tmp_path / 'baseline.json'
+
+        assert parser_benchmark.main(['--repeat', '1', '--min-time', '0', '--save-baseline', '--baseline', str(baseline)]) == 0
+        report = json.loads(baseline.read_text())
+        assert report['iterators']['long_token_stream.async']['events'] == 5002
+        assert report['methods']['_parse_agentic_end']['calls_per_s'] > 0
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from litellm.types.utils import GenericStreamingChunk
+
+from custom.admission import AdaptiveLimiter
+from custom.cancellation import CancelledRuns
+from custom.chunk_coalescer import acoalesce_chunks, coalesce_chunks
+from custom.load_balancer import LangflowLoadBalancer
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+MESSAGES = [{'role': 'user', 'content': 'When are office hours?'}]
+
+
+def _chunk(text: str) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text=text, is_finished=False, finish_reason='', usage=None, index=0, tool_use=None
+    )
+
+
+class _TokenRunHandler(BaseHTTPRequestHandler):
+    """ Streams tokens of a run until the client goes away or the run ends """
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for _ in range(self.server.tokens):
+                self.wfile.write(b'{"event": "token", "data": {"chunk": "word "}}\n\n')
+                self.wfile.flush()
+                time.sleep(0.02)
+            self.wfile.write(b'{"event": "end", "data": {"result": {}}}\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.disconnected.set()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def token_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TokenRunHandler)
+    server.tokens = 250
+    server.disconnected = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+class _Upstream:
+    """ Stream that records whether it was closed """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class TestLayersClose:
+    def test_limiter(self):
+        """ Closing a limited stream closes the stream it wraps """
+        upstream = _Upstream(['a', 'b'])
+        stream = AdaptiveLimiter('flow', 1, 1).stream(lambda: upstream)
+
+        next(stream)
+        stream.close()
+        assert upstream.closed
+
+    def test_balancer(self):
+        """ Closing a balanced stream closes the replica's stream """
+        upstream = _Upstream(['a', 'b'])
+        stream = LangflowLoadBalancer(probe_interval=0).stream(['http://a'], lambda base_url: upstream)
+
+        next(stream)
+        stream.close()
+        assert upstream.closed
+
+    def test_coalescer(self):
+        """ Closing a coalesced stream closes the stream it merges """
+        upstream = _Upstream([_chunk('a'), _chunk('b')])
+        stream = coalesce_chunks(upstream, 32, 1.0)
+
+        next(stream)
+        stream.close()
+        assert upstream.closed
+
+    def test_async_coalescer(self):
+        """ Closing an async coalesced stream closes the stream it merges """
+        closed = asyncio.Event()
+
+        async def upstream():
+            try:
+                yield _chunk('a')
+                await asyncio.sleep(10)
+            finally:
+                closed.set()
+
+        async def run():
+            stream = acoalesce_chunks(upstream(), 32, 1.0)
+            await stream.__anext__()
+            await stream.aclose()
+            return closed.is_set()
+
+        assert asyncio.run(run())
+
+
+class TestCancelledRuns:
+    def test_stats(self):
+        """ Cancelled runs are counted per model with the time they had run for """
+        cancelled = CancelledRuns()
+        cancelled.record('flow', 1.5)
+        cancelled.record('flow', 0.5)
+
+        assert cancelled.stats() == {'cancelled': 2, 'cancelled_after_s': 2.0, 'models': {'flow': 2}}
+
+
+class TestLangflowCancellation:
+    def _stream(self, langflow, server):
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+        return langflow.streaming('flow', MESSAGES, base_url, {}, None, print, None, 'key', None, {})
+
+    def _langflow(self):
+        langflow = Langflow()
+        langflow._get_history_component_id = MagicMock(return_value='ChatHistory-1')
+        return langflow
+
+    def test_disconnect_closes_run(self, token_server):
+        """ Closing a stream early disconnects from LangFlow and counts the cancelled run """
+        langflow = self._langflow()
+        stream = self._stream(langflow, token_server)
+
+        assert next(stream)['text'] == 'word '
+        stream.close()
+
+        assert token_server.disconnected.wait(2.0)
+        assert langflow.cancellation_stats()['cancelled'] == 1
+        assert langflow.cancellation_stats()['models'] == {'flow': 1}
+
+    def test_finished_not_counted(self, token_server):
+        """ Closing a stream after its last chunk is not a cancellation """
+        token_server.tokens = 2
+        langflow = self._langflow()
+        stream = self._stream(langflow, token_server)
+
+        chunks = list(stream)
+        stream.close()
+
+        assert chunks[-1]['is_finished']
+        assert langflow.cancellation_stats()['cancelled'] == 0
+
+    def test_async_disconnect_closes_run(self, token_server):
+        """ Closing an async stream early disconnects from LangFlow and counts the cancelled run """
+        langflow = self._langflow()
+        langflow._aget_history_component_id = AsyncMock(return_value='ChatHistory-1')
+        base_url = f'http://127.0.0.1:{token_server.server_address[1]}'
+
+        async def run():
+            stream = langflow.astreaming('flow', MESSAGES, base_url, {}, None, print, None, 'key', None, {})
+            chunk = await stream.__anext__()
+            await stream.aclose()
+            await langflow.clients.aclose(sync_clients=False)
+            return chunk
+
+        assert asyncio.run(run())['text'] == 'word '
+        assert token_server.disconnected.wait(2.0)
+        assert langflow.cancellation_stats()['cancelled'] == 1
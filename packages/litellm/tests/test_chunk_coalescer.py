@@ -0,0 +1,112 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+from litellm.types.utils import GenericStreamingChunk
+
+os.environ['HELPER_BACKEND'] = 'test'
+
+from custom.chunk_coalescer import acoalesce_chunks, coalesce_chunks  # noqa: E402
+from custom.langflow_handler import Langflow, _get_setting  # noqa: E402
+
+
+def _chunk(text: str, finished: bool = False) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text=text, is_finished=finished, finish_reason='stop' if finished else '', usage=None, index=0, tool_use=None
+    )
+
+
+class TestCoalesceChunks:
+    def test_first_chunk_immediate(self):
+        """ The first text chunk is passed through as is """
+        stream = coalesce_chunks(iter([_chunk('H'), _chunk('e')]), 10, 1.0)
+
+        assert next(stream)['text'] == 'H'
+
+    def test_size_threshold(self):
+        """ Text is merged until the size threshold is reached """
+        chunks = [_chunk(c) for c in 'Hello world'] + [_chunk('', finished=True)]
+
+        result = list(coalesce_chunks(iter(chunks), 4, 60.0))
+
+        assert [chunk['text'] for chunk in result] == ['H', 'ello', ' wor', 'ld']
+        assert result[-1]['is_finished']
+
+    def test_deadline(self):
+        """ Buffered text is flushed once it is older than the max delay """
+        chunks = [_chunk('a'), _chunk('b'), _chunk('c'), _chunk('d')]
+
+        with patch('custom.chunk_coalescer.time.monotonic', side_effect=[0.0, 0.01, 0.05]):
+            result = list(coalesce_chunks(iter(chunks), 100, 0.03))
+
+        assert [chunk['text'] for chunk in result] == ['a', 'bcd']
+
+    def test_empty_chunks_dropped(self):
+        """ Empty keep-alive chunks do not reach the consumer """
+        chunks = [_chunk(''), _chunk('a'), _chunk(''), _chunk('b')]
+
+        assert [chunk['text'] for chunk in coalesce_chunks(iter(chunks), 100, 1.0)] == ['a', 'b']
+
+
+class TestAsyncCoalesceChunks:
+    def test_deadline_flush_while_waiting(self):
+        """ Buffered text is flushed at the deadline even when upstream is slow """
+        async def upstream():
+            yield _chunk('a')
+            yield _chunk('b')
+            await asyncio.sleep(0.2)
+            yield _chunk('c', finished=True)
+
+        async def collect():
+            loop = asyncio.get_running_loop()
+            result = []
+            async for chunk in acoalesce_chunks(upstream(), 100, 0.02):
+                result.append((chunk['text'], loop.time()))
+            return result
+
+        result = asyncio.run(collect())
+
+        assert [text for text, _ in result] == ['a', 'b', 'c']
+        # b was flushed well before the final chunk arrived
+        assert result[2][1] - result[1][1] > 0.1
+
+
+class TestLangflowCoalescing:
+    def test_astreaming_flushes_on_timer(self):
+        """ The async stream LiteLLM reads flushes buffered text at the deadline while LangFlow is silent """
+        langflow = Langflow()
+
+        async def run_stream(*args):
+            yield _chunk('Office')
+            yield _chunk(' hours')
+            await asyncio.sleep(0.3)
+            yield _chunk('', finished=True)
+
+        langflow._amake_run_streaming = run_stream
+        params = {'stream_coalesce_chars': 100, 'stream_coalesce_ms': 20}
+
+        async def collect():
+            loop = asyncio.get_running_loop()
+            stream = langflow.astreaming('flow', [], 'http://langflow', {}, None, print, None, 'key', None, params)
+            return [(chunk['text'], loop.time()) async for chunk in stream]
+
+        result = asyncio.run(collect())
+
+        assert [text for text, _ in result] == ['Office', ' hours', '']
+        assert result[2][1] - result[1][1] > 0.2
+
+
+class TestSettings:
+    def test_optional_params_first(self, monkeypatch):
+        """ Per model settings take priority over the environment """
+        monkeypatch.setenv('LANGFLOW_STREAM_COALESCE_CHARS', '8')
+
+        assert _get_setting({'stream_coalesce_chars': 16}, 'stream_coalesce_chars', 0) == 16
+        assert _get_setting({}, 'stream_coalesce_chars', 0) == 8
+        assert _get_setting(None, 'missing_setting', 3.5) == 3.5
+
+    def test_bool_parsing(self, monkeypatch):
+        """ Boolean settings from the environment are parsed """
+        monkeypatch.setenv('LANGFLOW_SOME_FLAG', 'false')
+
+        assert _get_setting(None, 'some_flag', True) is False
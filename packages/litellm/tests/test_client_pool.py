@@ -0,0 +1,195 @@
+import asyncio
+import gc
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import custom.client_pool
+from custom.client_pool import LangflowClientPool
+
+
+class _SlowStreamHandler(BaseHTTPRequestHandler):
+    """ Streams a response slowly enough that concurrent requests overlap """
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'o')
+        self.wfile.flush()
+        self.server.release.wait(5)
+        self.wfile.write(b'k')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SlowStreamHandler)
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+
+
+class TestLangflowClientPool:
+    def test_client_reused(self):
+        """ The same client is returned for the same base URL """
+        pool = LangflowClientPool()
+
+        assert pool.get_client('http://a') is pool.get_client('http://a')
+        assert pool.get_client('http://a') is not pool.get_client('http://b')
+
+        pool.close()
+
+    def test_limits_applied(self):
+        """ Configured limits are used for the connection pool """
+        pool = LangflowClientPool(max_connections=7, max_keepalive_connections=3, keepalive_expiry=5)
+        client = pool.get_client('http://a')
+
+        connection_pool = client._transport._pool
+        assert connection_pool._max_connections == 7
+        assert connection_pool._max_keepalive_connections == 3
+        assert connection_pool._keepalive_expiry == 5
+
+        pool.close()
+
+    def test_close(self):
+        """ Closing the pool closes the clients and new ones are made afterwards """
+        pool = LangflowClientPool()
+        client = pool.get_client('http://a')
+
+        pool.close()
+
+        assert client.is_closed
+        assert pool.get_client('http://a') is not client
+        pool.close()
+
+    def test_handler_does_not_close_client(self):
+        """ Dropping a LiteLLM handler leaves the pooled client open """
+        pool = LangflowClientPool()
+        handler = pool.get_handler('http://a')
+        client = handler.client
+
+        handler.close()
+        del handler
+        gc.collect()
+
+        assert not client.is_closed
+        pool.close()
+
+    def test_async_client_per_loop(self):
+        """ Async clients are reused within a loop and recreated for a new loop """
+        pool = LangflowClientPool()
+
+        async def get_twice():
+            first = pool.get_async_client('http://a')
+            second = pool.get_async_client('http://a')
+            return first, second
+
+        first, second = asyncio.run(get_twice())
+        third, _ = asyncio.run(get_twice())
+
+        assert first is second
+        assert third is not first
+
+    def test_async_clients_of_concurrent_loops(self):
+        """ Loops running at the same time on different threads keep their own clients """
+        pool = LangflowClientPool()
+        other = {}
+
+        def other_loop():
+            async def get():
+                other['client'] = pool.get_async_client('http://a')
+                await pool.aclose(sync_clients=False)
+
+            asyncio.run(get())
+
+        async def run():
+            first = pool.get_async_client('http://a')
+            thread = threading.Thread(target=other_loop)
+            thread.start()
+            thread.join()
+            return first, pool.get_async_client('http://a')
+
+        first, second = asyncio.run(run())
+
+        assert first is second
+        assert other['client'] is not first
+        assert other['client'].is_closed
+        assert not first.is_closed
+
+    def test_aclose(self):
+        """ Async clients are closed from their loop """
+        pool = LangflowClientPool()
+
+        async def run():
+            client = pool.get_async_client('http://a')
+            await pool.aclose()
+            return client
+
+        assert asyncio.run(run()).is_closed
+
+    def test_http2_opt_in(self, monkeypatch):
+        """ HTTP/2 is only enabled for the configured base URLs """
+        monkeypatch.setattr(custom.client_pool, 'HTTP2_AVAILABLE', True)
+        pool = LangflowClientPool(http2_bases=['http://a/'])
+
+        assert pool.uses_http2('http://a')
+        assert not pool.uses_http2('http://b')
+        assert LangflowClientPool(http2_bases=['*']).uses_http2('http://b')
+
+    def test_http2_missing_dependency(self, monkeypatch):
+        """ Requesting HTTP/2 without h2 installed is an error """
+        monkeypatch.setattr(custom.client_pool, 'HTTP2_AVAILABLE', False)
+
+        with pytest.raises(ImportError):
+            LangflowClientPool(http2_bases=['*'])
+        LangflowClientPool().close()
+
+    def test_connection_stats(self, slow_server):
+        """ In-flight streams are reported against the connection carrying them """
+        pool = LangflowClientPool()
+        base_url = f'http://127.0.0.1:{slow_server.server_address[1]}'
+        client = pool.get_client(base_url)
+
+        first = client.send(client.build_request('GET', base_url), stream=True)
+        second = client.send(client.build_request('GET', base_url), stream=True)
+
+        stats = pool.connection_stats()[base_url]
+        assert len(stats) == 2
+        assert all(connection['streams'] == 1 for connection in stats)
+        assert all(connection['http_version'] == 'HTTP/1.1' for connection in stats)
+
+        slow_server.release.set()
+        first.read()
+        second.read()
+        first.close()
+        second.close()
+
+        assert all(connection['streams'] == 0 for connection in pool.connection_stats()[base_url])
+        pool.close()
+
+    def test_connection_stats_internals(self, slow_server, monkeypatch):
+        """ Connection stats degrade instead of failing when the pool internals change """
+        pool = LangflowClientPool()
+        base_url = f'http://127.0.0.1:{slow_server.server_address[1]}'
+        client = pool.get_client(base_url)
+        response = client.send(client.build_request('GET', base_url), stream=True)
+
+        monkeypatch.setattr(client._transport._pool, '_requests', None)
+        stats = pool.connection_stats()[base_url]
+        assert len(stats) == 1
+        assert stats[0]['streams'] is None
+
+        monkeypatch.delattr(client._transport, '_pool')
+        assert pool.connection_stats() == {base_url: []}
+
+        monkeypatch.undo()
+        slow_server.release.set()
+        response.read()
+        response.close()
+        pool.close()
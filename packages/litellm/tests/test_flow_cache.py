@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+os.environ['HELPER_BACKEND'] = 'test'
+
+from custom.flow_cache import FlowMetadata, FlowMetadataCache  # noqa: E402
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+class TestFlowMetadataCache:
+    def test_fresh_entry_reused(self):
+        """ Fresh entries are returned without calling fetch again """
+        cache = FlowMetadataCache(ttl=60)
+        fetch = MagicMock(return_value=FlowMetadata('CompletionInterface-1'))
+
+        first = cache.get(('base', 'flow'), fetch)
+        second = cache.get(('base', 'flow'), fetch)
+
+        assert first.history_component == 'CompletionInterface-1'
+        assert second is first
+        fetch.assert_called_once_with(None)
+
+    def test_expired_entry_revalidated(self):
+        """ Expired entries are passed to fetch for revalidation """
+        cache = FlowMetadataCache(ttl=60)
+        stale = cache.get(('base', 'flow'), lambda cached: FlowMetadata('A', etag='"1"'))
+        stale.expires_at = time.monotonic() - 1
+
+        fetch = MagicMock(side_effect=lambda cached: cached)
+        result = cache.get(('base', 'flow'), fetch)
+
+        fetch.assert_called_once_with(stale)
+        assert result.expires_at > time.monotonic()
+
+    def test_lru_eviction(self):
+        """ Least recently used entry is dropped once the cache is full """
+        cache = FlowMetadataCache(ttl=60, max_entries=2)
+        cache.get('a', lambda cached: FlowMetadata('a'))
+        cache.get('b', lambda cached: FlowMetadata('b'))
+
+        # Touch a so b becomes the oldest
+        cache.get('a', lambda cached: FlowMetadata('unused'))
+        cache.get('c', lambda cached: FlowMetadata('c'))
+
+        assert len(cache) == 2
+        fetch = MagicMock(return_value=FlowMetadata('b2'))
+        assert cache.get('b', fetch).history_component == 'b2'
+        fetch.assert_called_once()
+
+    def test_single_flight(self):
+        """ Concurrent misses on the same key make a single fetch """
+        cache = FlowMetadataCache(ttl=60)
+        calls = []
+        release = threading.Event()
+
+        def fetch(cached):
+            calls.append(cached)
+            release.wait(5)
+            return FlowMetadata('shared')
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get('key', fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert [result.history_component for result in results] == ['shared'] * 5
+
+    def test_async_single_flight(self):
+        """ Concurrent async misses on the same key make a single fetch """
+        cache = FlowMetadataCache(ttl=60)
+        calls = []
+
+        async def fetch(cached):
+            calls.append(cached)
+            await asyncio.sleep(0.01)
+            return FlowMetadata('shared')
+
+        async def run():
+            return await asyncio.gather(*[cache.aget('key', fetch) for _ in range(5)])
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(result.history_component == 'shared' for result in results)
+
+    def test_async_loops_fetch_separately(self):
+        """ Misses on loops of different threads do not wait on each other's futures """
+        cache = FlowMetadataCache(ttl=60)
+        started = threading.Barrier(2)
+        results = []
+        errors = []
+
+        async def fetch(cached):
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            return FlowMetadata('shared')
+
+        def run():
+            try:
+                results.append(asyncio.run(cache.aget('key', fetch)))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert [result.history_component for result in results] == ['shared'] * 2
+
+
+class TestHistoryComponentCaching:
+    def _flow_response(self, status_code=200, etag='"v1"', updated_at='2025-01-01'):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = {'etag': etag}
+        response.json.return_value = {
+            'updated_at': updated_at,
+            'data': {'nodes': [{'data': {'type': 'CompletionInterface', 'id': 'CompletionInterface-abc'}}]},
+        }
+        return response
+
+    def test_lookup_cached(self):
+        """ The flow document is only fetched once for repeated lookups """
+        handler = Langflow()
+        client = MagicMock()
+        client.client.get.return_value = self._flow_response()
+
+        for _ in range(3):
+            history = handler._get_history_component_id('flow', 'http://base', client, 'key')
+
+        assert history == 'CompletionInterface-abc'
+        client.client.get.assert_called_once()
+
+    def test_not_modified_revalidation(self):
+        """ A 304 response keeps the previously parsed metadata """
+        handler = Langflow()
+        client = MagicMock()
+        client.client.get.return_value = self._flow_response()
+        handler._get_history_component_id('flow', 'http://base', client, 'key')
+
+        # Expire the entry and have LangFlow answer with not modified
+        handler.flow_cache._entries[('http://base', 'flow')].expires_at = 0
+        client.client.get.return_value = self._flow_response(status_code=304)
+
+        history = handler._get_history_component_id('flow', 'http://base', client, 'key')
+
+        assert history == 'CompletionInterface-abc'
+        assert client.client.get.call_args.kwargs['headers']['If-None-Match'] == '"v1"'
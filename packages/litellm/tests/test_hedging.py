@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from custom.hedging import HedgePolicy, Hedger, LatencyWindow
+
+
+POLICY = HedgePolicy(delay=0.05)
+
+
+def _attempts(*delays):
+    """ Attempts that take the given time and return their index """
+    calls = []
+
+    async def attempt():
+        index = len(calls)
+        calls.append(index)
+        await asyncio.sleep(delays[index])
+        return index
+
+    return attempt, calls
+
+
+class TestDeadline:
+    def test_percentile(self):
+        """ The deadline is the configured delay until enough latencies are seen """
+        hedger = Hedger()
+        policy = HedgePolicy(delay=2.0, min_samples=20)
+        for index in range(19):
+            hedger.latencies('flow').record(index / 100)
+        assert hedger.deadline('flow', policy) == 2.0
+
+        hedger.latencies('flow').record(0.19)
+        assert hedger.deadline('flow', policy) == 0.19
+
+    def test_window(self):
+        """ Only recent latencies are kept """
+        latencies = LatencyWindow(size=10)
+        for index in range(100):
+            latencies.record(index)
+
+        assert len(latencies) == 10
+        assert latencies.percentile(0.0) == 90
+
+
+class TestHedgedCall:
+    def test_fast_not_hedged(self):
+        """ Attempts finishing before the deadline are not hedged """
+        hedger = Hedger()
+        attempt, calls = _attempts(0.0)
+
+        assert hedger.call('flow', POLICY, attempt) == 0
+        assert calls == [0]
+        assert hedger.hedged == 0
+
+    def test_slow_hedged(self):
+        """ A second attempt is sent past the deadline and the first to finish wins """
+        hedger = Hedger()
+        attempt, calls = _attempts(1.0, 0.0)
+
+        started = time.monotonic()
+        assert hedger.call('flow', POLICY, attempt) == 1
+        assert time.monotonic() - started < 0.5
+        assert hedger.hedged == 1
+
+    def test_failed_attempt(self):
+        """ A failing attempt loses to one that succeeds """
+        hedger = Hedger()
+        calls = []
+
+        async def attempt():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(0.1)
+                raise ValueError('stuck run failed')
+            await asyncio.sleep(0.2)
+            return 'answer'
+
+        assert hedger.call('flow', POLICY, attempt) == 'answer'
+
+    def test_sync_loser_cancelled(self):
+        """ Sync callers run the first attempt on their own thread and the loser is cancelled """
+        hedger = Hedger()
+        threads = []
+        cancelled = []
+        cleaned = []
+
+        async def attempt():
+            index = len(cancelled)
+            threads.append(threading.get_ident())
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+            except asyncio.CancelledError:
+                cancelled[index] = True
+                raise
+            return index
+
+        async def cleanup():
+            cleaned.append(True)
+
+        assert hedger.call('flow', POLICY, attempt, cleanup) == 1
+        assert cancelled == [True, False]
+        assert threads == [threading.get_ident()] * 2
+        assert cleaned == [True]
+
+    def test_budget(self):
+        """ Past the burst, only the budgeted fraction of runs is hedged """
+        hedger = Hedger()
+        policy = HedgePolicy(delay=0.0, min_samples=100, budget=0.25, burst=1.0)
+
+        async def attempt():
+            await asyncio.sleep(0.005)
+            return 'answer'
+
+        async def run():
+            for _ in range(21):
+                await hedger.acall('flow', policy, attempt)
+
+        asyncio.run(run())
+        assert hedger.stats() == {'hedged': 6, 'throttled': 15}
+
+    def test_async_loser_cancelled(self):
+        """ The losing async attempt is cancelled """
+        hedger = Hedger()
+        cancelled = []
+
+        async def attempt():
+            index = len(cancelled)
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+            except asyncio.CancelledError:
+                cancelled[index] = True
+                raise
+            return index
+
+        assert asyncio.run(hedger.acall('flow', POLICY, attempt)) == 1
+        assert cancelled == [True, False]
+
+
+class TestHedgedStream:
+    def test_stream_hedged(self):
+        """ A stream without a first byte by the deadline is raced, the loser is closed """
+        hedger = Hedger()
+        closed = []
+
+        async def start():
+            index = len(closed)
+            closed.append(False)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+                yield f'{index}-a'
+                yield f'{index}-b'
+            finally:
+                closed[index] = True
+
+        started = time.monotonic()
+        assert list(hedger.stream('flow', POLICY, start)) == ['1-a', '1-b']
+        assert time.monotonic() - started < 0.5
+        assert closed == [True, True]
+
+    def test_stream_error(self):
+        """ Errors before the first chunk are raised """
+        hedger = Hedger()
+
+        async def start():
+            raise ValueError('unreachable')
+            yield
+
+        with pytest.raises(ValueError):
+            list(hedger.stream('flow', POLICY, start))
+
+    def test_async_stream_hedged(self):
+        """ A slow async stream is raced and the loser is cancelled and closed """
+        hedger = Hedger()
+        closed = []
+
+        async def start():
+            index = len(closed)
+            closed.append(False)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+                yield f'{index}-a'
+                yield f'{index}-b'
+            finally:
+                closed[index] = True
+
+        async def run():
+            return [chunk async for chunk in hedger.astream('flow', POLICY, start)]
+
+        assert asyncio.run(run()) == ['1-a', '1-b']
+        assert closed == [True, True]
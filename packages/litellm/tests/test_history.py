@@ -0,0 +1,78 @@
+import os
+
+os.environ['HELPER_BACKEND'] = 'test'
+
+from custom.history import HistoryPolicy, compact_history  # noqa: E402
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+def _count_words(text: str) -> int:
+    return len(text.split())
+
+
+def _conversation(turns: int) -> list:
+    messages = [{'role': 'system', 'content': 'you are a tutor'}]
+    for turn in range(turns):
+        messages.append({'role': 'user', 'content': f'question number {turn}'})
+        messages.append({'role': 'assistant', 'content': f'answer number {turn}'})
+    return messages
+
+
+class TestCompactHistory:
+    def test_unlimited(self):
+        """ No budget leaves the history untouched """
+        history = _conversation(10)
+
+        assert compact_history(history, {'content': 'hi'}, HistoryPolicy(), _count_words) is history
+
+    def test_within_budget(self):
+        """ History that fits is not changed """
+        history = _conversation(2)
+        policy = HistoryPolicy(max_tokens=100)
+
+        assert compact_history(history, {'content': 'hi'}, policy, _count_words) is history
+
+    def test_keeps_system_and_recent_turns(self):
+        """ Oldest middle turns are elided first """
+        history = _conversation(5)
+        policy = HistoryPolicy(max_tokens=20, keep_turns=2)
+
+        compacted = compact_history(history, {'content': 'next'}, policy, _count_words)
+
+        assert compacted[0] == history[0]
+        assert compacted[1] == {'role': 'system', 'content': '[6 earlier messages omitted]'}
+        assert compacted[2:] == history[-4:]
+
+    def test_fills_budget_with_older_turns(self):
+        """ Older turns are added back newest first while they fit """
+        history = _conversation(5)
+        policy = HistoryPolicy(max_tokens=26, keep_turns=1, elide=False)
+
+        compacted = compact_history(history, {'content': 'next'}, policy, _count_words)
+
+        # system (4) + input (1) + three turns of 6 words each
+        assert compacted == [history[0]] + history[-6:]
+
+    def test_mandatory_messages_exceed_budget(self):
+        """ System and recent turns are kept even when over budget """
+        history = _conversation(3)
+        policy = HistoryPolicy(max_tokens=1, keep_turns=3)
+
+        assert compact_history(history, {'content': 'next'}, policy, _count_words) is history
+
+
+class TestRequestBodyHistory:
+    def test_history_policy_applied(self):
+        """ The per-model history policy is applied to the request tweaks """
+        handler = Langflow()
+        messages = _conversation(20) + [{'role': 'user', 'content': 'latest question'}]
+
+        body = handler._make_request_body(
+            messages, 'CompletionInterface-1', 'gpt-4o', {'history_max_tokens': 40, 'history_keep_turns': 2}
+        )
+
+        history = body['tweaks']['CompletionInterface-1']['messages']['content']
+        assert body['input_value'] == 'latest question'
+        assert history[0] == messages[0]
+        assert history[-4:] == messages[-5:-1]
+        assert len(history) < len(messages) - 1
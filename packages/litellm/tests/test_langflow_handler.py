@@ -23,21 +23,24 @@ class HttpxResponseStreamMock:
     """
     Helper that mocks the streaming functionality
     of httpx.Response where the content is read in
-    from a file. The file should have line-by-line a
-    response payload
+    from a file. The raw bytes of the file are returned
+    in fixed size pieces so events are split across reads
     """
-    def __init__(self, file_location: Path):
-        self.file = open(file_location, 'r')
+    def __init__(self, file_location: Path, read_size: int = 97):
+        self.file = open(file_location, 'rb')
+        self.read_size = read_size
 
     def __iter__(self):
         return self
 
-    def __next__(self) -> str:
+    def __next__(self) -> bytes:
         """
-        Get the next line ignoring empty lines
+        Get the next piece of the raw stream
         """
-        while (content := next(self.file).strip()) == '':
-            pass
+        content = self.file.read(self.read_size)
+        if not content:
+            self.file.close()
+            raise StopIteration
         return content
 
 
@@ -115,6 +118,45 @@ class TestAgenticParsing:
         assert chunk['text'] == 'TEST'
         assert chunk['is_finished']
 
+    def test_partial_messages(self):
+        """ Partial messages stream the new text and the end payload only the rest """
+        parser = LangflowChunkParser(MagicMock(), True)
+
+        def message(text, state='partial', sender='Machine'):
+            return json.dumps({'event': 'add_message', 'data': {'sender': sender, 'text': text, 'properties': {'state': state}}})
+
+        assert parser._parse_chunck(message('hi', state='complete', sender='User'))['text'] == ''
+        assert parser._parse_chunck(message('TE'))['text'] == 'TE'
+        assert parser._parse_chunck(message('TE'))['text'] == ''
+        assert parser._parse_chunck(message('TES'))['text'] == 'S'
+        assert parser._parse_chunck(message('other'))['text'] == ''
+        assert parser._parse_chunck(message('TEST', state='complete'))['text'] == ''
+
+        chunk = parser._parse_agentic_end(_load_test_json('valid_agentic_end.json'))
+
+        assert chunk['text'] == 'T'
+        assert chunk['is_finished']
+
+    def test_diverging_agentic_end(self):
+        """ An end payload with nothing in common with the streamed text is sent as is """
+        parser = LangflowChunkParser(MagicMock(), True)
+        parser.sent = 'Searching'
+
+        chunk = parser._parse_agentic_end(_load_test_json('valid_agentic_end.json'))
+
+        assert chunk['text'] == 'TEST'
+        assert chunk['is_finished']
+
+    def test_partly_diverging_agentic_end(self):
+        """ Only the end payload's text after the part it shares with the streamed text is sent """
+        parser = LangflowChunkParser(MagicMock(), True)
+        parser.sent = 'TEXT'
+
+        chunk = parser._parse_agentic_end(_load_test_json('valid_agentic_end.json'))
+
+        assert chunk['text'] == 'ST'
+        assert chunk['is_finished']
+
 
 class TestParseChunk:
     def test_invalid_json(self):
@@ -156,7 +198,7 @@ class TestStandard:
         # Make the test streamer
         file_stream = HttpxResponseStreamMock(_get_test_file_loc('standard_chunks.txt'))
         streamer_mock = MagicMock()
-        streamer_mock.iter_lines.return_value = file_stream
+        streamer_mock.iter_bytes.return_value = file_stream
 
         # Make unit under test
         parser = LangflowChunkParser(streamer_mock, True)
@@ -179,7 +221,7 @@ class TestAgentic:
         # Make the test streamer
         file_stream = HttpxResponseStreamMock(_get_test_file_loc('agent_chunks.txt'))
         streamer_mock = MagicMock()
-        streamer_mock.iter_lines.return_value = file_stream
+        streamer_mock.iter_bytes.return_value = file_stream
 
         # Make unit under test
         parser = LangflowChunkParser(streamer_mock, True)
@@ -189,9 +231,12 @@ class TestAgentic:
             expected_message = expected_output_file.read()
 
         # Pull in the full message
-        full_message = ''
-        for chunk in parser:
-            full_message += chunk['text']
+        chunks = list(parser)
+        full_message = ''.join(chunk['text'] for chunk in chunks)
 
         # Make sure the message matches
         assert full_message.strip() == expected_message.strip()
+
+        # The answer is streamed as the agent writes it, not in the end payload
+        assert len([chunk for chunk in chunks if chunk['text']]) > 100
+        assert len(chunks[-1]['text']) < 10
@@ -0,0 +1,197 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from custom.load_balancer import LangflowLoadBalancer, is_backend_failure
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import BaseLLMException, Langflow  # noqa: E402
+
+
+BASES = ['http://a', 'http://b']
+
+
+def _balancer() -> LangflowLoadBalancer:
+    return LangflowLoadBalancer(probe_interval=0)
+
+
+class TestRouting:
+    def test_least_outstanding(self):
+        """ Runs go to the replica with the fewest in-flight runs """
+        balancer = _balancer()
+
+        with balancer.track('http://a'):
+            assert balancer.choose(BASES) == 'http://b'
+            with balancer.track('http://b'), balancer.track('http://b'):
+                assert balancer.choose(BASES) == 'http://a'
+
+    def test_unhealthy_skipped(self):
+        """ Failed replicas are out of rotation until every replica is down """
+        balancer = _balancer()
+
+        balancer.mark_failure('http://a')
+        assert {balancer.choose(BASES) for _ in range(4)} == {'http://b'}
+
+        balancer.mark_failure('http://b')
+        assert {balancer.choose(BASES) for _ in range(4)} == set(BASES)
+
+    def test_backend_failure(self):
+        """ Only errors reaching the replica are retried elsewhere """
+        try:
+            try:
+                raise httpx.ConnectError('refused')
+            except Exception as e:
+                raise BaseLLMException(500, message=str(e))
+        except BaseLLMException as e:
+            wrapped = e
+
+        assert is_backend_failure(wrapped)
+        assert is_backend_failure(BaseLLMException(503, message='unavailable'))
+        assert not is_backend_failure(BaseLLMException(500, message='flow error'))
+
+
+class TestFallback:
+    def test_call_fallback(self):
+        """ A run that cannot reach its replica is sent to the rest of the pool """
+        balancer = _balancer()
+        attempts = []
+
+        def run(base_url):
+            attempts.append(base_url)
+            if len(attempts) == 1:
+                raise httpx.ConnectError('refused')
+            return base_url
+
+        assert balancer.call(BASES, run) == attempts[1]
+        assert attempts[0] != attempts[1]
+        assert not balancer.stats()[attempts[0]]['healthy']
+        assert all(stats['in_flight'] == 0 for stats in balancer.stats().values())
+
+    def test_call_exhausted(self):
+        """ The error is raised once every replica has been tried """
+        balancer = _balancer()
+
+        def run(base_url):
+            raise httpx.ConnectError('refused')
+
+        with pytest.raises(httpx.ConnectError):
+            balancer.call(BASES, run)
+
+    def test_request_error_not_retried(self):
+        """ Errors caused by the request itself are raised directly """
+        balancer = _balancer()
+        attempts = []
+
+        def run(base_url):
+            attempts.append(base_url)
+            raise BaseLLMException(400, message='bad request')
+
+        with pytest.raises(BaseLLMException):
+            balancer.call(BASES, run)
+        assert len(attempts) == 1
+
+    def test_stream_fallback(self):
+        """ Streams only fall back before their first chunk """
+        balancer = _balancer()
+
+        def start(base_url):
+            if base_url == 'http://a':
+                raise httpx.ConnectError('refused')
+            yield base_url
+            raise httpx.ReadError('reset')
+
+        balancer.mark_failure('http://b')
+        stream = balancer.stream(BASES, start)
+        assert next(stream) == 'http://b'
+        with pytest.raises(httpx.ReadError):
+            next(stream)
+
+    def test_async_stream_fallback(self):
+        """ Async streams fall back to another replica before their first chunk """
+        balancer = _balancer()
+
+        async def start(base_url):
+            if base_url == 'http://a':
+                raise httpx.ConnectError('refused')
+            yield base_url
+
+        async def run():
+            return [chunk async for chunk in balancer.astream(BASES, start)]
+
+        balancer.mark_failure('http://b')
+        assert asyncio.run(run()) == ['http://b']
+
+
+class TestProbe:
+    def test_probe(self):
+        """ Health probes take failing replicas out and put recovered ones back """
+        balancer = _balancer()
+        balancer.choose(BASES)
+        healthy = {'a': False, 'b': True}
+
+        def handler(request):
+            return httpx.Response(200 if healthy[request.url.host] else 503)
+
+        client = httpx.Client
+        with patch('custom.load_balancer.httpx.Client', lambda **kwargs: client(transport=httpx.MockTransport(handler))):
+            balancer.probe()
+            assert not balancer.stats()['http://a']['healthy']
+
+            healthy['a'] = True
+            balancer.probe()
+            assert balancer.stats()['http://a']['healthy']
+
+    def test_failed_probe_cooldown(self):
+        """ A replica taken out by a failed probe comes back once the cooldown passes """
+        balancer = LangflowLoadBalancer(probe_interval=0, cooldown=30)
+        balancer.choose(BASES)
+
+        client = httpx.Client
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        with patch('custom.load_balancer.httpx.Client', lambda **kwargs: client(transport=transport)):
+            with patch('custom.load_balancer.time.monotonic', return_value=100.0):
+                balancer.probe()
+                assert not balancer.stats()['http://a']['healthy']
+
+        with patch('custom.load_balancer.time.monotonic', return_value=131.0):
+            assert balancer.stats()['http://a']['healthy']
+
+
+class TestApiBases:
+    def test_api_bases(self):
+        """ Replicas are read from the model settings, defaulting to the api base """
+        langflow = Langflow()
+
+        assert langflow._get_api_bases('http://x', {}) == ['http://x']
+        assert langflow._get_api_bases('http://x', {'api_bases': 'http://a/, http://b'}) == BASES
+        assert langflow._get_api_bases('http://x', {'api_bases': BASES}) == BASES
+
+
+class TestCircuitBreaker:
+    def test_open_fails_fast(self):
+        """ Replicas failing repeatedly are not tried until their circuit resets """
+        balancer = LangflowLoadBalancer(probe_interval=0, circuit_failures=2, circuit_reset=30)
+        balancer.mark_failure('http://a')
+        balancer.mark_failure('http://a')
+
+        with pytest.raises(BaseLLMException) as error:
+            balancer.choose(['http://a'])
+        assert error.value.status_code == 503
+        assert error.value.headers['retry-after'] == '30'
+        assert balancer.choose(BASES) == 'http://b'
+
+    def test_half_open_trial(self):
+        """ After the reset a single trial run decides whether the circuit closes """
+        balancer = LangflowLoadBalancer(probe_interval=0, circuit_failures=1, circuit_reset=0)
+        balancer.mark_failure('http://a')
+
+        assert balancer.choose(['http://a']) == 'http://a'
+        with pytest.raises(BaseLLMException):
+            balancer.choose(['http://a'])
+
+        balancer.mark_success('http://a')
+        assert balancer.stats()['http://a']['circuit'] == 'closed'
+        assert balancer.choose(['http://a']) == 'http://a'
@@ -0,0 +1,120 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from custom.model_mapping import FlowMapping, ModelMapping, apply_mapping, parse_mapping
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+Client = httpx.Client
+
+
+class MappingService:
+    """ Serves the mapping with an ETag, counting requests """
+
+    def __init__(self, payload, etag='"v1"'):
+        self.payload = payload
+        self.etag = etag
+        self.requests = []
+        self.down = False
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.down:
+            return httpx.Response(503)
+        if request.headers.get('if-none-match') == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.payload, headers={'etag': self.etag})
+
+    def client(self, timeout):
+        return Client(transport=httpx.MockTransport(self), timeout=timeout)
+
+
+class TestParseMapping:
+    def test_formats(self):
+        """ Flow ids, entries with settings and lists of entries are understood """
+        expected = {
+            'tutor': FlowMapping('flow-1'),
+            'faq': FlowMapping('flow-2', {'response_cache': True}),
+        }
+
+        assert parse_mapping({'tutor': 'flow-1', 'faq': {'flow_id': 'flow-2', 'settings': {'response_cache': True}}}) == expected
+        assert parse_mapping({'mapping': [
+            {'model': 'tutor', 'flow_id': 'flow-1'},
+            {'model': 'faq', 'flow_id': 'flow-2', 'settings': {'response_cache': True}},
+        ]}) == expected
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_mapping('flow-1')
+
+
+class TestModelMapping:
+    def test_refresh(self):
+        """ Refreshes revalidate with the ETag and keep the table when the service is down """
+        service = MappingService({'tutor': 'flow-1'})
+        mapping = ModelMapping('http://helper/mapping')
+
+        with patch('custom.model_mapping.httpx.Client', service.client):
+            assert mapping.refresh()
+            assert not mapping.refresh()
+            service.down = True
+            with pytest.raises(httpx.HTTPStatusError):
+                mapping.refresh()
+
+        assert service.requests[1].headers['if-none-match'] == '"v1"'
+        assert mapping.resolve('tutor') == FlowMapping('flow-1')
+        assert mapping.resolve('flow-1') is None
+
+    def test_background(self):
+        """ The table is loaded in the background and reloaded when notified """
+        service = MappingService({'tutor': 'flow-1'})
+        mapping = ModelMapping('http://helper/mapping', refresh_interval=60)
+
+        with patch('custom.model_mapping.httpx.Client', service.client):
+            mapping.start()
+            self._wait(lambda: mapping.refreshes == 1)
+            service.payload, service.etag = {'tutor': 'flow-2'}, '"v2"'
+            mapping.notify()
+            self._wait(lambda: mapping.refreshes == 2)
+            mapping.close()
+
+        assert mapping.resolve('tutor') == FlowMapping('flow-2')
+        assert mapping.stats()['models'] == 1
+
+    def _wait(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    def test_apply(self):
+        """ Mapped models run their flow with the model's settings over the mapping's """
+        mapping = ModelMapping('http://helper/mapping')
+        mapping._table = {'faq': FlowMapping('flow-2', {'response_cache': True, 'hedge': True})}
+
+        assert apply_mapping(mapping, 'faq', {'hedge': False}) == (
+            'flow-2', {'response_cache': True, 'hedge': False}
+        )
+        assert apply_mapping(mapping, 'flow-1', {'hedge': False}) == ('flow-1', {'hedge': False})
+        assert apply_mapping(None, 'faq', None) == ('faq', None)
+
+
+class TestLangflowMapping:
+    def test_completion(self):
+        """ Completions of a mapped model run its flow """
+        langflow = Langflow()
+        langflow.model_mapping = ModelMapping('http://helper/mapping')
+        langflow.model_mapping._table = {'tutor': FlowMapping('flow-1', {'history_keep_turns': 2})}
+        langflow._make_completion = MagicMock(return_value=MagicMock())
+
+        langflow.completion('tutor', [], 'http://langflow', {}, None, print, None, 'key', None, {})
+
+        args = langflow._make_completion.call_args.args
+        assert args[0] == 'flow-1'
+        assert args[6] == {'history_keep_turns': 2}
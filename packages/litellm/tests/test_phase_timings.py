@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+from custom.phase_timings import RequestTimings
+from custom.timeouts import RunTimeouts
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+MESSAGES = [{'role': 'user', 'content': 'When are office hours?'}]
+
+
+class FakeSpan:
+    def __init__(self, spans, name, context, start_time, attributes):
+        self.name = name
+        self.context = context
+        self.start_time = start_time
+        self.end_time = None
+        self.attributes = attributes
+        spans.append(self)
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, context=None, start_time=None, attributes=None):
+        return FakeSpan(self.spans, name, context, start_time, attributes)
+
+
+class TestRequestTimings:
+    def test_breakdown(self):
+        """ Phases add up across attempts and the breakdown is in milliseconds """
+        timings = RequestTimings('flow', 'stream')
+        timings.record('first_event', 1.0, 1.5)
+        timings.record('first_event', 2.0, 2.25)
+        timings.add('parse', 0.002)
+
+        breakdown = timings.breakdown()
+
+        assert breakdown['first_event_ms'] == 750
+        assert breakdown['parse_ms'] == 2
+        assert 'queue_ms' not in breakdown
+        assert breakdown['total_ms'] >= 0
+
+    def test_spans(self):
+        """ Finishing emits a request span with a child span per phase, once """
+        tracer = FakeTracer()
+        timings = RequestTimings('flow', 'completion')
+        timings.attempts = 1
+        with timings.phase('flow_lookup'):
+            pass
+
+        with patch('custom.phase_timings.get_tracer', return_value=tracer):
+            first = timings.finish('completed')
+            second = timings.finish('error')
+
+        assert [span.name for span in tracer.spans] == ['langflow.completion', 'langflow.flow_lookup']
+        root, lookup = tracer.spans
+        assert root.attributes['langflow.status'] == 'completed'
+        assert root.start_time <= lookup.start_time <= lookup.end_time <= root.end_time
+        assert first['status'] == second['status'] == 'completed'
+
+    def test_no_tracer(self):
+        """ Without OpenTelemetry the breakdown is still reported """
+        timings = RequestTimings('flow', 'stream')
+
+        with patch('custom.phase_timings.get_tracer', return_value=None):
+            assert timings.finish('completed')['status'] == 'completed'
+
+
+class TestAttemptTimings:
+    def test_publish(self):
+        """ An attempt's phases reach the request only once it is published, later ones directly """
+        timings = RequestTimings('flow', 'stream')
+        winner = timings.attempt()
+        loser = timings.attempt()
+        winner.attempts += 1
+        loser.attempts += 1
+        winner.record('first_event', 1.0, 1.5)
+        loser.record('first_event', 1.0, 3.0)
+
+        assert 'first_event_ms' not in timings.breakdown()
+        winner.publish()
+        winner.add('parse', 0.002)
+
+        breakdown = timings.breakdown()
+        assert breakdown['first_event_ms'] == 500
+        assert breakdown['parse_ms'] == 2
+        assert breakdown['attempts'] == 2
+
+
+class TestLangflowTimings:
+    def _langflow(self):
+        langflow = Langflow()
+        langflow._get_history_component_id = MagicMock(return_value='ChatHistory-1')
+        return langflow
+
+    def _args(self, optional_params=None, metadata=None):
+        return (
+            'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None, optional_params or {},
+            None, {'metadata': metadata if metadata is not None else {}},
+        )
+
+    def test_completion(self):
+        """ Completions carry the breakdown in their hidden params and the request metadata """
+        langflow = self._langflow()
+        response = MagicMock()
+        response.json.return_value = {
+            'outputs': [{'outputs': [{'results': {'message': {'data': {'text': 'Tuesdays'}}}}]}]
+        }
+        client = MagicMock()
+        client.post.return_value = response
+        metadata = {}
+
+        result = langflow.completion(*self._args({'concurrency_limit': 2}, metadata), client=client)
+
+        breakdown = result._hidden_params['langflow_timings']
+        assert {'queue_ms', 'flow_lookup_ms', 'first_event_ms', 'parse_ms'} <= set(breakdown)
+        assert breakdown['attempts'] == 1
+        assert metadata['langflow_timings'] == breakdown
+
+    def test_hedged_completion(self):
+        """ Only the timings and first byte clock of the attempt that won are kept """
+        langflow = self._langflow()
+        attempts = []
+
+        async def run(model, messages, base_url, client, api_key, encoding, optional_params, timeouts,
+                      history_components, timings):
+            index = len(attempts)
+            attempts.append(timeouts)
+            timings.attempts += 1
+            timeouts.first_byte_timeout()
+            with timings.phase('first_event'):
+                await asyncio.sleep(1.0 if index == 0 else 0.0)
+            return langflow._make_model_response(model, messages, str(index), None)
+
+        langflow._amake_completion = run
+        optional_params = {'hedge': True, 'hedge_delay_ms': 50}
+
+        result = asyncio.run(langflow._arun_completion('flow', MESSAGES, 'http://langflow', 'key', optional_params))
+
+        assert result.choices[0].message.content == '1'
+        breakdown = result._hidden_params['langflow_timings']
+        assert breakdown['attempts'] == 2
+        assert breakdown['first_event_ms'] < 500
+        primary, hedge = attempts
+        assert primary is not hedge
+        assert isinstance(hedge, RunTimeouts) and primary.sent < hedge.sent
+
+    def test_streaming(self):
+        """ The final chunk of a stream carries the breakdown """
+        events = [
+            {'event': 'add_message', 'data': {}},
+            {'event': 'token', 'data': {'chunk': 'Tues'}},
+            {'event': 'token', 'data': {'chunk': 'days'}},
+            {'event': 'end', 'data': {}},
+        ]
+        body = b''.join(json.dumps(event).encode() + b'\n\n' for event in events)
+        client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+        langflow = self._langflow()
+        metadata = {}
+
+        with patch.object(langflow.clients, 'get_client', return_value=client):
+            chunks = list(langflow.streaming(*self._args(metadata=metadata)))
+
+        assert ''.join(chunk['text'] for chunk in chunks) == 'Tuesdays'
+        breakdown = chunks[-1]['provider_specific_fields']['langflow_timings']
+        assert {'flow_lookup_ms', 'first_event_ms', 'stream_ms', 'parse_ms'} <= set(breakdown)
+        assert breakdown['status'] == 'completed'
+        assert metadata['langflow_timings'] == breakdown
+        assert all('provider_specific_fields' not in chunk for chunk in chunks[:-1])
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import pstats
+import time
+from unittest.mock import MagicMock
+
+from custom.profiling import SAMPLE, ProfileStore, RequestProfile
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+def busy_chunk(seconds: float) -> str:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return 'chunk'
+
+
+class TestProfileStore:
+    def _fill(self, store, sizes):
+        for index, size in enumerate(sizes):
+            path = os.path.join(store.directory, f'{index}.prof')
+            with open(path, 'wb') as output:
+                output.write(b'x' * size)
+            os.utime(path, (index, index))
+
+    def test_rotate_count(self, tmp_path):
+        """ Only the newest `max_files` profiles are kept """
+        store = ProfileStore(str(tmp_path), max_files=2)
+        self._fill(store, [10, 10, 10])
+
+        store.rotate()
+
+        assert sorted(os.listdir(tmp_path)) == ['1.prof', '2.prof']
+
+    def test_rotate_size(self, tmp_path):
+        """ The oldest profiles are dropped past the size cap """
+        store = ProfileStore(str(tmp_path), max_bytes=25)
+        self._fill(store, [10, 10, 10])
+
+        store.rotate()
+
+        assert sorted(os.listdir(tmp_path)) == ['1.prof', '2.prof']
+
+
+class TestRequestProfile:
+    def test_call(self, tmp_path):
+        """ A profiled call is saved as pstats data """
+        profile = RequestProfile(ProfileStore(str(tmp_path)), 'flow/tutor', 'completion')
+
+        assert profile.call(lambda: busy_chunk(0.01)) == 'chunk'
+
+        assert profile.saved.endswith('-flow_tutor-completion.prof')
+        stats = pstats.Stats(profile.saved)
+        assert any(function == 'busy_chunk' for _, _, function in stats.stats)
+
+    def test_stream_sampled(self, tmp_path):
+        """ Sampling covers the stream's steps and writes collapsed stacks """
+        profile = RequestProfile(ProfileStore(str(tmp_path)), 'flow', 'stream', mode=SAMPLE, interval=0.001)
+
+        chunks = list(profile.stream(lambda: (busy_chunk(0.02) for _ in range(3))))
+
+        assert chunks == ['chunk'] * 3
+        with open(profile.saved) as collapsed:
+            lines = collapsed.read().splitlines()
+        assert any('busy_chunk' in line for line in lines)
+        assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    def test_stream_closed(self, tmp_path):
+        """ A stream closed early closes its source and is still saved """
+        closed = []
+
+        def source():
+            try:
+                while True:
+                    yield busy_chunk(0)
+            finally:
+                closed.append(True)
+
+        profile = RequestProfile(ProfileStore(str(tmp_path)), 'flow', 'stream')
+        stream = profile.stream(source)
+        next(stream)
+        stream.close()
+
+        assert closed == [True]
+        assert os.path.exists(profile.saved)
+
+
+class TestLangflowProfiling:
+    def _streaming(self, langflow, optional_params, metadata):
+        langflow._stream_run = MagicMock(return_value=iter(['chunk']))
+        return list(
+            langflow.streaming(
+                'flow', [], 'http://langflow', {}, None, print, None, 'key', None, optional_params,
+                None, {'metadata': metadata},
+            )
+        )
+
+    def test_disabled_by_default(self, tmp_path):
+        """ Requests are not profiled unless sampled or asked for """
+        langflow = Langflow()
+
+        assert self._streaming(langflow, {'profile_dir': str(tmp_path)}, {}) == ['chunk']
+        assert os.listdir(tmp_path) == []
+
+    def test_metadata(self, tmp_path):
+        """ A request can ask to be profiled in its metadata """
+        langflow = Langflow()
+
+        assert self._streaming(langflow, {'profile_dir': str(tmp_path)}, {'profile': True}) == ['chunk']
+        assert len(os.listdir(tmp_path)) == 1
+
+    def test_sample_rate(self, tmp_path):
+        """ A sample rate of one profiles every request """
+        langflow = Langflow()
+        params = {'profile_dir': str(tmp_path), 'profile_sample_rate': 1.0, 'profile_mode': 'sample'}
+
+        self._streaming(langflow, params, {})
+        self._streaming(langflow, params, {})
+
+        assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path)) == ['collapsed', 'collapsed']
+
+    def test_astreaming(self, tmp_path):
+        """ Async streams are profiled step by step """
+        langflow = Langflow()
+
+        async def chunks():
+            yield 'chunk'
+
+        async def run():
+            langflow._astream_run = MagicMock(return_value=chunks())
+            stream = langflow.astreaming(
+                'flow', [], 'http://langflow', {}, None, print, None, 'key', None, {'profile_dir': str(tmp_path)},
+                None, {'metadata': {'profile': True}},
+            )
+            return [chunk async for chunk in stream]
+
+        assert asyncio.run(run()) == ['chunk']
+        assert len(os.listdir(tmp_path)) == 1
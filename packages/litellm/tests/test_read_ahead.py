@@ -0,0 +1,194 @@
+import asyncio
+import os
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from benchmarks.stub_server import StubLangflow
+from custom.client_pool import PooledAsyncHTTPHandler
+from custom.exceptions import BaseLLMException
+from custom.read_ahead import ReadAhead, read_ahead
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+class Source:
+    """ Async stream of numbers recording how far it has been read and whether it was closed """
+
+    def __init__(self, items=100, error=None):
+        self.items = items
+        self.error = error
+        self.read = 0
+        self.closed = False
+
+    async def stream(self):
+        try:
+            for item in range(self.items):
+                self.read += 1
+                yield item
+                await asyncio.sleep(0)
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+class TestReadAhead:
+    def test_reads_ahead(self):
+        """ The reader fills the queue while the consumer is busy, then waits """
+        source = Source()
+
+        async def run():
+            async with read_ahead(source.stream(), 4) as events:
+                first = await events.__anext__()
+                await asyncio.sleep(0.05)
+                read = source.read
+                rest = [item async for item in events]
+            return first, read, rest
+
+        first, read, rest = asyncio.run(run())
+
+        assert first == 0
+        # The queue, the item being put and the item just taken
+        assert read == 6
+        assert rest == list(range(1, 100))
+
+    def test_error(self):
+        """ Errors reach the consumer after the items read before them """
+        source = Source(items=3, error=httpx.ReadTimeout('slow'))
+
+        async def run():
+            items = []
+            async with read_ahead(source.stream(), 8) as events:
+                with pytest.raises(httpx.ReadTimeout):
+                    async for item in events:
+                        items.append(item)
+            return items
+
+        assert asyncio.run(run()) == [0, 1, 2]
+
+    def test_stall(self):
+        """ A consumer that stops taking items has the upstream closed """
+        source = Source()
+        closed = []
+
+        async def close():
+            closed.append(True)
+
+        async def run():
+            items = []
+            async with read_ahead(source.stream(), 2, stall=0.02, close=close) as events:
+                await asyncio.sleep(0.1)
+                assert closed == [True]
+                with pytest.raises(BaseLLMException) as error:
+                    async for item in events:
+                        items.append(item)
+            return items, error.value
+
+        items, error = asyncio.run(run())
+
+        assert items == [0, 1]
+        assert error.status_code == 504
+
+    def test_close(self):
+        """ Leaving early stops the reader and closes the source """
+        source = Source()
+
+        async def run():
+            async with read_ahead(source.stream(), 4) as events:
+                reader = events
+                await events.__anext__()
+            return reader
+
+        reader = asyncio.run(run())
+
+        assert isinstance(reader, ReadAhead)
+        assert reader.task.cancelled() or reader.task.done()
+        assert source.closed
+        assert source.read < 100
+
+    def test_disabled(self):
+        """ A size of zero reads the source directly """
+        source = Source().stream()
+
+        async def run():
+            async with read_ahead(source, 0) as events:
+                return events
+
+        assert asyncio.run(run()) is source
+
+
+class TestLangflowReadAhead:
+    def test_responses_stream(self):
+        """ The responses stream is the same with read-ahead """
+        app = StubLangflow(tokens=50)
+        langflow = Langflow()
+
+        async def run(optional_params):
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            with patch.object(langflow.clients, 'get_async_client', return_value=client):
+                stream = langflow._amake_streaming(
+                    'flow', [{'role': 'user', 'content': 'hi'}], 'http://stub', None, 'key', optional_params
+                )
+                chunks = [chunk async for chunk in stream]
+            await client.aclose()
+            return chunks
+
+        direct = asyncio.run(run({}))
+        ahead = asyncio.run(run({'stream_read_ahead': 8}))
+
+        assert ''.join(chunk['text'] for chunk in ahead) == app.answer
+        assert [chunk['text'] for chunk in ahead] == [chunk['text'] for chunk in direct]
+        assert ahead[-1]['is_finished']
+
+    def test_run_stream(self):
+        """ The `/api/v1/run` stream behind `astreaming` is the same with read-ahead """
+        app = StubLangflow(tokens=50)
+        langflow = Langflow()
+
+        async def run(optional_params):
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            with patch.object(langflow.clients, 'get_async_client', return_value=client):
+                stream = langflow._amake_run_streaming(
+                    'flow', [{'role': 'user', 'content': 'hi'}], 'http://stub',
+                    PooledAsyncHTTPHandler(client), 'key', optional_params
+                )
+                chunks = [chunk async for chunk in stream]
+            await client.aclose()
+            return chunks
+
+        direct = asyncio.run(run({}))
+        ahead = asyncio.run(run({'stream_read_ahead': 8}))
+
+        assert ''.join(chunk['text'] for chunk in ahead) == app.answer
+        assert [chunk['text'] for chunk in ahead] == [chunk['text'] for chunk in direct]
+        assert ahead[-1]['is_finished']
+
+    def test_run_stream_stall(self):
+        """ A stalled consumer of the run stream gets a 504 after the buffered chunks """
+        app = StubLangflow(tokens=50)
+        langflow = Langflow()
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            chunks = []
+            with patch.object(langflow.clients, 'get_async_client', return_value=client):
+                stream = langflow._amake_run_streaming(
+                    'flow', [{'role': 'user', 'content': 'hi'}], 'http://stub',
+                    PooledAsyncHTTPHandler(client), 'key',
+                    {'stream_read_ahead': 2, 'stream_read_ahead_stall_ms': 20},
+                )
+                chunks.append(await stream.__anext__())
+                await asyncio.sleep(0.1)
+                with pytest.raises(BaseLLMException) as error:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+            await client.aclose()
+            return chunks, error.value
+
+        chunks, error = asyncio.run(run())
+
+        assert error.status_code == 504
+        assert len(chunks) < 50
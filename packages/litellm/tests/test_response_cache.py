@@ -0,0 +1,187 @@
+import asyncio
+import os
+from unittest.mock import MagicMock, patch
+
+from custom.response_cache import (
+    ResponseCache,
+    SqliteResponseCache,
+    record_chunks,
+    replay_chunks,
+    response_cache_key,
+)
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+MESSAGES = [{'role': 'user', 'content': 'When are office hours?'}]
+
+
+class TestResponseCacheKey:
+    def test_canonical(self):
+        """ Key ordering does not change the hash """
+        first = response_cache_key('flow', [{'role': 'user', 'content': 'hi'}], {'a': 1, 'b': 2})
+        second = response_cache_key('flow', [{'content': 'hi', 'role': 'user'}], {'b': 2, 'a': 1})
+
+        assert first == second
+        assert first != response_cache_key('other', [{'role': 'user', 'content': 'hi'}], {'a': 1, 'b': 2})
+
+
+class TestResponseCache:
+    def test_lru_eviction(self):
+        """ The least recently used answer is evicted past the size limit """
+        cache = ResponseCache(max_entries=2)
+
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+
+        assert cache.get('a') == '1'
+        assert cache.get('b') is None
+        assert cache.get('c') == '3'
+
+    def test_expiry(self):
+        """ Answers are dropped once the TTL passes """
+        cache = ResponseCache(ttl=10)
+
+        with patch('custom.response_cache.time.monotonic', side_effect=[0.0, 5.0, 11.0]):
+            cache.set('a', '1')
+            assert cache.get('a') == '1'
+            assert cache.get('a') is None
+
+    def test_sqlite(self, tmp_path):
+        """ The sqlite backend persists answers and evicts the least recently used """
+        path = str(tmp_path / 'responses.db')
+        cache = SqliteResponseCache(path, ttl=1e12, max_entries=2)
+        with patch('custom.response_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.set('a', '1')
+            cache.set('b', '2')
+            cache.get('a')
+            cache.set('c', '3')
+        cache.close()
+
+        reopened = SqliteResponseCache(path, ttl=1e12, max_entries=2)
+        assert len(reopened) == 2
+        assert reopened.get('a') == '1'
+        assert reopened.get('b') is None
+
+
+class TestReplay:
+    def test_replay_round_trip(self):
+        """ Replayed chunks reassemble the cached answer and end with a finishing chunk """
+        text = 'Office hours are  Monday and Wednesday\nfrom 2 to 4pm. '
+        chunks = list(replay_chunks(text, chunk_chars=10))
+
+        assert ''.join(chunk['text'] for chunk in chunks) == text
+        assert len(chunks) > 2
+        assert [chunk['is_finished'] for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+
+    def test_record_finished_only(self):
+        """ Only streams that finish are stored """
+        cache = ResponseCache()
+
+        list(record_chunks(replay_chunks('partial answer'), cache, 'done'))
+        list(record_chunks(list(replay_chunks('partial answer'))[:-1], cache, 'cut'))
+
+        assert cache.get('done') == 'partial answer'
+        assert cache.get('cut') is None
+
+
+class TestLangflowResponseCache:
+    def _langflow(self):
+        langflow = Langflow()
+        langflow._get_history_component_id = MagicMock(return_value='ChatHistory-1')
+        return langflow
+
+    def _client(self, text: str):
+        response = MagicMock()
+        response.json.return_value = {
+            'outputs': [{'outputs': [{'results': {'message': {'data': {'text': text}}}}]}]
+        }
+        client = MagicMock()
+        client.post.return_value = response
+        return client
+
+    def test_disabled_by_default(self):
+        """ Without opting in every call runs the flow """
+        langflow = self._langflow()
+        client = self._client('Tuesdays')
+
+        langflow._make_completion('flow', MESSAGES, 'http://langflow', client, 'key')
+        langflow._make_completion('flow', MESSAGES, 'http://langflow', client, 'key')
+
+        assert client.post.call_count == 2
+
+    def _complete(self, langflow, client, params, api_base='http://langflow'):
+        return langflow.completion(
+            'flow', MESSAGES, api_base, {}, None, print, None, 'key', None, params, client=client,
+        )
+
+    def test_completion_hit(self):
+        """ Repeated questions are answered from the cache """
+        langflow = self._langflow()
+        client = self._client('Tuesdays')
+        params = {'response_cache': True}
+
+        first = self._complete(langflow, client, params)
+        second = self._complete(langflow, client, params)
+
+        assert client.post.call_count == 1
+        assert second.choices[0].message.content == first.choices[0].message.content == 'Tuesdays'
+        assert second.usage.total_tokens == first.usage.total_tokens
+
+    def test_shared_between_replicas(self):
+        """ Answers are cached per flow, so one replica's answer serves the others """
+        langflow = self._langflow()
+        client = self._client('Tuesdays')
+        params = {'response_cache': True}
+
+        self._complete(langflow, client, params, 'http://a')
+        self._complete(langflow, client, params, 'http://b')
+
+        assert client.post.call_count == 1
+
+    def test_hit_with_backends_down(self):
+        """ Cached answers are served before admission, even while every replica is down """
+        langflow = self._langflow()
+        self._complete(langflow, self._client('Tuesdays'), {'response_cache': True})
+
+        params = {
+            'response_cache': True,
+            'api_bases': 'http://127.0.0.1:9,http://127.0.0.1:10',
+            'concurrency_limit': 1,
+        }
+        response = self._complete(langflow, None, params)
+        chunks = list(langflow.streaming(
+            'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None, params,
+        ))
+
+        async def astream():
+            return [chunk async for chunk in langflow.astreaming(
+                'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None, params,
+            )]
+
+        assert response.choices[0].message.content == 'Tuesdays'
+        assert ''.join(chunk['text'] for chunk in chunks) == 'Tuesdays'
+        assert ''.join(chunk['text'] for chunk in asyncio.run(astream())) == 'Tuesdays'
+        assert set(langflow.backend_stats()) == {'http://langflow'}
+        assert langflow.admission_stats() == {}
+
+    def test_streaming_replay(self):
+        """ Cached answers replay through the streaming path with usage on the final chunk """
+        langflow = self._langflow()
+        client = self._client('Office hours are on Tuesdays')
+        params = {'response_cache': True}
+        self._complete(langflow, client, params)
+
+        with patch.object(langflow.clients, 'get_client') as get_client:
+            chunks = list(langflow.streaming(
+                'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None, params,
+                client=client,
+            ))
+
+        get_client.assert_not_called()
+        assert ''.join(chunk['text'] for chunk in chunks) == 'Office hours are on Tuesdays'
+        assert chunks[-1]['is_finished']
+        assert chunks[-1]['usage']['completion_tokens'] > 0
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from custom.single_flight import SingleFlight
+from litellm.types.utils import GenericStreamingChunk
+
+
+def _chunk(text: str, finished: bool = False) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text=text, is_finished=finished, finish_reason='stop' if finished else '', usage=None, index=0, tool_use=None
+    )
+
+
+def _upstream(texts, delay: float = 0.0):
+    for text in texts:
+        if delay:
+            time.sleep(delay)
+        yield _chunk(text)
+    yield _chunk('', finished=True)
+
+
+def _texts(chunks) -> list:
+    return [chunk['text'] for chunk in chunks]
+
+
+class TestSingleFlight:
+    def test_shared_upstream(self):
+        """ Identical requests share a single upstream run """
+        single_flight = SingleFlight()
+        start = MagicMock(side_effect=lambda: _upstream(['a', 'b', 'c']))
+
+        first = single_flight.subscribe('key', start)
+        second = single_flight.subscribe('key', start)
+
+        assert next(first)['text'] == 'a'
+        assert _texts(second) == ['a', 'b', 'c', '']
+        assert _texts(first) == ['b', 'c', '']
+        start.assert_called_once()
+        assert single_flight.in_flight() == 0
+
+    def test_late_subscriber_replay(self):
+        """ A late subscriber is replayed the chunks it missed """
+        single_flight = SingleFlight()
+        first = single_flight.subscribe('key', lambda: _upstream(['a', 'b', 'c']))
+        next(first)
+        next(first)
+
+        late = single_flight.subscribe('key', lambda: pytest.fail('started a second run'))
+
+        assert _texts(late) == ['a', 'b', 'c', '']
+
+    def test_buffer_overflow(self):
+        """ Once more chunks than the buffer holds are produced, new requests start their own run """
+        single_flight = SingleFlight()
+        start = MagicMock(side_effect=lambda: _upstream(['a', 'b', 'c']))
+        first = single_flight.subscribe('key', start, max_buffer=1)
+        next(first)
+        next(first)
+
+        late = single_flight.subscribe('key', start, max_buffer=1)
+
+        assert start.call_count == 2
+        assert _texts(late) == ['a', 'b', 'c', '']
+        assert _texts(first) == ['c', '']
+
+    def test_abandoned_upstream_closed(self):
+        """ The upstream run is closed when every subscriber disconnects """
+        single_flight = SingleFlight()
+        upstream = _upstream(['a', 'b', 'c'])
+        first = single_flight.subscribe('key', lambda: upstream)
+        second = single_flight.subscribe('key', lambda: upstream)
+        next(first)
+        next(second)
+
+        first.close()
+        assert upstream.gi_frame is not None
+        second.close()
+
+        assert upstream.gi_frame is None
+        assert single_flight.in_flight() == 0
+
+    def test_error_fan_out(self):
+        """ Upstream errors are raised to every subscriber """
+        def failing():
+            yield _chunk('a')
+            raise ValueError('upstream failed')
+
+        single_flight = SingleFlight()
+        first = single_flight.subscribe('key', failing)
+        second = single_flight.subscribe('key', failing)
+
+        with pytest.raises(ValueError):
+            list(first)
+        with pytest.raises(ValueError):
+            list(second)
+
+    def test_threads(self):
+        """ Concurrent subscribers on separate threads all receive the full stream """
+        single_flight = SingleFlight()
+        start = MagicMock(side_effect=lambda: _upstream(['a', 'b', 'c'], delay=0.01))
+        results = []
+
+        def subscriber():
+            results.append(_texts(single_flight.subscribe('key', start)))
+
+        threads = [threading.Thread(target=subscriber) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert start.call_count == 1
+        assert results == [['a', 'b', 'c', '']] * 8
+
+    def test_async_shared_upstream(self):
+        """ Async subscribers on one loop share a run, which is closed once they all leave """
+        single_flight = SingleFlight()
+        closed = []
+
+        async def upstream():
+            try:
+                for text in ('a', 'b', 'c'):
+                    await asyncio.sleep(0.01)
+                    yield _chunk(text)
+                yield _chunk('', finished=True)
+            finally:
+                closed.append(True)
+
+        start = MagicMock(side_effect=upstream)
+
+        async def read(stream) -> list:
+            return [chunk['text'] async for chunk in stream]
+
+        async def run():
+            full = await asyncio.gather(*(read(single_flight.asubscribe('key', start)) for _ in range(4)))
+            first = single_flight.asubscribe('key', start)
+            second = single_flight.asubscribe('key', start)
+            await first.__anext__()
+            await second.__anext__()
+            await first.aclose()
+            assert closed == [True]
+            await second.aclose()
+            return full
+
+        assert asyncio.run(run()) == [['a', 'b', 'c', '']] * 4
+        assert start.call_count == 2
+        assert closed == [True, True]
+        assert single_flight.in_flight() == 0
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from custom.stream_decoder import DONE, StreamDecoder, loads
+
+
+class TestNDJSONDecoding:
+    def test_split_events(self):
+        """ Events split across reads are framed once complete """
+        decoder = StreamDecoder()
+
+        assert decoder.feed(b'{"event": "tok') == []
+        assert decoder.feed(b'en"}\n\n{"event"') == [b'{"event": "token"}']
+        assert decoder.feed(b': "end"}\r\n') == [b'{"event": "end"}']
+        assert decoder.bytes_received == 38
+
+    def test_flush_unterminated(self):
+        """ A final event without a trailing newline is returned on flush """
+        decoder = StreamDecoder()
+
+        assert list(decoder.iter_events([b'{"a": 1}\n', b'{"b": 2}'])) == [b'{"a": 1}', b'{"b": 2}']
+
+    def test_multibyte_split(self):
+        """ Multi-byte characters split between reads decode correctly """
+        encoded = json.dumps({'text': 'café ☕'}, ensure_ascii=False).encode() + b'\n'
+        decoder = StreamDecoder()
+
+        events = list(decoder.iter_events([encoded[:13], encoded[13:]]))
+
+        assert loads(events[0]) == {'text': 'café ☕'}
+
+
+class TestSSEDecoding:
+    def test_data_lines(self):
+        """ Only data lines are events and the prefix is removed """
+        decoder = StreamDecoder(sse=True)
+        stream = b'event: message\nid: 1\n: comment\ndata: {"a": 1}\n\ndata:{"b": 2}\n\n'
+
+        assert decoder.feed(stream) == [b'{"a": 1}', b'{"b": 2}']
+
+    def test_done_marker(self):
+        """ Both the data and bare forms of [DONE] are returned """
+        decoder = StreamDecoder(sse=True)
+
+        assert decoder.feed(b'data: [DONE]\n[DONE]\nnot sse\n') == [DONE, DONE]
+
+    def test_async_events(self):
+        """ The async iterator yields the same events as the sync one """
+        async def stream():
+            for piece in [b'data: {"a"', b': 1}\n\ndata: [DO', b'NE]\n\n']:
+                yield piece
+
+        async def collect():
+            return [event async for event in StreamDecoder(sse=True).aiter_events(stream())]
+
+        assert asyncio.run(collect()) == [b'{"a": 1}', DONE]
@@ -0,0 +1,64 @@
+import logging
+from unittest.mock import MagicMock, patch
+
+from custom.stream_metrics import LazyJSON, StreamMetrics
+
+
+class TestStreamMetrics:
+    def test_counts(self):
+        """ Chunks, characters and time to first token are recorded """
+        metrics = StreamMetrics('run', 'flow')
+
+        metrics.record_chunk('Hel')
+        metrics.record_chunk('lo')
+        summary = metrics.summary()
+
+        assert summary['chunks'] == 2
+        assert summary['text_chars'] == 5
+        assert summary['ttft_ms'] is not None
+        assert sum(summary['inter_chunk_ms'].values()) == 1
+
+    def test_histogram_buckets(self):
+        """ Inter-chunk latencies land in the matching bucket """
+        with patch('custom.stream_metrics.time.perf_counter', side_effect=[0.0, 1.0, 1.003, 1.3, 8.0]):
+            metrics = StreamMetrics('run', 'flow')
+            metrics.record_chunk('a')
+            metrics.record_chunk('b')
+            metrics.record_chunk('c')
+            metrics.record_chunk('d')
+
+        histogram = metrics.summary()['inter_chunk_ms']
+        assert histogram['le_5'] == 1
+        assert histogram['le_500'] == 1
+        assert histogram['inf'] == 1
+        assert metrics.summary()['ttft_ms'] == 1000.0
+
+    def test_finish_once(self):
+        """ A single summary record is emitted per stream """
+        metrics = StreamMetrics('run', 'flow')
+
+        with patch('custom.stream_metrics.verbose_logger') as logger:
+            metrics.finish('completed', 120)
+            metrics.finish('cancelled')
+
+        logger.info.assert_called_once()
+        record = logger.info.call_args.kwargs['extra']['langflow_stream']
+        assert record['status'] == 'completed'
+        assert record['bytes'] == 120
+
+
+class TestLazyJSON:
+    def test_not_serialized_when_disabled(self):
+        """ The payload is only serialized when the record is formatted """
+        payload = MagicMock()
+        logger = logging.getLogger('test_lazy_json')
+        logger.setLevel(logging.INFO)
+
+        with patch('custom.stream_metrics.json.dumps') as dumps:
+            logger.debug('Payload: %s', LazyJSON(payload))
+
+        dumps.assert_not_called()
+
+    def test_formatting(self):
+        """ Formatting produces the JSON representation """
+        assert str(LazyJSON({'a': 1})) == '{\n  "a": 1\n}'
@@ -0,0 +1,45 @@
+import litellm
+
+from custom.stream_usage import StreamUsage
+from litellm.types.utils import GenericStreamingChunk
+
+
+def _count(text: str) -> int:
+    return litellm.token_counter(model='my-flow', text=text)
+
+
+def _chunk(text: str, finished: bool = False) -> GenericStreamingChunk:
+    return GenericStreamingChunk(
+        text=text, is_finished=finished, finish_reason='stop' if finished else '', usage=None, index=0, tool_use=None
+    )
+
+
+class TestStreamUsage:
+    def test_matches_full_count(self):
+        """ Counting as chunks arrive gives the same result as counting the whole text """
+        text = "Hello there!  How are you? I'm fine,\nthanks.\n\n  Code: def f(x):\n    return x*2"
+
+        for size in (1, 4, 9):
+            usage = StreamUsage(0, _count)
+            for index in range(0, len(text), size):
+                usage.add(text[index:index + size])
+            assert usage.usage()['completion_tokens'] == _count(text)
+
+    def test_only_partial_word_buffered(self):
+        """ Text is counted as soon as a word boundary is seen """
+        usage = StreamUsage(0, _count)
+
+        usage.add('one two thr')
+
+        assert usage.completion_tokens == _count('one two')
+        assert usage._pending == ' thr'
+
+    def test_usage_on_final_chunk(self):
+        """ Only the terminating chunk carries the usage """
+        usage = StreamUsage(12, _count)
+
+        first = usage.track(_chunk('Hello'))
+        final = usage.track(_chunk(' world', finished=True))
+
+        assert first['usage'] is None
+        assert final['usage'] == {'prompt_tokens': 12, 'completion_tokens': 2, 'total_tokens': 14}
@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import httpx
+import litellm
+import pytest
+
+from custom.load_balancer import is_backend_failure
+from custom.timeouts import RunTimeouts
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+MESSAGES = [{'role': 'user', 'content': 'When are office hours?'}]
+
+
+class _StallingRunHandler(BaseHTTPRequestHandler):
+    """ Streams a token of a run then stalls until released """
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.server.header_delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        self.wfile.write(b'{"event": "token", "data": {"chunk": "Tuesdays"}}\n\n')
+        self.wfile.flush()
+        self.server.release.wait(5)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stalling_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StallingRunHandler)
+    server.header_delay = 0.0
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+
+
+def _langflow() -> Langflow:
+    langflow = Langflow()
+    langflow._get_history_component_id = MagicMock(return_value='ChatHistory-1')
+    return langflow
+
+
+def _stream(langflow, base_url, optional_params, timeout=None):
+    return langflow.streaming(
+        'flow', MESSAGES, base_url, {}, None, print, None, 'key', None, optional_params,
+        timeout=timeout,
+    )
+
+
+class TestBudgets:
+    def test_model_settings(self):
+        """ Budgets come from the model's settings in milliseconds, 0 meaning no limit """
+        timeouts = Langflow()._get_timeouts('flow', None, {
+            'connect_timeout_ms': 500, 'first_byte_timeout_ms': 0, 'idle_timeout_ms': 2000,
+        })
+
+        assert timeouts.connect == 0.5
+        assert timeouts.first_byte is None
+        assert timeouts.idle == 2.0
+        assert timeouts.total is None
+
+    def test_caller_deadline(self):
+        """ A caller's timeout in seconds bounds the whole run """
+        langflow = Langflow()
+
+        assert langflow._get_timeouts('flow', 300, {}).total == 300
+        assert langflow._get_timeouts('flow', 300, {'total_timeout_ms': 60000}).total == 60
+        assert langflow._get_timeouts('flow', None, {'total_timeout_ms': 60000}).total == 60
+
+    def test_caller_httpx_timeout(self):
+        """ A caller's httpx timeout tightens the connect and idle budgets """
+        timeouts = Langflow()._get_timeouts('flow', httpx.Timeout(5.0, connect=1.0), {})
+
+        assert timeouts.connect == 1.0
+        assert timeouts.idle == 5.0
+        assert timeouts.total is None
+
+    def test_request_timeout(self):
+        """ Requests wait for their first byte until the deadline, and never past it """
+        timeouts = RunTimeouts('flow', connect=10.0, idle=60.0, total=30.0)
+        timeout = timeouts.first_byte_timeout()
+        assert timeout.connect == 10.0
+        assert 29.0 < timeout.read <= 30.0
+
+        timeout = RunTimeouts('flow', connect=10.0, idle=60.0).first_byte_timeout()
+        assert timeout.read == 60.0
+
+        timeout = RunTimeouts('flow', connect=10.0, first_byte=5.0, idle=60.0).first_byte_timeout()
+        assert timeout.read <= 5.0
+
+    def test_first_byte_clock_starts_on_send(self):
+        """ Time before the request is sent, such as queueing, does not use up the first byte budget """
+        timeouts = RunTimeouts('flow', connect=10.0, first_byte=0.1, idle=60.0)
+        time.sleep(0.15)
+        timeouts.check(False)
+
+        assert timeouts.first_byte_timeout().read == 0.1
+        timeouts.check(False)
+        time.sleep(0.15)
+        with pytest.raises(litellm.Timeout):
+            timeouts.check(False)
+
+    def test_attempt_first_byte_clock(self):
+        """ Concurrent attempts share the total deadline but each starts its own first byte clock """
+        timeouts = RunTimeouts('flow', first_byte=0.1, total=30.0)
+        primary = timeouts.attempt()
+        primary.first_byte_timeout()
+        time.sleep(0.15)
+        hedge = timeouts.attempt()
+        hedge.first_byte_timeout()
+
+        hedge.check(False)
+        with pytest.raises(litellm.Timeout):
+            primary.check(False)
+        assert timeouts.sent is None
+        assert primary.deadline == hedge.deadline == timeouts.deadline
+
+    def test_lookup_timeout(self):
+        """ The flow lookup gets the first byte budget, bounded by the deadline """
+        assert RunTimeouts('flow', first_byte=5.0).lookup_timeout().read == 5.0
+        assert RunTimeouts('flow', idle=60.0).lookup_timeout().read == 60.0
+        assert RunTimeouts('flow', idle=60.0, total=30.0).lookup_timeout().read <= 30.0
+
+    def test_phase_of_litellm_timeout(self):
+        """ The httpx timeout behind a LiteLLM timeout tells which budget ran out """
+        timeouts = RunTimeouts('flow')
+        try:
+            try:
+                raise httpx.ConnectTimeout('timed out')
+            except httpx.TimeoutException:
+                raise litellm.Timeout(message='timed out', model='flow', llm_provider='langflow')
+        except litellm.Timeout as e:
+            assert timeouts.phase(e) == 'connect timeout'
+
+
+class TestLangflowTimeouts:
+    def test_completion_timeout_passed(self):
+        """ Completions pass their budget to the request instead of a fixed timeout """
+        langflow = _langflow()
+        client = MagicMock()
+        client.post.return_value.json.return_value = {
+            'outputs': [{'outputs': [{'results': {'message': {'data': {'text': 'Tuesdays'}}}}]}]
+        }
+
+        langflow.completion(
+            'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None,
+            {'connect_timeout_ms': 500}, timeout=120.0, client=client,
+        )
+
+        timeout = client.post.call_args.kwargs['timeout']
+        assert timeout.connect == 0.5
+        assert 119.0 < timeout.read <= 120.0
+
+    def test_completion_read_timeout(self):
+        """ An httpx timeout is raised as a LiteLLM timeout """
+        langflow = _langflow()
+        client = MagicMock()
+        client.post.side_effect = httpx.ReadTimeout('timed out')
+
+        with pytest.raises(litellm.Timeout):
+            langflow.completion(
+                'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None, {},
+                client=client,
+            )
+
+    def test_completion_first_byte_timeout(self, stalling_server):
+        """ A completion over LiteLLM's HTTP handler times out with the budget that ran out """
+        stalling_server.header_delay = 1.0
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+
+        started = time.monotonic()
+        with pytest.raises(litellm.Timeout) as error:
+            langflow.completion(
+                'flow', MESSAGES, base_url, {}, None, print, None, 'key', None,
+                {'first_byte_timeout_ms': 200}, client=langflow.clients.get_handler(base_url),
+            )
+        assert time.monotonic() - started < 1.0
+        assert 'LangFlow run of flow timed out, read timeout' in str(error.value)
+
+    def test_flow_lookup_budget(self):
+        """ The flow lookup is bounded by the run's budget instead of the client default """
+        langflow = Langflow()
+        client = MagicMock()
+        client.client.get.side_effect = httpx.ReadTimeout('timed out')
+
+        with pytest.raises(litellm.Timeout) as error:
+            langflow.completion(
+                'flow', MESSAGES, 'http://langflow', {}, None, print, None, 'key', None,
+                {'first_byte_timeout_ms': 500}, client=client,
+            )
+
+        assert client.client.get.call_args.kwargs['timeout'].read == 0.5
+        assert 'flow lookup read timeout' in str(error.value)
+
+    def test_fallback_stream_idle_timeout(self, stalling_server):
+        """ The fallback run stream has the same budgets as the run stream """
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+        stream = langflow._make_streaming_fallback_run(
+            'flow', MESSAGES, base_url, None, True, 'key', {'idle_timeout_ms': 200}
+        )
+
+        assert next(stream)['text'] == 'Tuesdays'
+        started = time.monotonic()
+        with pytest.raises(litellm.Timeout):
+            next(stream)
+        assert time.monotonic() - started < 2.0
+
+    def test_caller_deadline_keeps_circuit_closed(self, stalling_server):
+        """ Runs that pass the caller's deadline do not count against the replica """
+        stalling_server.header_delay = 1.0
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+
+        for _ in range(6):
+            with pytest.raises(litellm.Timeout):
+                next(_stream(langflow, base_url, {}, timeout=0.3))
+
+        stats = langflow.backend_stats()[base_url]
+        assert stats['healthy']
+        assert stats['circuit'] == 'closed'
+
+    def test_budget_timeouts_count_against_replica(self):
+        """ Running out of the model's own budgets is a replica failure, the total deadline is not """
+        timeouts = RunTimeouts('flow')
+
+        assert is_backend_failure(timeouts.expired('first byte deadline'))
+        assert is_backend_failure(timeouts.expired('read timeout'))
+        assert not is_backend_failure(timeouts.expired('total deadline'))
+        assert not is_backend_failure(timeouts.expired('flow lookup total deadline'))
+
+    def test_stream_idle_timeout(self, stalling_server):
+        """ A stream that goes quiet is aborted after its idle budget """
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+        stream = _stream(langflow, base_url, {'idle_timeout_ms': 200})
+
+        assert next(stream)['text'] == 'Tuesdays'
+        started = time.monotonic()
+        with pytest.raises(litellm.Timeout):
+            next(stream)
+        assert time.monotonic() - started < 2.0
+
+        connections = langflow.connection_stats()[base_url]
+        assert all(connection['streams'] == 0 for connection in connections)
+
+    def test_stream_first_byte_timeout(self, stalling_server):
+        """ A run that does not answer within its first byte budget is aborted """
+        stalling_server.header_delay = 1.0
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+
+        started = time.monotonic()
+        with pytest.raises(litellm.Timeout):
+            next(_stream(langflow, base_url, {'first_byte_timeout_ms': 200}))
+        assert time.monotonic() - started < 1.0
+
+    def test_stream_total_deadline(self, stalling_server):
+        """ The caller's timeout ends a stream even while it is producing output """
+        langflow = _langflow()
+        base_url = f'http://127.0.0.1:{stalling_server.server_address[1]}'
+        stream = _stream(langflow, base_url, {'idle_timeout_ms': 5000}, timeout=0.3)
+
+        assert next(stream)['text'] == 'Tuesdays'
+        started = time.monotonic()
+        with pytest.raises(litellm.Timeout):
+            next(stream)
+        assert time.monotonic() - started < 2.0
@@ -0,0 +1,99 @@
+import os
+from unittest.mock import MagicMock
+
+import litellm
+
+from custom.token_cache import TokenCountCache
+
+os.environ['HELPER_BACKEND'] = 'test'
+from custom.langflow_handler import Langflow  # noqa: E402
+
+
+class TestTokenCountCache:
+    def test_memoized(self):
+        """ Repeated content is only encoded once per tokenizer """
+        cache = TokenCountCache()
+        encode = MagicMock(side_effect=len)
+
+        assert cache.count('a', 'hello', encode) == 5
+        assert cache.count('a', 'hello', encode) == 5
+        assert cache.count('b', 'hello', encode) == 5
+
+        assert encode.call_count == 2
+        assert cache.stats() == {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3, 'entries': 2}
+
+    def test_lru_eviction(self):
+        """ The least recently used entry is evicted past the size limit """
+        cache = TokenCountCache(max_entries=2)
+        encode = MagicMock(side_effect=len)
+
+        cache.count('a', 'one', encode)
+        cache.count('a', 'two', encode)
+        cache.count('a', 'one', encode)
+        cache.count('a', 'three', encode)
+        cache.count('a', 'one', encode)
+        cache.count('a', 'two', encode)
+
+        assert encode.call_count == 4
+        assert cache.stats()['entries'] == 2
+
+    def test_errors_not_cached(self):
+        """ A failing tokenizer is retried on the next lookup """
+        cache = TokenCountCache()
+        encode = MagicMock(side_effect=[ValueError('boom'), 3])
+
+        try:
+            cache.count('a', 'abc', encode)
+        except ValueError:
+            pass
+
+        assert cache.count('a', 'abc', encode) == 3
+
+
+class TestTokenUsage:
+    def test_matches_token_counter(self):
+        """ Memoized prompt counts match litellm's chat message count """
+        langflow = Langflow()
+        messages = [
+            {'role': 'system', 'content': 'You are helpful.'},
+            {'role': 'user', 'content': 'hello there', 'name': 'bob'},
+            {'role': 'assistant', 'content': 'Hi! How can I help you today?'},
+        ]
+
+        usage = langflow._calculate_token_usage('my-flow', messages, 'Sure')
+
+        assert usage.prompt_tokens == litellm.token_counter(model='my-flow', messages=messages)
+        assert usage.completion_tokens == litellm.token_counter(model='my-flow', text='Sure')
+
+    def test_list_content_matches_token_counter(self):
+        """ Text and image parts of list content are counted like litellm's chat message count """
+        langflow = Langflow()
+        messages = [
+            {'role': 'system', 'content': [{'type': 'text', 'text': 'You are helpful.'}]},
+            {'role': 'user', 'content': [
+                {'type': 'text', 'text': 'What is in this picture?'},
+                {'type': 'image_url', 'image_url': {'url': 'https://example.com/a.png', 'detail': 'low'}},
+                {'type': 'text', 'text': 'Answer briefly.'},
+            ]},
+        ]
+
+        usage = langflow._calculate_token_usage('my-flow', messages, 'A cat')
+
+        assert usage.prompt_tokens == litellm.token_counter(model='my-flow', messages=messages)
+
+    def test_incremental(self):
+        """ Only messages added since the last turn are tokenized """
+        langflow = Langflow()
+        encoding = MagicMock()
+        encoding.name = 'test'
+        encoding.encode.side_effect = lambda text: text.split()
+        messages = [{'role': 'user', 'content': 'one two'}, {'role': 'assistant', 'content': 'three'}]
+
+        langflow._calculate_token_usage('my-flow', messages, 'four five', encoding)
+        encoding.encode.reset_mock()
+        messages += [{'role': 'assistant', 'content': 'four five'}, {'role': 'user', 'content': 'six'}]
+        usage = langflow._calculate_token_usage('my-flow', messages, 'seven', encoding)
+
+        assert [call.args[0] for call in encoding.encode.call_args_list] == ['six', 'seven']
+        assert usage.prompt_tokens == 6
+        assert usage.completion_tokens == 1